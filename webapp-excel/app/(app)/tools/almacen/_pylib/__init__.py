@@ -0,0 +1,5 @@
+# app/(app)/tools/almacen/_pylib/__init__.py
+"""
+Utilidades Python compartidas por los CLI de almacén (globalia-stock, ediwin-parse).
+Carpeta con "_" para que Next.js no la trate como ruta.
+"""
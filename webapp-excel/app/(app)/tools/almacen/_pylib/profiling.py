@@ -0,0 +1,101 @@
+# app/(app)/tools/almacen/_pylib/profiling.py
+"""
+Perfilado opcional de un op de CLI (--profile cprofile|tracemalloc).
+
+- cprofile:    vuelca un .pstats (abrir con pstats/snakeviz o con --op profile_report)
+- tracemalloc: escribe un .txt con el top-N de asignaciones por línea + pico de memoria
+
+Se usa envolviendo el op despachado, sin tocar su código:
+
+    with profiled(mode, path):
+        rc = fn(args)
+"""
+
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import pstats
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+PROFILE_DIRNAME = "PROFILES"
+
+
+def profile_path(base_dir: Path, op: str, mode: str) -> Path:
+    """Ruta del informe: <base_dir>/<op>_<timestamp>.pstats|.txt"""
+    ext = ".pstats" if mode == "cprofile" else ".txt"
+    ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    safe_op = "".join(c if c.isalnum() or c in "-_" else "_" for c in op) or "op"
+    return Path(base_dir) / f"{safe_op}_{ts}{ext}"
+
+
+@contextlib.contextmanager
+def profiled(mode: str, out_path: Path, top: int = 40):
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"--profile debe ser uno de {PROFILE_MODES}")
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if mode == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(str(out_path))
+        return
+
+    tracemalloc.start(25)
+    try:
+        yield
+    finally:
+        snap = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        _write_tracemalloc_report(snap, current, peak, out_path, top)
+
+
+def _write_tracemalloc_report(snap, current: int, peak: int, out_path: Path, top: int):
+    snap = snap.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        )
+    )
+    stats = snap.statistics("lineno")
+    lines = [
+        f"current_mb={current / 1048576:.2f} peak_mb={peak / 1048576:.2f}",
+        f"top {top} asignaciones por línea:",
+    ]
+    for i, st in enumerate(stats[:top], 1):
+        frame = st.traceback[0]
+        lines.append(
+            f"{i:>3}. {st.size / 1024:>10.1f} KiB  {st.count:>8} blk  "
+            f"{frame.filename}:{frame.lineno}"
+        )
+    out_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def summarize_pstats(path: Path, top: int = 30, sort: str = "cumulative") -> List[Dict[str, Any]]:
+    """Top-N funciones de un .pstats (por defecto, tiempo acumulado)."""
+    st = pstats.Stats(str(path))
+    st.sort_stats(sort)
+    rows = []
+    for func in st.fcn_list[:top]:
+        cc, nc, tt, ct, _callers = st.stats[func]
+        filename, line, name = func
+        rows.append(
+            {
+                "FUNCION": f"{filename}:{line}({name})",
+                "NCALLS": nc if nc == cc else f"{nc}/{cc}",
+                "TOTTIME": round(tt, 6),
+                "CUMTIME": round(ct, 6),
+            }
+        )
+    return rows
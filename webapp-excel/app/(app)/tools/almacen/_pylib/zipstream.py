@@ -0,0 +1,140 @@
+# app/(app)/tools/almacen/_pylib/zipstream.py
+"""
+ZIP en streaming para los export de almacén (globalia-stock, ediwin-parse).
+
+Los miembros se añaden según se producen, desde bytes en memoria, desde un
+generador de trozos o desde un fichero ya escrito, sin carpeta de trabajo
+que luego haya que releer:
+
+    with ZipStream(out, nivel=6) as zs:
+        zs.write_bytes("resumen.csv", data)
+        zs.write_iter("historial.csv", trozos())
+        zs.write_file("IMPRIMIR_00.xlsx", ruta)
+
+- Formatos ya comprimidos (xlsx, pdf, zip, imágenes...) van con ZIP_STORED:
+  recomprimirlos cuesta CPU y no ahorra nada.
+- El resto con DEFLATE al `nivel` (1-9); nivel 0 = todo sin comprimir.
+- Destino "-": el ZIP sale por el stdout del proceso (sys.__stdout__), así
+  el CLI puede desviar sus print a stderr mientras tanto. zipfile no necesita
+  seek: con destino no posicionable escribe descriptores de datos.
+- Si sale una excepción del `with`, el ZIP se aborta: con destino ruta se
+  escribe en un temporal junto a ella que solo se renombra al cerrar bien;
+  con un stream no se escribe el directorio central (lo ya enviado queda
+  como ZIP truncado, que ningún lector acepta como válido).
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Iterable, List, Optional, Union
+
+NIVEL_DEFECTO = 6
+YA_COMPRIMIDOS = frozenset(
+    {".xlsx", ".xlsm", ".docx", ".pdf", ".zip", ".gz", ".7z", ".png", ".jpg", ".jpeg", ".parquet"}
+)
+
+
+def metodo_para(nombre: str, nivel: int = NIVEL_DEFECTO) -> int:
+    """ZIP_STORED para formatos ya comprimidos (o nivel 0), si no ZIP_DEFLATED."""
+    if nivel <= 0 or Path(nombre).suffix.lower() in YA_COMPRIMIDOS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+class _Cortable:
+    """Stream de salida que, tras `cortar()`, descarta lo que se escriba."""
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.cortado = False
+
+    def write(self, data) -> int:
+        if not self.cortado:
+            self.raw.write(data)
+        return len(data)
+
+    def flush(self) -> None:
+        if not self.cortado:
+            self.raw.flush()
+
+    def tell(self) -> int:
+        return self.raw.tell()
+
+    def cortar(self) -> None:
+        self.raw.flush()
+        self.cortado = True
+
+
+class ZipStream:
+    def __init__(self, destino: Union[str, Path, BinaryIO], nivel: int = NIVEL_DEFECTO):
+        nivel = int(nivel)
+        if not 0 <= nivel <= 9:
+            raise ValueError("el nivel de compresión va de 0 a 9")
+        self.nivel = nivel
+        self.miembros: List[str] = []
+        self._stdout = str(destino) == "-"
+        self._final: Optional[Path] = None
+        self._stream: Optional[_Cortable] = None
+        if isinstance(destino, (str, Path)) and not self._stdout:
+            self._final = Path(destino)
+            self._final.parent.mkdir(parents=True, exist_ok=True)
+            destino = self._final.with_name(f".{self._final.name}.{os.getpid()}.part")
+            self._tmp = destino
+        else:
+            self._stream = _Cortable(sys.__stdout__.buffer if self._stdout else destino)
+            destino = self._stream
+        self._zip = zipfile.ZipFile(
+            destino, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=nivel or None
+        )
+
+    def __enter__(self) -> "ZipStream":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def close(self) -> None:
+        self._zip.close()
+        if self._final is not None:
+            os.replace(self._tmp, self._final)
+        else:
+            self._stream.flush()
+
+    def abort(self) -> None:
+        """Descarta el ZIP: borra el temporal o deja el stream sin directorio central."""
+        if self._stream is not None:
+            self._stream.cortar()
+        try:
+            self._zip.close()
+        finally:
+            if self._final is not None:
+                Path(self._tmp).unlink(missing_ok=True)
+
+    def write_bytes(self, arcname: str, data: bytes) -> None:
+        self._zip.writestr(arcname, data, compress_type=metodo_para(arcname, self.nivel))
+        self.miembros.append(arcname)
+
+    def write_iter(self, arcname: str, trozos: Iterable[bytes]) -> None:
+        """Miembro de tamaño desconocido: se comprime según llegan los trozos."""
+        self._zip.compression = metodo_para(arcname, self.nivel)
+        with self._zip.open(arcname, "w", force_zip64=True) as f:
+            for trozo in trozos:
+                f.write(trozo)
+        self.miembros.append(arcname)
+
+    def write_file(self, arcname: str, path: Union[str, Path]) -> None:
+        self._zip.write(path, arcname=arcname, compress_type=metodo_para(arcname, self.nivel))
+        self.miembros.append(arcname)
+
+    def write_dir(self, src_dir: Union[str, Path], prefijo: str = "") -> None:
+        """Todos los ficheros de `src_dir` (recursivo), con rutas relativas a ella."""
+        src = Path(src_dir)
+        for p in sorted(src.rglob("*")):
+            if p.is_file():
+                self.write_file(f"{prefijo}{p.relative_to(src).as_posix()}", p)
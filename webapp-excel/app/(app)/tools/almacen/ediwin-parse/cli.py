@@ -2,11 +2,17 @@
 # app/(app)/tools/almacen/ediwin-parse/cli.py
 
 import argparse
+import contextlib
 import json
 import sys
 from pathlib import Path
 
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))  # _pylib (compartido entre tools de almacén)
+sys.path.insert(0, str(HERE))
+
 import pandas as pd
+from _pylib.profiling import PROFILE_DIRNAME, PROFILE_MODES, profile_path, profiled
 from core import (
     TALLAS,
     create_eci_folders_and_pdfs_local,
@@ -20,6 +26,25 @@ from core import (
 )
 
 
+# claves añadidas a toda respuesta JSON (p.ej. _profile)
+_REPLY_EXTRA: dict = {}
+
+
+def _print_json(payload: dict) -> None:
+    print(json.dumps({**payload, **_REPLY_EXTRA}))
+
+
+def _profile_dir(args) -> Path:
+    # junto a la salida: carpeta del --out, si no --base-dir, si no la del PDF
+    if args.out:
+        base = Path(args.out).resolve().parent
+    elif args.base_dir:
+        base = Path(args.base_dir).resolve()
+    else:
+        base = Path(args.input).resolve().parent
+    return base.parent / PROFILE_DIRNAME
+
+
 def _read_optional_file(path_str: str | None) -> tuple[bytes | None, str | None]:
     if not path_str:
         return None, None
@@ -49,7 +74,7 @@ def cmd_preview(args):
     pdf_bytes = Path(args.input).read_bytes()
     df = _parse_df(args.tipo, pdf_bytes)
     if df.empty:
-        print(json.dumps({"ok": False, "error": "EMPTY_DF"}))
+        _print_json({"ok": False, "error": "EMPTY_DF"})
         return 2
 
     dfp = _df_display(df)
@@ -85,15 +110,13 @@ def cmd_preview(args):
     rows = dfp.head(limit).to_dict(orient="records")
     cols = list(dfp.columns)
 
-    print(
-        json.dumps(
-            {
-                "ok": True,
-                "columns": cols,
-                "rows": rows,
-                "resumen": resumen.to_dict(orient="records"),
-            }
-        )
+    _print_json(
+        {
+            "ok": True,
+            "columns": cols,
+            "rows": rows,
+            "resumen": resumen.to_dict(orient="records"),
+        }
     )
     return 0
 
@@ -140,7 +163,7 @@ def cmd_export(args):
     except Exception:
         pass
 
-    print(json.dumps({"ok": True, "out": str(out_path)}))
+    _print_json({"ok": True, "out": str(out_path)})
     return 0
 
 
@@ -151,7 +174,7 @@ def cmd_folders(args):
 
     df = _parse_df(tipo, pdf_bytes)
     if df.empty:
-        print(json.dumps({"ok": False, "error": "EMPTY_DF"}))
+        _print_json({"ok": False, "error": "EMPTY_DF"})
         return 2
 
     if tipo == "EUROFIEL":
@@ -159,7 +182,7 @@ def cmd_folders(args):
     else:
         create_eci_folders_and_pdfs_local(df, pdf_bytes, base_dir)
 
-    print(json.dumps({"ok": True, "base_dir": base_dir}))
+    _print_json({"ok": True, "base_dir": base_dir})
     return 0
 
 
@@ -169,7 +192,7 @@ def cmd_split_txt(args):
     # Leer LINPED (obligatorio)
     lin_bytes, lin_name = _read_optional_file(args.linped)
     if not lin_bytes:
-        print(json.dumps({"ok": False, "error": "LINPED_REQUIRED"}))
+        _print_json({"ok": False, "error": "LINPED_REQUIRED"})
         return 2
 
     # Opcionales
@@ -188,7 +211,7 @@ def cmd_split_txt(args):
         pdf_bytes = Path(args.input).read_bytes()
         df = _parse_df(tipo, pdf_bytes)
         if df.empty:
-            print(json.dumps({"ok": False, "error": "EMPTY_DF"}))
+            _print_json({"ok": False, "error": "EMPTY_DF"})
             return 2
 
         model_changes = split_ediwin_txt_files_per_model_eurofiel(
@@ -207,14 +230,12 @@ def cmd_split_txt(args):
             max_model_length=effective_max_len,
         )
 
-        print(
-            json.dumps(
-                {
-                    "ok": True,
-                    "base_dir": args.base_dir,
-                    "model_changes_count": len(model_changes),
-                }
-            )
+        _print_json(
+            {
+                "ok": True,
+                "base_dir": args.base_dir,
+                "model_changes_count": len(model_changes),
+            }
         )
         return 0
 
@@ -234,18 +255,16 @@ def cmd_split_txt(args):
             obslped_name=obsl_name,
         )
 
-        print(
-            json.dumps(
-                {
-                    "ok": True,
-                    "base_dir": args.base_dir,
-                    "model_changes_count": 0,
-                }
-            )
+        _print_json(
+            {
+                "ok": True,
+                "base_dir": args.base_dir,
+                "model_changes_count": 0,
+            }
         )
         return 0
 
-    print(json.dumps({"ok": False, "error": "BAD_TIPO"}))
+    _print_json({"ok": False, "error": "BAD_TIPO"})
     return 2
 
 
@@ -280,32 +299,46 @@ def main():
     parser.set_defaults(recortar_modelo_sage=True)
     parser.add_argument("--sage-model-maxlen", dest="sage_model_maxlen", default="20")
 
+    # perfilado (cprofile/tracemalloc)
+    parser.add_argument("--profile", choices=list(PROFILE_MODES))
+
     args = parser.parse_args()
 
+    prof_ctx = contextlib.nullcontext()
+    if args.profile:
+        out = profile_path(_profile_dir(args), args.op, args.profile)
+        _REPLY_EXTRA["_profile"] = {"mode": args.profile, "path": str(out)}
+        prof_ctx = profiled(args.profile, out)
+
+    with prof_ctx:
+        return _dispatch(args)
+
+
+def _dispatch(args):
     try:
         if args.op == "preview":
             return cmd_preview(args)
         if args.op == "export":
             if not args.format or not args.out:
-                print(json.dumps({"ok": False, "error": "MISSING_EXPORT_ARGS"}))
+                _print_json({"ok": False, "error": "MISSING_EXPORT_ARGS"})
                 return 2
             return cmd_export(args)
         if args.op == "folders":
             if not args.base_dir:
-                print(json.dumps({"ok": False, "error": "MISSING_BASE_DIR"}))
+                _print_json({"ok": False, "error": "MISSING_BASE_DIR"})
                 return 2
             return cmd_folders(args)
         if args.op == "split-txt":
             if not args.base_dir:
-                print(json.dumps({"ok": False, "error": "MISSING_BASE_DIR"}))
+                _print_json({"ok": False, "error": "MISSING_BASE_DIR"})
                 return 2
             return cmd_split_txt(args)
 
-        print(json.dumps({"ok": False, "error": "UNKNOWN_OP"}))
+        _print_json({"ok": False, "error": "UNKNOWN_OP"})
         return 2
 
     except Exception as e:
-        print(json.dumps({"ok": False, "error": "CLI_FAILED", "detail": str(e)}))
+        _print_json({"ok": False, "error": "CLI_FAILED", "detail": str(e)})
         return 2
 
 
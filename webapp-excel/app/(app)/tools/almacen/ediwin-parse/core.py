@@ -7,14 +7,15 @@
 
 import os
 import re
-import zipfile
+import tempfile
 from collections import defaultdict
 from io import BytesIO
 from pathlib import Path
-from typing import Dict, Optional, Set, Tuple
+from typing import Callable, Dict, Optional, Set, Tuple
 
 import pandas as pd
 import pdfplumber
+from _pylib.zipstream import NIVEL_DEFECTO, ZipStream
 from openpyxl.styles import Border, Font, PatternFill, Side
 from pypdf import PdfReader, PdfWriter
 
@@ -167,15 +168,25 @@ def style_workbook_with_borders_and_headers(workbook):
                     c.font = total_font
 
 
-def zip_dir(src_dir: str, out_zip_path: str):
-    src = Path(src_dir)
-    out = Path(out_zip_path)
-    out.parent.mkdir(parents=True, exist_ok=True)
+def zip_dir(src_dir: str, out_zip_path: str, nivel: int = NIVEL_DEFECTO):
+    with ZipStream(out_zip_path, nivel=nivel) as zs:
+        zs.write_dir(src_dir)
 
-    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        for p in src.rglob("*"):
-            if p.is_file():
-                z.write(p, arcname=str(p.relative_to(src)))
+
+def _guardar_salida(
+    zip_out: Optional[ZipStream], ruta: str, escribir: Callable[[object], None]
+):
+    """
+    escribir(destino) a disco en `ruta` o, si hay zip_out, a un buffer en
+    memoria que entra en el ZIP con `ruta` como nombre (sin pasar por disco).
+    """
+    if zip_out is None:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        escribir(ruta)
+        return
+    buf = BytesIO()
+    escribir(buf)
+    zip_out.write_bytes(ruta.replace(os.sep, "/"), buf.getvalue())
 
 
 # ===================== PARSER EUROFIEL =====================
@@ -540,9 +551,14 @@ def build_eci_model_page_map(df: pd.DataFrame, pdf_bytes: bytes):
 
 
 def create_eurofiel_folders_and_pdfs_local(
-    df: pd.DataFrame, pdf_bytes: bytes, base_dir: str
+    df: pd.DataFrame,
+    pdf_bytes: bytes,
+    base_dir: str,
+    zip_out: Optional[ZipStream] = None,
 ):
-    os.makedirs(base_dir, exist_ok=True)
+    # zip_out: PDF/XLSX directos al ZIP bajo base_dir/ (no se escribe en disco)
+    if zip_out is None:
+        os.makedirs(base_dir, exist_ok=True)
     model_map, total_pages = build_eurofiel_model_page_map(df, pdf_bytes)
     if not model_map:
         return
@@ -555,7 +571,6 @@ def create_eurofiel_folders_and_pdfs_local(
 
         folder_name = safe_fs_name(f"{modelo}_{patron}")
         folder_path = os.path.join(base_dir, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
 
         writer = PdfWriter()
         for p in sorted(pages):
@@ -563,8 +578,7 @@ def create_eurofiel_folders_and_pdfs_local(
                 writer.add_page(reader.pages[p - 1])
 
         pdf_out_path = os.path.join(folder_path, f"{folder_name}.pdf")
-        with open(pdf_out_path, "wb") as f_out:
-            writer.write(f_out)
+        _guardar_salida(zip_out, pdf_out_path, writer.write)
 
         sub_df = df[
             (df["MODELO"].astype(str).str.strip() == str(modelo).strip())
@@ -619,22 +633,30 @@ def create_eurofiel_folders_and_pdfs_local(
             [sub_df, pd.DataFrame([total_row])], ignore_index=True
         )
 
-        excel_out_path = os.path.join(folder_path, f"{folder_name}.xlsx")
-        with pd.ExcelWriter(excel_out_path, engine="openpyxl") as writer_x:
-            sub_df_with_total.to_excel(writer_x, index=False, sheet_name="Resumen")
-            style_workbook_with_borders_and_headers(writer_x.book)
+        def escribir_excel(destino, sub_df_with_total=sub_df_with_total):
+            with pd.ExcelWriter(destino, engine="openpyxl") as writer_x:
+                sub_df_with_total.to_excel(writer_x, index=False, sheet_name="Resumen")
+                style_workbook_with_borders_and_headers(writer_x.book)
 
-            # Pintar filas por modelo si existe la columna y la hoja
-            for sheet_name in ("Pedidos", "Resumen"):
-                if sheet_name in writer_x.book.sheetnames:
-                    ws = writer_x.book[sheet_name]
-                    apply_model_row_colors(ws, "MODELO")
+                # Pintar filas por modelo si existe la columna y la hoja
+                for sheet_name in ("Pedidos", "Resumen"):
+                    if sheet_name in writer_x.book.sheetnames:
+                        ws = writer_x.book[sheet_name]
+                        apply_model_row_colors(ws, "MODELO")
+
+        excel_out_path = os.path.join(folder_path, f"{folder_name}.xlsx")
+        _guardar_salida(zip_out, excel_out_path, escribir_excel)
 
 
 def create_eci_folders_and_pdfs_local(
-    df: pd.DataFrame, pdf_bytes: bytes, base_dir: str
+    df: pd.DataFrame,
+    pdf_bytes: bytes,
+    base_dir: str,
+    zip_out: Optional[ZipStream] = None,
 ):
-    os.makedirs(base_dir, exist_ok=True)
+    # zip_out: PDF/XLSX directos al ZIP bajo base_dir/ (no se escribe en disco)
+    if zip_out is None:
+        os.makedirs(base_dir, exist_ok=True)
     model_map, total_pages = build_eci_model_page_map(df, pdf_bytes)
     if not model_map:
         return
@@ -647,7 +669,6 @@ def create_eci_folders_and_pdfs_local(
 
         folder_name = safe_fs_name(modelo)
         folder_path = os.path.join(base_dir, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
 
         writer = PdfWriter()
         for p in sorted(pages):
@@ -655,8 +676,7 @@ def create_eci_folders_and_pdfs_local(
                 writer.add_page(reader.pages[p - 1])
 
         pdf_out_path = os.path.join(folder_path, f"{folder_name}.pdf")
-        with open(pdf_out_path, "wb") as f_out:
-            writer.write(f_out)
+        _guardar_salida(zip_out, pdf_out_path, writer.write)
 
         sub_df = df[df["MODELO"].astype(str).str.strip() == str(modelo).strip()].copy()
         if sub_df.empty:
@@ -707,15 +727,18 @@ def create_eci_folders_and_pdfs_local(
             [sub_df, pd.DataFrame([total_row])], ignore_index=True
         )
 
-        excel_out_path = os.path.join(folder_path, f"{folder_name}.xlsx")
-        with pd.ExcelWriter(excel_out_path, engine="openpyxl") as writer_x:
-            sub_df_with_total.to_excel(writer_x, index=False, sheet_name="Resumen")
-            style_workbook_with_borders_and_headers(writer_x.book)
+        def escribir_excel(destino, sub_df_with_total=sub_df_with_total):
+            with pd.ExcelWriter(destino, engine="openpyxl") as writer_x:
+                sub_df_with_total.to_excel(writer_x, index=False, sheet_name="Resumen")
+                style_workbook_with_borders_and_headers(writer_x.book)
 
-            for sheet_name in ("Pedidos", "Resumen"):
-                if sheet_name in writer_x.book.sheetnames:
-                    ws = writer_x.book[sheet_name]
-                    apply_model_row_colors(ws, "MODELO")
+                for sheet_name in ("Pedidos", "Resumen"):
+                    if sheet_name in writer_x.book.sheetnames:
+                        ws = writer_x.book[sheet_name]
+                        apply_model_row_colors(ws, "MODELO")
+
+        excel_out_path = os.path.join(folder_path, f"{folder_name}.xlsx")
+        _guardar_salida(zip_out, excel_out_path, escribir_excel)
 
 
 # ===================== TXT: EUROFIEL =====================
@@ -1065,6 +1088,7 @@ def export_outputs_zip_full(
     obslped_name: str | None = None,
     recortar_modelo_sage: bool = True,  # Eurofiel only
     sage_max_len: int = 20,
+    nivel_zip: int = NIVEL_DEFECTO,
 ):
     """
     Replica funcionalidad Streamlit:
@@ -1072,24 +1096,16 @@ def export_outputs_zip_full(
       - export Excel + CSV
       - include_model_folders: crea carpetas por modelo con PDF+XLSX
       - TXT: si vienen, los reparte por modelo (Eurofiel o ECI)
-      - empaqueta todo en ZIP (outzip_path)
+      - empaqueta todo en ZIP (outzip_path; "-" = stdout)
+
+    CSV, Excel y carpetas por modelo van de memoria al ZIP según se generan
+    (XLSX/PDF sin recomprimir); solo el reparto de TXT pasa por una carpeta
+    temporal que se borra al terminar.
     """
     tipo = tipo.upper()
     if tipo not in ("EUROFIEL", "ECI"):
         raise ValueError("tipo debe ser EUROFIEL o ECI")
 
-    outzip = Path(outzip_path)
-    work_dir = outzip.parent / f"_work_{outzip.stem}"
-    if work_dir.exists():
-        # limpieza best-effort
-        for p in work_dir.rglob("*"):
-            if p.is_file():
-                try:
-                    p.unlink()
-                except Exception:
-                    pass
-    work_dir.mkdir(parents=True, exist_ok=True)
-
     # 1) Parse PDF
     if tipo == "EUROFIEL":
         df = parse_pdf_eurofiel_bytes(pdf_bytes)
@@ -1110,152 +1126,159 @@ def export_outputs_zip_full(
     zero_size_cols = [t for t in TALLAS if t in df.columns and t not in active_sizes]
     df_display = df.drop(columns=zero_size_cols) if zero_size_cols else df.copy()
 
-    # 3) CSV
-    csv_path = work_dir / f"{tipo.lower()}_resumen_pedidos.csv"
-    csv_path.write_bytes(df_display.to_csv(index=False).encode("utf-8"))
+    with ZipStream(outzip_path, nivel=nivel_zip) as zs, tempfile.TemporaryDirectory(
+        prefix="ediwin_txt_"
+    ) as txt_tmp:
+        # 3) CSV
+        zs.write_bytes(
+            f"{tipo.lower()}_resumen_pedidos.csv",
+            df_display.to_csv(index=False).encode("utf-8"),
+        )
 
-    # 4) Excel + resúmenes
-    excel_path = work_dir / f"{tipo.lower()}_resumen_pedidos.xlsx"
+        # 4) Excel + resúmenes
+        excel_buf = BytesIO()
 
-    if tipo == "EUROFIEL":
-        resumen = (
-            df.groupby("MODELO", dropna=False)
-            .agg(
-                PEDIDOS=("PEDIDO", "nunique"),
-                UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
+        if tipo == "EUROFIEL":
+            resumen = (
+                df.groupby("MODELO", dropna=False)
+                .agg(
+                    PEDIDOS=("PEDIDO", "nunique"),
+                    UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
+                )
+                .reset_index()
+                .sort_values("PEDIDOS", ascending=False)
+            )
+            resumen_xlsx = resumen.copy()
+            total_row = {
+                "MODELO": "TOTAL",
+                "PEDIDOS": int(resumen_xlsx["PEDIDOS"].sum()),
+                "UNIDADES_TOTALES": int(resumen_xlsx["UNIDADES_TOTALES"].sum()),
+            }
+            resumen_xlsx = pd.concat(
+                [resumen_xlsx, pd.DataFrame([total_row])], ignore_index=True
             )
-            .reset_index()
-            .sort_values("PEDIDOS", ascending=False)
-        )
-        resumen_xlsx = resumen.copy()
-        total_row = {
-            "MODELO": "TOTAL",
-            "PEDIDOS": int(resumen_xlsx["PEDIDOS"].sum()),
-            "UNIDADES_TOTALES": int(resumen_xlsx["UNIDADES_TOTALES"].sum()),
-        }
-        resumen_xlsx = pd.concat(
-            [resumen_xlsx, pd.DataFrame([total_row])], ignore_index=True
-        )
 
-        with pd.ExcelWriter(excel_path, engine="openpyxl") as writer_x:
-            df_display.to_excel(writer_x, sheet_name="Pedidos", index=False)
-            ws_pedidos = writer_x.book["Pedidos"]
-            apply_model_row_colors(ws_pedidos, "MODELO")
+            with pd.ExcelWriter(excel_buf, engine="openpyxl") as writer_x:
+                df_display.to_excel(writer_x, sheet_name="Pedidos", index=False)
+                ws_pedidos = writer_x.book["Pedidos"]
+                apply_model_row_colors(ws_pedidos, "MODELO")
 
-            resumen_xlsx.to_excel(
-                writer_x, sheet_name="Resumen por modelo", index=False
-            )
-            style_workbook_with_borders_and_headers(writer_x.book)
+                resumen_xlsx.to_excel(
+                    writer_x, sheet_name="Resumen por modelo", index=False
+                )
+                style_workbook_with_borders_and_headers(writer_x.book)
+            zs.write_bytes(f"{tipo.lower()}_resumen_pedidos.xlsx", excel_buf.getvalue())
 
-        if include_model_folders:
-            create_eurofiel_folders_and_pdfs_local(
-                df, pdf_bytes, str(work_dir / "por_modelo")
-            )
+            if include_model_folders:
+                create_eurofiel_folders_and_pdfs_local(
+                    df, pdf_bytes, "por_modelo", zip_out=zs
+                )
 
-    else:
-        resumen_mc = (
-            df.groupby(["MODELO", "COLOR"], dropna=False)
-            .agg(
-                PEDIDOS=("N_PEDIDO", "nunique"),
-                UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
+        else:
+            resumen_mc = (
+                df.groupby(["MODELO", "COLOR"], dropna=False)
+                .agg(
+                    PEDIDOS=("N_PEDIDO", "nunique"),
+                    UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
+                )
+                .reset_index()
+                .sort_values("PEDIDOS", ascending=False)
             )
-            .reset_index()
-            .sort_values("PEDIDOS", ascending=False)
-        )
-        resumen_m = (
-            df.groupby("MODELO", dropna=False)
-            .agg(
-                PEDIDOS=("N_PEDIDO", "nunique"),
-                UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
+            resumen_m = (
+                df.groupby("MODELO", dropna=False)
+                .agg(
+                    PEDIDOS=("N_PEDIDO", "nunique"),
+                    UNIDADES_TOTALES=("TOTAL_UNIDADES", "sum"),
+                )
+                .reset_index()
+                .sort_values("PEDIDOS", ascending=False)
             )
-            .reset_index()
-            .sort_values("PEDIDOS", ascending=False)
-        )
-
-        resumen_mc_xlsx = resumen_mc.copy()
-        total_mc = {
-            "MODELO": "TOTAL",
-            "COLOR": "",
-            "PEDIDOS": int(resumen_mc_xlsx["PEDIDOS"].sum()),
-            "UNIDADES_TOTALES": int(resumen_mc_xlsx["UNIDADES_TOTALES"].sum()),
-        }
-        resumen_mc_xlsx = pd.concat(
-            [resumen_mc_xlsx, pd.DataFrame([total_mc])], ignore_index=True
-        )
-
-        resumen_m_xlsx = resumen_m.copy()
-        total_m = {
-            "MODELO": "TOTAL",
-            "PEDIDOS": int(resumen_m_xlsx["PEDIDOS"].sum()),
-            "UNIDADES_TOTALES": int(resumen_m_xlsx["UNIDADES_TOTALES"].sum()),
-        }
-        resumen_m_xlsx = pd.concat(
-            [resumen_m_xlsx, pd.DataFrame([total_m])], ignore_index=True
-        )
 
-        with pd.ExcelWriter(excel_path, engine="openpyxl") as writer_x:
-            df_display.to_excel(writer_x, sheet_name="Pedidos", index=False)
-            resumen_mc_xlsx.to_excel(
-                writer_x, sheet_name="Resumen modelo+color", index=False
+            resumen_mc_xlsx = resumen_mc.copy()
+            total_mc = {
+                "MODELO": "TOTAL",
+                "COLOR": "",
+                "PEDIDOS": int(resumen_mc_xlsx["PEDIDOS"].sum()),
+                "UNIDADES_TOTALES": int(resumen_mc_xlsx["UNIDADES_TOTALES"].sum()),
+            }
+            resumen_mc_xlsx = pd.concat(
+                [resumen_mc_xlsx, pd.DataFrame([total_mc])], ignore_index=True
             )
-            resumen_m_xlsx.to_excel(writer_x, sheet_name="Resumen modelo", index=False)
-            style_workbook_with_borders_and_headers(writer_x.book)
 
-        if include_model_folders:
-            create_eci_folders_and_pdfs_local(
-                df, pdf_bytes, str(work_dir / "por_modelo")
+            resumen_m_xlsx = resumen_m.copy()
+            total_m = {
+                "MODELO": "TOTAL",
+                "PEDIDOS": int(resumen_m_xlsx["PEDIDOS"].sum()),
+                "UNIDADES_TOTALES": int(resumen_m_xlsx["UNIDADES_TOTALES"].sum()),
+            }
+            resumen_m_xlsx = pd.concat(
+                [resumen_m_xlsx, pd.DataFrame([total_m])], ignore_index=True
             )
 
-    # 5) TXT: repartir por modelo, dentro de work_dir/txt_por_modelo
-    model_changes = None
+            with pd.ExcelWriter(excel_buf, engine="openpyxl") as writer_x:
+                df_display.to_excel(writer_x, sheet_name="Pedidos", index=False)
+                resumen_mc_xlsx.to_excel(
+                    writer_x, sheet_name="Resumen modelo+color", index=False
+                )
+                resumen_m_xlsx.to_excel(writer_x, sheet_name="Resumen modelo", index=False)
+                style_workbook_with_borders_and_headers(writer_x.book)
+            zs.write_bytes(f"{tipo.lower()}_resumen_pedidos.xlsx", excel_buf.getvalue())
 
-    if linped_bytes and linped_name:
-        txt_dir = work_dir / "txt_por_modelo"
-        if tipo == "EUROFIEL":
-            max_len = sage_max_len if recortar_modelo_sage else None
-            model_changes = split_ediwin_txt_files_per_model_eurofiel(
-                base_dir=str(txt_dir),
-                df=df,
-                linped_bytes=linped_bytes,
-                linped_name=linped_name,
-                cabped_bytes=cabped_bytes,
-                cabped_name=cabped_name,
-                locped_bytes=locped_bytes,
-                locped_name=locped_name,
-                obsped_bytes=obsped_bytes,
-                obsped_name=obsped_name,
-                obslped_bytes=obslped_bytes,
-                obslped_name=obslped_name,
-                max_model_length=max_len,
-            )
-        else:
-            split_ediwin_txt_files_per_model(
-                base_dir=str(txt_dir),
-                linped_bytes=linped_bytes,
-                linped_name=linped_name,
-                cabped_bytes=cabped_bytes,
-                cabped_name=cabped_name,
-                locped_bytes=locped_bytes,
-                locped_name=locped_name,
-                obsped_bytes=obsped_bytes,
-                obsped_name=obsped_name,
-                obslped_bytes=obslped_bytes,
-                obslped_name=obslped_name,
-            )
+            if include_model_folders:
+                create_eci_folders_and_pdfs_local(
+                    df, pdf_bytes, "por_modelo", zip_out=zs
+                )
 
-    # 6) Si hubo recortes Sage, guardar un CSV de cambios
-    if model_changes:
-        changes_path = work_dir / "sage_model_changes.csv"
-        df_changes = pd.DataFrame(
-            [
-                {"MODELO_ORIGINAL": k, "MODELO_SAGE": v}
-                for k, v in sorted(model_changes.items())
-            ]
-        )
-        changes_path.write_bytes(df_changes.to_csv(index=False).encode("utf-8"))
+        # 5) TXT: repartir por modelo (carpeta temporal -> txt_por_modelo/ del ZIP)
+        model_changes = None
+
+        if linped_bytes and linped_name:
+            txt_dir = Path(txt_tmp) / "txt_por_modelo"
+            if tipo == "EUROFIEL":
+                max_len = sage_max_len if recortar_modelo_sage else None
+                model_changes = split_ediwin_txt_files_per_model_eurofiel(
+                    base_dir=str(txt_dir),
+                    df=df,
+                    linped_bytes=linped_bytes,
+                    linped_name=linped_name,
+                    cabped_bytes=cabped_bytes,
+                    cabped_name=cabped_name,
+                    locped_bytes=locped_bytes,
+                    locped_name=locped_name,
+                    obsped_bytes=obsped_bytes,
+                    obsped_name=obsped_name,
+                    obslped_bytes=obslped_bytes,
+                    obslped_name=obslped_name,
+                    max_model_length=max_len,
+                )
+            else:
+                split_ediwin_txt_files_per_model(
+                    base_dir=str(txt_dir),
+                    linped_bytes=linped_bytes,
+                    linped_name=linped_name,
+                    cabped_bytes=cabped_bytes,
+                    cabped_name=cabped_name,
+                    locped_bytes=locped_bytes,
+                    locped_name=locped_name,
+                    obsped_bytes=obsped_bytes,
+                    obsped_name=obsped_name,
+                    obslped_bytes=obslped_bytes,
+                    obslped_name=obslped_name,
+                )
 
-    # 7) Zip final
-    zip_dir(str(work_dir), outzip_path)
+            zs.write_dir(txt_tmp)
+
+        # 6) Si hubo recortes Sage, guardar un CSV de cambios
+        if model_changes:
+            df_changes = pd.DataFrame(
+                [
+                    {"MODELO_ORIGINAL": k, "MODELO_SAGE": v}
+                    for k, v in sorted(model_changes.items())
+                ]
+            )
+            zs.write_bytes(
+                "sage_model_changes.csv", df_changes.to_csv(index=False).encode("utf-8")
+            )
 
     return {
         "ok": True,
@@ -1031,13 +1031,13 @@ export default function GlobaliaStockClient() {
   const [albFile, setAlbFile] = useState<File | null>(null);
   const [albPath, setAlbPath] = useState("./demo-assets/globalia/ALBARANES_SERVIDOS_DEMO.xlsx");
   const [albModo, setAlbModo] = useState("d");
-  const [albSkip, setAlbSkip] = useState("25");
+  const [albSkip, setAlbSkip] = useState(""); // vacío = cabecera autodetectada
   const [albSim, setAlbSim] = useState(false);
   const [albRes, setAlbRes] = useState<any>(null);
 
   const [pedFile, setPedFile] = useState<File | null>(null);
   const [pedPath, setPedPath] = useState("./demo-assets/globalia/PEDIDOS_PENDIENTES_DEMO.xlsx");
-  const [pedSkip, setPedSkip] = useState("26");
+  const [pedSkip, setPedSkip] = useState(""); // vacío = cabecera autodetectada
   const [pedSim, setPedSim] = useState(false);
   const [pedRes, setPedRes] = useState<any>(null);
   const albInputRef = useRef<HTMLInputElement | null>(null);
@@ -2075,7 +2075,7 @@ useEffect(() => {
           ...basePayload(),
           modo: albModo,
           simular: albSim ? 1 : 0,
-          skip: Number(albSkip) || 25,
+          skip: albSkip.trim() === "" ? "" : Number(albSkip),
         })
       );
       form.append("file", albFile);
@@ -2104,7 +2104,7 @@ useEffect(() => {
           excelPath: albPath.trim(),
           modo: albModo,
           simular: albSim ? 1 : 0,
-          skip: Number(albSkip) || 25,
+          skip: albSkip.trim() === "" ? "" : Number(albSkip),
         },
       });
       if (!j?.ok) throw new Error(j?.error || "No se pudo importar albaranes.");
@@ -2131,7 +2131,7 @@ useEffect(() => {
         JSON.stringify({
           ...basePayload(),
           simular: pedSim ? 1 : 0,
-          skip: Number(pedSkip) || 26,
+          skip: pedSkip.trim() === "" ? "" : Number(pedSkip),
         })
       );
       form.append("file", pedFile);
@@ -2159,7 +2159,7 @@ useEffect(() => {
           ...basePayload(),
           excelPath: pedPath.trim(),
           simular: pedSim ? 1 : 0,
-          skip: Number(pedSkip) || 26,
+          skip: pedSkip.trim() === "" ? "" : Number(pedSkip),
         },
       });
       if (!j?.ok) throw new Error(j?.error || "No se pudo importar pedidos.");
@@ -4699,7 +4699,7 @@ useEffect(() => {
                       <input
                         ref={albInputRef}
                         type="file"
-                        accept=".xlsx,.xls"
+                        accept=".xlsx,.xls,.csv,.tsv,.txt"
                         onChange={(e) => setAlbFile(e.target.files?.[0] ?? null)}
                         className="hidden"
                       />
@@ -4723,6 +4723,7 @@ useEffect(() => {
                           type="number"
                           min={0}
                           className="w-full rounded-xl border border-slate-700/70 bg-slate-950/40 px-3 py-2 text-sm text-slate-100"
+                          placeholder="auto"
                           value={albSkip}
                           onChange={(e) => setAlbSkip(e.target.value)}
                         />
@@ -4758,7 +4759,11 @@ useEffect(() => {
                   <div className="mt-4 space-y-3">
                     <InfoBox
                       title="Resultado albaranes"
-                      detail={`Nuevas salidas: ${albRes?.nuevas_salidas ?? 0}`}
+                      detail={
+                        albRes?.ya_importado
+                          ? `Ya importado el ${albRes?.registro?.importado ?? "—"} (${albRes?.registro?.nombre ?? ""})`
+                          : `Nuevas salidas: ${albRes?.nuevas_salidas ?? 0} · Filas ya importadas: ${albRes?.filas_ya_importadas ?? 0}`
+                      }
                     />
                     {albRes?.import_rows?.length ? (
                       <SimpleTable rows={albRes.import_rows} />
@@ -4769,6 +4774,38 @@ useEffect(() => {
                         <SimpleTable rows={albRes.servidos} />
                       </>
                     ) : null}
+                    {albRes?.diff ? (
+                      <>
+                        <InfoBox
+                          title="Vista previa (simulación)"
+                          detail={`Celdas afectadas: ${albRes.diff.totales?.celdas ?? 0} · Pendientes completos: ${albRes.diff.totales?.pendientes_completos ?? 0} · Parciales: ${albRes.diff.totales?.pendientes_parciales ?? 0} · Negativos nuevos: ${albRes.diff.totales?.negativos_nuevos ?? 0} · Duplicados: ${albRes.diff.totales?.duplicados ?? 0}`}
+                        />
+                        {albRes.diff.negativos_nuevos?.length ? (
+                          <>
+                            <div className="text-xs text-slate-400">Stock que pasaría a negativo</div>
+                            <SimpleTable rows={albRes.diff.negativos_nuevos} />
+                          </>
+                        ) : null}
+                        {albRes.diff.pendientes?.length ? (
+                          <>
+                            <div className="text-xs text-slate-400">Pendientes servidos (completos y parciales)</div>
+                            <SimpleTable rows={albRes.diff.pendientes} />
+                          </>
+                        ) : null}
+                        {albRes.diff.stock?.length ? (
+                          <>
+                            <div className="text-xs text-slate-400">Cambios de stock por modelo/talla</div>
+                            <SimpleTable rows={albRes.diff.stock} />
+                          </>
+                        ) : null}
+                        {albRes.diff.duplicados?.length ? (
+                          <>
+                            <div className="text-xs text-slate-400">Líneas ya registradas</div>
+                            <SimpleTable rows={albRes.diff.duplicados} />
+                          </>
+                        ) : null}
+                      </>
+                    ) : null}
                   </div>
                 ) : null}
               </div>
@@ -4815,7 +4852,7 @@ useEffect(() => {
                       <input
                         ref={pedInputRef}
                         type="file"
-                        accept=".xlsx,.xls"
+                        accept=".xlsx,.xls,.csv,.tsv,.txt"
                         onChange={(e) => setPedFile(e.target.files?.[0] ?? null)}
                         className="hidden"
                       />
@@ -4827,6 +4864,7 @@ useEffect(() => {
                           type="number"
                           min={0}
                           className="w-full rounded-xl border border-slate-700/70 bg-slate-950/40 px-3 py-2 text-sm text-slate-100"
+                          placeholder="auto"
                           value={pedSkip}
                           onChange={(e) => setPedSkip(e.target.value)}
                         />
@@ -4862,9 +4900,19 @@ useEffect(() => {
                   <div className="mt-4 space-y-3">
                     <InfoBox
                       title="Resultado pedidos"
-                      detail={`Nuevos: ${pedRes?.nuevos ?? 0} · Duplicados: ${pedRes?.duplicados ?? 0}`}
+                      detail={
+                        pedRes?.ya_importado
+                          ? `Ya importado el ${pedRes?.registro?.importado ?? "—"} (${pedRes?.registro?.nombre ?? ""})`
+                          : `Nuevos: ${pedRes?.nuevos ?? 0} · Duplicados: ${pedRes?.duplicados ?? 0} · Filas ya importadas: ${pedRes?.filas_ya_importadas ?? 0}`
+                      }
                     />
                     {pedRes?.import_rows?.length ? <SimpleTable rows={pedRes.import_rows} /> : null}
+                    {pedRes?.diff?.duplicados?.length ? (
+                      <>
+                        <div className="text-xs text-slate-400">Pendientes ya existentes (no se importan)</div>
+                        <SimpleTable rows={pedRes.diff.duplicados} />
+                      </>
+                    ) : null}
                   </div>
                 ) : null}
               </div>
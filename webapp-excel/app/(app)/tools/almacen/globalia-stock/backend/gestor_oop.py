@@ -17,17 +17,26 @@ cada una de las clases de dominio.
 from __future__ import annotations
 
 import csv
+import hashlib
 import json
 import os
+import time
+import zipfile
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 try:
     import pandas as pd
 except ImportError:
     pd = None  # así tus funciones pueden seguir avisando "no disponible"
 
+try:
+    import python_calamine as _calamine
+except ImportError:
+    _calamine = None  # opcional: lector nativo de Excel; si no, openpyxl read_only
+
 
 def norm_talla(x):
     """
@@ -213,6 +222,211 @@ def parse_fecha_excel(value) -> str:
         return ""
 
 
+# Columnas que usan las importaciones de listados del ERP
+COLUMNAS_ALBARANES = [
+    "CodigoArticulo",
+    "DesTalla",
+    "Total",
+    "SuPedido",
+    "FechaAlbaran",
+    "NumeroAlbaran",
+]
+COLUMNAS_PEDIDOS = [
+    "CodigoArticulo",
+    "DesTalla",
+    "UnidadesPendientes",
+    "SuPedido",
+    "FechaEntrega",
+    "NumeroPedido",
+]
+CABECERA_ERP = "CodigoArticulo"
+
+
+def _filas_excel(ruta):
+    """Filas (tuplas de valores) de la primera hoja, en streaming.
+
+    - python-calamine si está instalado (lector nativo, el más rápido)
+    - .xlsx/.xlsm: openpyxl read_only (iter_rows con values_only)
+    - otros formatos (.xls antiguo): pandas, sin streaming
+    Las celdas vacías llegan como None y las filas vacías como tuplas vacías
+    (el skip cuenta filas como pd.read_excel).
+    """
+    if _calamine is not None:
+        hoja = _calamine.CalamineWorkbook.from_path(str(ruta)).get_sheet_by_index(0)
+        for fila in hoja.to_python(skip_empty_area=False):
+            yield tuple(None if v == "" else v for v in fila)
+        return
+
+    if zipfile.is_zipfile(ruta):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            # sin <dimension> fiable (algunos ERP la escriben corta): filas tal cual
+            ws.reset_dimensions()
+            yield from ws.iter_rows(values_only=True)
+        finally:
+            wb.close()
+        return
+
+    df = pd.read_excel(ruta, header=None, dtype=object)
+    for fila in df.itertuples(index=False, name=None):
+        yield tuple(None if pd.isna(v) else v for v in fila)
+
+
+EXTENSIONES_CSV = (".csv", ".tsv", ".txt")
+FILAS_POR_TROZO = 50_000
+
+
+def leer_excel_erp(
+    ruta,
+    columnas: List[str],
+    opcionales: Tuple[str, ...] = (),
+    skip: Optional[int] = None,
+) -> "pd.DataFrame":
+    """Listado del ERP completo en un DataFrame (ver leer_listado_erp)."""
+    trozos = list(leer_listado_erp(ruta, columnas, opcionales, skip))
+    if len(trozos) == 1:
+        return trozos[0]
+    return pd.concat(trozos, ignore_index=True)
+
+
+def leer_listado_erp(
+    ruta,
+    columnas: List[str],
+    opcionales: Tuple[str, ...] = (),
+    skip: Optional[int] = None,
+    filas_por_trozo: int = FILAS_POR_TROZO,
+):
+    """
+    Lee un listado del ERP (albaranes / pedidos) en trozos de DataFrame, sin
+    cargar el fichero entero. Excel (.xlsx/.xls) o texto delimitado (.csv/.tsv/.txt).
+
+    - La cabecera es la primera fila con una celda 'CodigoArticulo'; con skip
+      se fuerza como en pd.read_excel(skiprows=skip) (fila skip+1).
+    - Solo se materializan `columnas` y las `opcionales` presentes; si falta
+      alguna requerida, no se incluye y el llamador decide (como antes).
+    - Se descartan las filas vacías en todas las columnas leídas.
+    - Siempre produce al menos un trozo (vacío si no hay cabecera / filas).
+    """
+    if str(ruta).lower().endswith(EXTENSIONES_CSV):
+        yield from _trozos_csv(ruta, columnas, opcionales, skip, filas_por_trozo)
+    else:
+        yield from _trozos_excel(ruta, columnas, opcionales, skip, filas_por_trozo)
+
+
+def _trozos_excel(ruta, columnas, opcionales, skip, filas_por_trozo):
+    filas = _filas_excel(ruta)
+    cabecera = None
+    for i, fila in enumerate(filas):
+        if skip is not None:
+            if i == skip:
+                cabecera = fila
+                break
+        elif any(isinstance(v, str) and v.strip() == CABECERA_ERP for v in fila):
+            cabecera = fila
+            break
+    if cabecera is None:
+        yield pd.DataFrame()
+        return
+
+    nombres = [str(v).strip() if v is not None else "" for v in cabecera]
+    posiciones: Dict[str, int] = {}
+    for col in list(columnas) + list(opcionales):
+        if col in nombres and col not in posiciones:
+            posiciones[col] = nombres.index(col)
+
+    items = list(posiciones.items())
+    datos: Dict[str, list] = {col: [] for col in posiciones}
+    n, emitidos = 0, 0
+    for fila in filas:
+        valores = [fila[j] if j < len(fila) else None for _, j in items]
+        if all(v is None or (isinstance(v, str) and not v.strip()) for v in valores):
+            continue
+        for (col, _), v in zip(items, valores):
+            datos[col].append(v)
+        n += 1
+        if n == filas_por_trozo:
+            yield pd.DataFrame(datos)
+            datos = {col: [] for col in posiciones}
+            n, emitidos = 0, emitidos + 1
+    if n or not emitidos:
+        yield pd.DataFrame(datos)
+
+
+def _codificacion_texto(ruta) -> str:
+    """utf-8 (con o sin BOM) si todo el fichero lo es; si no, cp1252 / latin-1."""
+    import codecs
+
+    for enc in ("utf-8-sig", "cp1252"):
+        dec = codecs.getincrementaldecoder(enc)()
+        try:
+            with open(ruta, "rb") as f:
+                for bloque in iter(lambda: f.read(1 << 20), b""):
+                    dec.decode(bloque)
+            dec.decode(b"", final=True)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"  # nunca falla: cualquier byte es un carácter
+
+
+def _detectar_csv(ruta, skip: Optional[int]):
+    """(encoding, separador, índice de la línea de cabecera) de un CSV/TSV del ERP."""
+    enc = _codificacion_texto(ruta)
+    with open(ruta, "r", encoding=enc, newline="") as f:
+        muestra = f.read(1 << 16)
+    lineas = muestra.splitlines()
+    if skip is not None:
+        idx = skip
+    else:
+        idx = next((i for i, l in enumerate(lineas) if CABECERA_ERP in l), None)
+    if idx is None or idx >= len(lineas):
+        return enc, None, None
+    try:
+        sep = csv.Sniffer().sniff("\n".join(lineas[idx : idx + 20]), delimiters=";,\t|").delimiter
+    except csv.Error:
+        sep = max(";,\t|", key=lineas[idx].count)
+    return enc, sep, idx
+
+
+def _trozos_csv(ruta, columnas, opcionales, skip, filas_por_trozo):
+    enc, sep, idx = _detectar_csv(ruta, skip)
+    if sep is None:
+        yield pd.DataFrame()
+        return
+    buscadas = set(columnas) | set(opcionales)
+    # Todo como texto (vacío -> NaN, como la celda vacía de Excel): sin
+    # inferencia de pandas, "00123" / "036" no pierden los ceros y "5,0" no
+    # rompe; los normalizadores del import (_excel_int, _excel_codigo...)
+    # parsean igual que con un .xlsx
+    lector = pd.read_csv(
+        ruta,
+        sep=sep,
+        encoding=enc,
+        skiprows=idx,
+        header=0,
+        usecols=lambda c: str(c).strip() in buscadas,
+        chunksize=filas_por_trozo,
+        skip_blank_lines=True,
+        dtype=str,
+        keep_default_na=False,
+        na_values=[""],
+    )
+    emitidos = 0
+    with lector:
+        for trozo in lector:
+            trozo.columns = [str(c).strip() for c in trozo.columns]
+            vacias = trozo.apply(lambda c: c.fillna("").str.strip().eq("")).all(axis=1)
+            trozo = trozo[~vacias].reset_index(drop=True)
+            emitidos += 1
+            yield trozo
+    if not emitidos:
+        cab = pd.read_csv(ruta, sep=sep, encoding=enc, skiprows=idx, header=0, nrows=0)
+        yield pd.DataFrame(columns=[str(c).strip() for c in cab.columns if str(c).strip() in buscadas])
+
+
 def prompt_select_name(
     prompt: str, disponibles: list[str], allow_empty: bool = True
 ) -> str:
@@ -306,6 +520,47 @@ def prompt_select_name(
 ###############################################################################
 
 
+class PhaseMetrics:
+    """Cronometraje opcional por fases (carga/guardado de cada JSON, etc.).
+
+    Desactivado por defecto: ``phase()`` no mide nada hasta que alguien
+    (el CLI con ``--metrics``) pone ``enabled = True``.  Los tiempos se
+    acumulan en milisegundos por nombre de fase y ``count()`` lleva
+    contadores libres (filas leídas, escritas...).
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.phases: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - t0) * 1000.0)
+
+    def add(self, name: str, ms: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + int(n)
+
+    def total(self, prefix: str) -> float:
+        return sum(v for k, v in self.phases.items() if k.startswith(prefix))
+
+
+METRICS = PhaseMetrics()
+
+
 class DataStore:
     """Componente de persistencia genérico.
 
@@ -331,16 +586,151 @@ class DataStore:
                 os.makedirs(base_dir, exist_ok=True)
             return json.loads(json.dumps(self.default_structure))
         try:
-            with open(self.path, "r", encoding="utf-8") as f:
-                return json.load(f)
+            with METRICS.phase(f"load:{os.path.basename(self.path)}"):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return json.load(f)
         except Exception:
             # Si hay error, devolvemos copia del default
             return json.loads(json.dumps(self.default_structure))
 
     def save(self) -> None:
         """Guarda el diccionario actual en disco."""
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, indent=4, ensure_ascii=False)
+        with METRICS.phase(f"save:{os.path.basename(self.path)}"):
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=4, ensure_ascii=False)
+
+
+class ImportRegistry:
+    """Registro de ficheros del ERP ya importados (idempotencia de imports).
+
+    Por fichero guarda el sha256 del contenido, el nº de filas y el hash de
+    cada fila normalizada (con su nº de ocurrencia dentro del fichero, para
+    que dos líneas idénticas cuenten como dos). Los hashes de fila van
+    concatenados en un único string (HASH_LEN caracteres cada uno) para que
+    el JSON siga siendo pequeño y rápido de cargar.
+
+    - Mismo sha256 y tipo  -> el fichero ya se importó entero.
+    - Hash de fila visto   -> esa fila ya se aplicó en otro fichero.
+
+    Solo los últimos RETENER_CLAVES ficheros de cada tipo conservan los hashes
+    de fila (el registro no crece sin límite); de los anteriores quedan sha256
+    y contadores. Una fila suelta de un fichero antiguo la sigue frenando el
+    anti-join contra los stores (pendientes existentes / ledger de salidas).
+    """
+
+    NOMBRE = "importaciones.json"  # junto a datos_almacen.json por defecto
+    HASH_LEN = 16
+    RETENER_CLAVES = 50
+    # store que guarda lo que aplica cada tipo (restaurar un backup de ese
+    # store solo rebobina esos tipos). Albaranes: las salidas van a
+    # datos_almacen aunque también sirvan pendientes de la previsión.
+    TIPOS_POR_STORE = {
+        "datos_almacen": ("albaranes",),
+        "prevision": ("pedidos", "ediwin"),
+    }
+
+    def __init__(self, path: str):
+        self.store = DataStore(path, {"ficheros": []})
+        self.ficheros: List[Dict] = self.store.data.setdefault("ficheros", [])
+        self._vistas: Dict[str, set] = {}
+
+    @staticmethod
+    def sha256_fichero(ruta: str) -> str:
+        h = hashlib.sha256()
+        with open(ruta, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+        return h.hexdigest()
+
+    @classmethod
+    def hash_fila(cls, partes) -> str:
+        texto = "\x1f".join(str(p) for p in partes)
+        return hashlib.blake2b(
+            texto.encode("utf-8"), digest_size=cls.HASH_LEN // 2
+        ).hexdigest()
+
+    def buscar(self, sha256: str, tipo: str) -> Optional[Dict]:
+        return next(
+            (f for f in self.ficheros if f.get("sha256") == sha256 and f.get("tipo") == tipo),
+            None,
+        )
+
+    def claves_vistas(self, tipo: str) -> set:
+        if tipo not in self._vistas:
+            n = self.HASH_LEN
+            vistas = set()
+            for f in self.ficheros:
+                if f.get("tipo") == tipo:
+                    s = f.get("claves", "")
+                    vistas.update(s[i : i + n] for i in range(0, len(s), n))
+            self._vistas[tipo] = vistas
+        return self._vistas[tipo]
+
+    def registrar(
+        self,
+        sha256: str,
+        tipo: str,
+        nombre: str,
+        filas: int,
+        nuevas: int,
+        claves: List[str],
+        guardar: bool = True,
+    ) -> Dict:
+        entrada = {
+            "sha256": sha256,
+            "tipo": tipo,
+            "nombre": nombre,
+            "filas": int(filas),
+            "nuevas": int(nuevas),
+            "importado": datetime.now().isoformat(timespec="seconds"),
+            "claves": "".join(claves),
+        }
+        # re-import forzado del mismo fichero: sustituye la entrada anterior
+        self.ficheros[:] = [
+            f for f in self.ficheros if not (f.get("sha256") == sha256 and f.get("tipo") == tipo)
+        ]
+        self.ficheros.append(entrada)
+        if self._podar_claves(tipo):
+            self._vistas.pop(tipo, None)
+        else:
+            self._vistas.get(tipo, set()).update(claves)
+        if guardar:
+            self.store.save()
+        return entrada
+
+    def _podar_claves(self, tipo: str) -> bool:
+        """Vacía los hashes de fila de los ficheros de `tipo` que exceden RETENER_CLAVES."""
+        con_claves = [f for f in self.ficheros if f.get("tipo") == tipo and f.get("claves")]
+        viejos = con_claves[: max(len(con_claves) - self.RETENER_CLAVES, 0)]
+        for f in viejos:
+            f["claves"] = ""
+        return bool(viejos)
+
+    def descartar_desde(self, limite: str, tipos: Sequence[str]) -> int:
+        """Quita las entradas de `tipos` importadas después de `limite` (ISO); devuelve cuántas.
+
+        Al restaurar un backup sin copia del registro: lo importado después ya
+        no está en los datos y tiene que poder volver a importarse.
+        """
+        antes = len(self.ficheros)
+        self.ficheros[:] = [
+            f
+            for f in self.ficheros
+            if f.get("tipo") not in tipos or str(f.get("importado", "")) <= limite
+        ]
+        self._vistas.clear()
+        quitadas = antes - len(self.ficheros)
+        if quitadas:
+            self.store.save()
+        return quitadas
+
+    def sustituir_tipos(self, entradas: List[Dict], tipos: Sequence[str]) -> None:
+        """Toma de `entradas` (p.ej. una copia de backup) solo las de `tipos`."""
+        otras = [f for f in self.ficheros if f.get("tipo") not in tipos]
+        nuevas = [f for f in entradas if f.get("tipo") in tipos]
+        self.ficheros[:] = sorted(otras + nuevas, key=lambda f: str(f.get("importado", "")))
+        self._vistas.clear()
+        self.store.save()
 
 
 ###############################################################################
@@ -493,6 +883,200 @@ class ClientManager:
 ###############################################################################
 
 
+class MapaClientes:
+    """Cliente por defecto de cada modelo para importaciones, construido una sola vez.
+
+    - por_modelo: modelo -> cliente de info_modelos de la previsión
+
+    El cliente de una salida es el del primer pendiente *vivo* con ese
+    (modelo, talla, pedido) y, si no lo tiene, este por defecto. Los pendientes
+    vivos los conoce quien aplica (PlanSalidas, el bucle interactivo): uno
+    agotado por una línea anterior del mismo fichero ya no cuenta.
+    """
+
+    def __init__(self, prevision: "Prevision"):
+        self.por_modelo: Dict[str, str] = {}
+        for modelo, info in prevision.info_modelos.items():
+            cliente = (info or {}).get("cliente", "") or ""
+            if cliente:
+                self.por_modelo[modelo] = cliente
+
+
+class PlanSalidas:
+    """Salidas en bloque calculadas SIN tocar los stores.
+
+    Reproduce la aritmética de register_exit línea a línea sobre contadores
+    propios (delta de stock por celda, cantidad que queda en cada pendiente),
+    así que sirve igual para aplicar (Inventory.apply_exits_plan) que para
+    previsualizar una importación (resumen). Se puede llamar a agregar()
+    varias veces: cada bloque ve lo que consumieron los anteriores.
+
+    `pendientes` sustituye a la lista de la previsión (una simulación le suma
+    las altas que aún no ha aplicado); un plan así solo sirve de vista previa.
+    """
+
+    def __init__(
+        self,
+        inventory: "Inventory",
+        clientes: Optional[MapaClientes] = None,
+        pendientes: Optional[List[Dict]] = None,
+    ):
+        self.inventory = inventory
+        self.pendientes = inventory.prevision.pedidos if pendientes is None else pendientes
+        self.clientes = clientes or MapaClientes(inventory.prevision)
+        self.indice: Dict[Tuple[str, str, str], List[int]] = {}
+        for i, p in enumerate(self.pendientes):
+            self.indice.setdefault(self._clave(p), []).append(i)
+        self.delta: Dict[Tuple[str, str], int] = {}  # (modelo, talla) -> -salidas
+        self.restante: Dict[int, int] = {}  # pendientes servidos en parte
+        self.servidos: set = set()  # pendientes agotados (se eliminan)
+        self.salidas: List[Dict] = []  # entradas nuevas de historial_salidas
+        self._cache_talla: Dict[object, str] = {}
+        self._cache_codigo: Dict[object, str] = {}
+
+    @staticmethod
+    def _clave(p: Dict) -> Tuple[str, str, str]:
+        return (
+            str(p.get("modelo", "")).strip().upper(),
+            norm_talla(p.get("talla", "")),
+            norm_codigo(p.get("pedido", "")),
+        )
+
+    def _talla(self, x) -> str:
+        try:
+            return self._cache_talla[x]
+        except KeyError:
+            v = self._cache_talla[x] = norm_talla(x)
+            return v
+
+    def _codigo(self, x) -> str:
+        try:
+            return self._cache_codigo[x]
+        except KeyError:
+            v = self._cache_codigo[x] = norm_codigo(x)
+            return v
+
+    def agregar(self, lineas: List[Dict]) -> None:
+        """Planifica líneas de salida (modelo, talla, cantidad, pedido, albaran, fecha, cliente).
+
+        Si cliente es None: primer pendiente vivo de ese (modelo, talla, pedido)
+        con cliente y, si no hay, el por defecto del MapaClientes del plan.
+        """
+        pendientes = self.pendientes
+        servidos = self.servidos
+        restante_de = self.restante
+        hoy = datetime.now().strftime("%Y-%m-%d")
+        por_modelo = self.clientes.por_modelo
+        for L in lineas:
+            modelo = str(L["modelo"]).strip().upper()
+            talla = self._talla(L["talla"])
+            pedido = self._codigo(L["pedido"])
+            albaran = self._codigo(L["albaran"])
+            cantidad = L["cantidad"]
+            fecha = L.get("fecha")
+            if fecha is None:
+                fecha = hoy
+            posiciones = self.indice.get((modelo, talla, pedido), ())
+
+            cliente = L.get("cliente")
+            if cliente is None:
+                cliente = ""
+                for i in posiciones:
+                    p = pendientes[i]
+                    if i not in servidos and p.get("pedido", "") == pedido and p.get("cliente"):
+                        cliente = p["cliente"]
+                        break
+                cliente = cliente or por_modelo.get(modelo, "")
+
+            k = (modelo, talla)
+            self.delta[k] = self.delta.get(k, 0) - cantidad
+            self.salidas.append(
+                {
+                    "modelo": modelo,
+                    "talla": talla,
+                    "cantidad": cantidad,
+                    "fecha": fecha,
+                    "pedido": pedido,
+                    "albaran": albaran,
+                    "cliente": cliente,
+                }
+            )
+
+            # Descuento de pendientes: mismo orden y aritmética que register_exit
+            restante = cantidad
+            for i in posiciones:
+                if restante <= 0:
+                    break
+                if i in servidos:
+                    continue
+                queda = restante_de.get(i, pendientes[i]["cantidad"])
+                if restante >= queda:
+                    restante -= queda
+                    servidos.add(i)
+                    restante_de.pop(i, None)
+                else:
+                    restante_de[i] = queda - restante
+                    restante = 0
+
+    def claves_servidas(self) -> List[Tuple[str, str, str]]:
+        """(modelo, talla, pedido) que desaparecen de la previsión al aplicar el plan."""
+        def _tal_cual(p):
+            return (p["modelo"], norm_talla(p["talla"]), p["pedido"])
+
+        agotadas: Dict[Tuple[str, str, str], bool] = {}
+        for i in sorted(self.servidos):
+            p = self.pendientes[i]
+            clave = _tal_cual(p)
+            if clave not in agotadas:
+                # solo si se agotan TODOS los pendientes con esa misma clave
+                agotadas[clave] = all(
+                    j in self.servidos
+                    for j in self.indice[self._clave(p)]
+                    if _tal_cual(self.pendientes[j]) == clave
+                )
+        return [c for c, si in agotadas.items() if si]
+
+    def resumen(self) -> Dict[str, List[Dict]]:
+        """Diff del plan frente a los stores actuales (para vista previa)."""
+        almacen = self.inventory.almacen
+        stock: List[Dict] = []
+        negativos: List[Dict] = []
+        for (modelo, talla), delta in self.delta.items():
+            antes = almacen.get(modelo, {}).get(talla, 0)
+            try:
+                despues = antes + delta
+            except TypeError:  # celda con valor no numérico
+                despues = None
+            fila = {
+                "MODELO": modelo,
+                "TALLA": talla,
+                "ANTES": antes,
+                "DELTA": delta,
+                "DESPUES": despues,
+            }
+            stock.append(fila)
+            if despues is not None and despues < 0 <= antes:
+                negativos.append(fila)
+
+        pendientes: List[Dict] = []
+        for i in sorted(self.servidos | set(self.restante)):
+            p = self.pendientes[i]
+            completo = i in self.servidos
+            pendientes.append(
+                {
+                    "MODELO": p.get("modelo", ""),
+                    "TALLA": p.get("talla", ""),
+                    "PEDIDO": p.get("pedido", ""),
+                    "CLIENTE": p.get("cliente", ""),
+                    "PENDIENTE": p["cantidad"],
+                    "SERVIDO": p["cantidad"] if completo else p["cantidad"] - self.restante[i],
+                    "QUEDA": 0 if completo else self.restante[i],
+                    "ESTADO": "COMPLETO" if completo else "PARCIAL",
+                }
+            )
+        return {"stock": stock, "pendientes": pendientes, "negativos_nuevos": negativos}
+
+
 class Inventory:
     """Gestiona el stock real y los movimientos de entradas/salidas."""
 
@@ -696,6 +1280,46 @@ class Inventory:
         print(f"✅ Salida registrada: {modelo} T{talla} -{cantidad}")
         return True
 
+    def register_exits_bulk(self, lineas: List[Dict], guardar: bool = True) -> int:
+        """Registra muchas salidas de golpe (importaciones).
+
+        Mismo resultado que llamar a register_exit línea a línea y en orden,
+        pero planificando sobre PlanSalidas (pendientes indexados una sola vez)
+        y guardando ambos JSON al final (una escritura por fichero).
+
+        Cada línea: modelo, talla, cantidad, pedido, albaran, fecha y cliente
+        (None = se resuelve como en PlanSalidas.agregar).
+        Devuelve el número de líneas registradas.
+        """
+        if not lineas:
+            return 0
+        plan = PlanSalidas(self)
+        plan.agregar(lineas)
+        return self.apply_exits_plan(plan, guardar=guardar)
+
+    def apply_exits_plan(self, plan: "PlanSalidas", guardar: bool = True) -> int:
+        """Vuelca un PlanSalidas en almacén, historial y pendientes.
+
+        El plan queda gastado: sus índices apuntan a la lista de pendientes
+        anterior, así que para más líneas hay que crear otro.
+        """
+        for (modelo, talla), delta in plan.delta.items():
+            fila = self.almacen.setdefault(modelo, {})
+            fila[talla] = fila.get(talla, 0) + delta
+        self.historial_salidas.extend(plan.salidas)
+
+        pendientes = self.prevision.pedidos
+        for i, cantidad in plan.restante.items():
+            pendientes[i]["cantidad"] = cantidad
+        if plan.servidos:
+            pendientes[:] = [p for i, p in enumerate(pendientes) if i not in plan.servidos]
+
+        if guardar:
+            self.save()
+            self.prevision.save()
+        print(f"✅ {len(plan.salidas)} salidas registradas")
+        return len(plan.salidas)
+
     def modify_stock(
         self,
         modelo: str,
@@ -1019,6 +1643,59 @@ class Prevision:
         self.save()
         print(f"✅ Pedido pendiente registrado: {modelo} T{talla} -{cantidad}")
 
+    def register_pendings_bulk(self, lineas: List[Dict], guardar: bool = True) -> int:
+        """Registra muchos pendientes de golpe (importaciones).
+
+        Mismo resultado que register_pending línea a línea y en orden, pero con
+        un único guardado de prevision.json al final. No deduplica: el llamador
+        decide qué líneas son nuevas.
+        """
+        if not lineas:
+            return 0
+        nuevos = self.build_pendings(lineas)
+        self.pedidos.extend(nuevos)
+        if guardar:
+            self.save()
+        print(f"✅ {len(nuevos)} pedidos pendientes registrados")
+        return len(nuevos)
+
+    def build_pendings(self, lineas: List[Dict]) -> List[Dict]:
+        """Pendientes normalizados como los registraría register_pendings_bulk, sin añadirlos."""
+        hoy = datetime.now().strftime("%Y-%m-%d")
+        cache_talla: Dict[object, str] = {}
+        cache_codigo: Dict[object, str] = {}
+
+        def _talla(x):
+            try:
+                return cache_talla[x]
+            except KeyError:
+                r = cache_talla[x] = norm_talla(x)
+                return r
+            except TypeError:
+                return norm_talla(x)
+
+        def _codigo(x):
+            try:
+                return cache_codigo[x]
+            except KeyError:
+                r = cache_codigo[x] = norm_codigo(x)
+                return r
+            except TypeError:
+                return norm_codigo(x)
+
+        return [
+            {
+                "modelo": str(l["modelo"]).strip().upper(),
+                "talla": _talla(l["talla"]),
+                "cantidad": int(l["cantidad"]),
+                "pedido": _codigo(l["pedido"]),
+                "numero_pedido": _codigo(l.get("numero_pedido")) or "",
+                "cliente": l.get("cliente", ""),
+                "fecha": hoy if l.get("fecha") is None else l["fecha"],
+            }
+            for l in lineas
+        ]
+
     # -----------------------------
     # Utilidades de listado (con índice)
     # -----------------------------
@@ -1166,47 +1843,33 @@ class Prevision:
         """
         result: List[Dict[str, object]] = []
 
-        # Construir el set de todos los modelos y tallas que aparecen en alguna parte
-        modelos = (
-            set(inventory.almacen.keys())
-            | set(self.pedidos_fabricacion.keys())
-            | {str(p.get("modelo", "")).strip().upper() for p in self.pedidos}
-        )
+        # Índices (modelo -> talla -> unidades) en una pasada por fuente
+        fabricacion: Dict[str, Dict[str, int]] = {}
+        for modelo, items in self.pedidos_fabricacion.items():
+            por_talla = fabricacion.setdefault(modelo, {})
+            for it in items:
+                t = norm_talla(it.get("talla", ""))
+                por_talla[t] = por_talla.get(t, 0) + int(it.get("cantidad", 0) or 0)
+        pendientes: Dict[str, Dict[str, int]] = {}
+        for p in self.pedidos:
+            por_talla = pendientes.setdefault(str(p.get("modelo", "")).strip().upper(), {})
+            t = norm_talla(p.get("talla", ""))
+            por_talla[t] = por_talla.get(t, 0) + int(p.get("cantidad", 0) or 0)
+
+        # Todos los modelos y tallas que aparecen en alguna parte
+        modelos = set(inventory.almacen.keys()) | set(fabricacion) | set(pendientes)
 
         for modelo in sorted(modelos):
             info = inventory.info_modelos.get(modelo, {}) or self.info_modelos.get(
                 modelo, {}
             )
-
-            tallas = set(inventory.almacen.get(modelo, {}).keys())
-            tallas |= {
-                norm_talla(it.get("talla", ""))
-                for it in self.pedidos_fabricacion.get(modelo, [])
-            }
-            tallas |= {
-                norm_talla(p.get("talla", ""))
-                for p in self.pedidos
-                if str(p.get("modelo", "")).strip().upper() == modelo
-            }
+            stock = inventory.almacen.get(modelo, {})
+            fab = fabricacion.get(modelo, {})
+            pend = pendientes.get(modelo, {})
+            tallas = set(stock) | set(fab) | set(pend)
 
             for talla in sorted(tallas, key=talla_sort_key):
-                real = int(inventory.almacen.get(modelo, {}).get(talla, 0))
-
-                fabricar = sum(
-                    int(it.get("cantidad", 0) or 0)
-                    for it in self.pedidos_fabricacion.get(modelo, [])
-                    if norm_talla(it.get("talla", "")) == talla
-                )
-
-                pendientes = sum(
-                    int(p.get("cantidad", 0) or 0)
-                    for p in self.pedidos
-                    if str(p.get("modelo", "")).strip().upper() == modelo
-                    and norm_talla(p.get("talla", "")) == talla
-                )
-
-                total = real + fabricar - pendientes
-
+                total = int(stock.get(talla, 0)) + fab.get(talla, 0) - pend.get(talla, 0)
                 result.append(
                     {
                         "modelo": modelo,
@@ -1228,6 +1891,100 @@ class Prevision:
         self.store.save()
 
 
+###############################################################################
+# Informes CSV del pack de exportación
+###############################################################################
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """Un CSV del pack de exportación, descrito de forma declarativa.
+
+    Las filas salen de una fuente ya enriquecida con info_modelos y ordenada
+    por modelo (GestorStock._fuente_informe); el motor solo filtra, inserta
+    TOTAL MODELO / TOTAL GENERAL sobre `cantidad` y escribe.
+    `resumen` marca los informes agregados por fecha (07 y 08).
+    """
+
+    nombre: str
+    fuente: str
+    columnas: Tuple[str, ...]
+    cantidad: Optional[str] = None  # columna de los totales (None = sin totales)
+    filtro: Optional[Callable[[Dict], bool]] = None
+    ordenado: bool = True  # False = orden de origen de la fuente
+    resumen: Optional[str] = None  # "ultima_fecha" | "por_fecha"
+
+
+_COLS_ENTRADAS = ("FECHA", "MODELO", "DESCRIPCION", "COLOR", "TALLA", "CANTIDAD", "TALLER", "CLIENTE")
+_COLS_ORDENES = ("FECHA", "MODELO", "DESCRIPCION", "COLOR", "TALLA", "CANTIDAD")
+_COLS_ESTIMADO = ("MODELO", "DESCRIPCION", "COLOR", "TALLA", "STOCK_ESTIMADO")
+
+# En el orden de escritura de siempre (los mensajes y métricas salen igual)
+INFORMES_CSV: Tuple[ReportSpec, ...] = (
+    ReportSpec("01_entradas", "entradas", _COLS_ENTRADAS, cantidad="CANTIDAD"),
+    ReportSpec("07_entradas_ultima_fecha", "entradas", _COLS_ENTRADAS, resumen="ultima_fecha"),
+    ReportSpec(
+        "02_salidas",
+        "salidas",
+        ("FECHA", "MODELO", "DESCRIPCION", "COLOR", "TALLA", "CANTIDAD", "PEDIDO", "ALBARAN", "CLIENTE"),
+        cantidad="CANTIDAD",
+    ),
+    ReportSpec(
+        "00_stock_actual",
+        "stock",
+        ("MODELO", "DESCRIPCION", "COLOR", "CLIENTE", "TALLA", "STOCK"),
+        cantidad="STOCK",
+    ),
+    ReportSpec("04_ordenes_fabricacion", "ordenes", _COLS_ORDENES, cantidad="CANTIDAD"),
+    ReportSpec("08_ordenes_por_fecha", "ordenes", _COLS_ORDENES, resumen="por_fecha"),
+    ReportSpec(
+        "03_pedidos_pendientes",
+        "pedidos",
+        ("FECHA", "PEDIDO", "NUMERO_PEDIDO", "MODELO", "DESCRIPCION", "COLOR", "TALLA", "CANTIDAD", "CLIENTE"),
+        cantidad="CANTIDAD",
+    ),
+    ReportSpec("05_stock_estimado", "estimado", _COLS_ESTIMADO, cantidad="STOCK_ESTIMADO"),
+    ReportSpec(
+        "06_orden_corte_sugerida",
+        "estimado",
+        _COLS_ESTIMADO,
+        filtro=lambda r: r["STOCK_ESTIMADO"] < 0,
+        ordenado=False,
+    ),
+)
+
+
+@dataclass
+class _FuenteInforme:
+    """Fuente de informes sin filas materializadas.
+
+    Solo guarda índices: `fila(i)` construye al vuelo la fila enriquecida i
+    (orden de origen) y `grupos` da el orden del informe, (modelo, índices)
+    por modelo y clave secundaria. Cada fila se crea, se escribe y se suelta.
+    """
+
+    n: int
+    fila: Callable[[int], Dict]
+    grupos: List[Tuple[str, List[int]]]
+
+    @property
+    def filas(self) -> Iterator[Dict]:
+        """Filas en orden de origen (generador nuevo en cada acceso)."""
+        return (self.fila(i) for i in range(self.n))
+
+
+_VERSION_INFORMES: Optional[str] = None
+
+
+def version_informes() -> str:
+    """Hash de este módulo: tocar el código de los informes invalida todas sus huellas."""
+    global _VERSION_INFORMES
+    if _VERSION_INFORMES is None:
+        with open(__file__, "rb") as f:
+            _VERSION_INFORMES = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    return _VERSION_INFORMES
+
+
 ###############################################################################
 # Sistema principal
 ###############################################################################
@@ -2128,627 +2885,372 @@ class GestorStock:
     # Exportación de datos
     # ------------------------------------------------------------------
     def _export_csv(
-        self, nombre_base: str, rows: List[Dict], campos: List[str]
-    ) -> None:
+        self, nombre_base: str, rows: Iterable[Dict], campos: List[str]
+    ) -> Optional[str]:
         """Escribe un listado de filas en un CSV en la ruta de exportación.
 
         Usa como nombre el parámetro `nombre_base` seguido de la fecha actual.
+        `rows` puede ser un generador: se escribe fila a fila.
+        Devuelve la ruta escrita (None si falló la escritura en disco). Un
+        error al generar las filas se propaga (sin dejar el CSV a medias):
+        es un fallo de los datos, no del export.
         """
         fecha = datetime.now().strftime("%Y-%m-%d")
         ruta = os.path.join(self.EXPORT_DIR, f"{nombre_base}_{fecha}.csv")
         try:
-            with open(ruta, "w", newline="", encoding="utf-8") as f:
-                writer = csv.DictWriter(f, fieldnames=campos, delimiter=";")
-                writer.writeheader()
-                writer.writerows(rows)
-            print(f"OK Exportado: {ruta}")
-        except Exception as e:
+            n = 0
+            with METRICS.phase(f"export:{nombre_base}"):
+                with open(ruta, "w", newline="", encoding="utf-8") as f:
+                    writer = csv.DictWriter(f, fieldnames=campos, delimiter=";")
+                    writer.writeheader()
+                    for r in rows:
+                        writer.writerow(r)
+                        n += 1
+        except OSError as e:
             print(f"ERROR exportando {nombre_base}: {e}")
+            return None
+        except BaseException:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            raise
+        METRICS.count("csv_rows", n)
+        print(f"OK Exportado: {ruta}")
+        return ruta
 
     def _exportar_todos_los_datos(self) -> None:
         """Exporta las tablas principales a CSV (entradas, salidas, stock, órdenes, pedidos, estimado)."""
-        # Exportar entradas con totalizadores
+        for spec, filas in self.generar_informes():
+            self._export_csv(spec.nombre, filas, list(spec.columnas))
+
+    def generar_informes(self, nombres: Optional[List[str]] = None):
+        """(ReportSpec, filas) de cada informe de INFORMES_CSV (o solo de `nombres`).
+
+        Cada fuente se indexa y ordena una sola vez y la comparten todos
+        los informes que la usan (01/07, 04/08, 05/06). `filas` es un
+        iterable de una pasada: quien necesite una lista, que la haga.
+        """
+        fuentes: Dict[str, _FuenteInforme] = {}
+        for spec in INFORMES_CSV:
+            if nombres is not None and spec.nombre not in nombres:
+                continue
+            if spec.fuente not in fuentes:
+                with METRICS.phase(f"fuente:{spec.fuente}"):
+                    fuentes[spec.fuente] = self._fuente_informe(spec.fuente)
+            fuente = fuentes[spec.fuente]
+            if spec.resumen == "ultima_fecha":
+                if fuente.n:
+                    yield spec, self._resumen_ultima_fecha(fuente)
+            elif spec.resumen == "por_fecha":
+                if fuente.n:
+                    yield spec, self._resumen_por_fecha(fuente.filas)
+            else:
+                yield spec, self._filas_informe(spec, fuente)
+
+    def huellas_informes(self, nombres: Optional[List[str]] = None) -> Dict[str, str]:
+        """Huella de cada informe de INFORMES_CSV (export incremental).
+
+        Versión del código + las secciones de datos que lee su fuente: un
+        pedido nuevo cambia pedidos/estimado pero no el historial de
+        entradas/salidas. Cada sección se serializa una sola vez.
+        """
+        inv, prev = self.inventory, self.prevision
+        secciones = {
+            "entradas": (inv.historial_entradas, inv.info_modelos),
+            "salidas": (inv.historial_salidas, inv.info_modelos),
+            "stock": (inv.almacen, inv.info_modelos),
+            "ordenes": (prev.pedidos_fabricacion, inv.info_modelos, prev.info_modelos),
+            "pedidos": (prev.pedidos, inv.info_modelos, prev.info_modelos),
+            "estimado": (
+                inv.almacen,
+                prev.pedidos,
+                prev.pedidos_fabricacion,
+                inv.info_modelos,
+                prev.info_modelos,
+            ),
+        }
+        hechas: Dict[int, str] = {}
+
+        def _hash(obj) -> str:
+            if id(obj) not in hechas:
+                texto = json.dumps(obj, ensure_ascii=False, default=str)
+                hechas[id(obj)] = hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+            return hechas[id(obj)]
+
+        out: Dict[str, str] = {}
+        for spec in INFORMES_CSV:
+            if nombres is not None and spec.nombre not in nombres:
+                continue
+            with METRICS.phase(f"huella:{spec.fuente}"):
+                partes = [version_informes(), spec.nombre] + [_hash(o) for o in secciones[spec.fuente]]
+            out[spec.nombre] = hashlib.blake2b("|".join(partes).encode("utf-8"), digest_size=16).hexdigest()
+        return out
+
+    @staticmethod
+    def _filas_informe(spec: ReportSpec, fuente: _FuenteInforme) -> Iterator[Dict]:
+        """Filas del informe con TOTAL MODELO tras cada modelo y TOTAL GENERAL al final.
+
+        Generador: los totales se acumulan al vuelo según salen las filas.
+        """
+        if not spec.ordenado:
+            yield from (r for r in fuente.filas if spec.filtro is None or spec.filtro(r))
+            return
+        col = spec.cantidad
+        vacia = dict.fromkeys(spec.columnas, "")
+        fila = fuente.fila
+        total_general = 0
+        for modelo, indices in fuente.grupos:
+            total_modelo = 0
+            for i in indices:
+                r = fila(i)
+                if spec.filtro is not None and not spec.filtro(r):
+                    continue
+                if col:
+                    total_modelo += r[col]
+                yield r
+            if col:
+                total_general += total_modelo
+                yield {**vacia, "MODELO": modelo, "TALLA": "TOTAL MODELO", col: total_modelo}
+        if col:
+            yield {**vacia, "TALLA": "TOTAL GENERAL", col: total_general}
+
+    def _fuente_informe(self, nombre: str) -> _FuenteInforme:
+        """Fuente indexada: filas con info de modelo resuelta al vuelo, en orden de origen y agrupadas."""
         info = self.inventory.info_modelos
-        entradas_export = []
-        for e in self.inventory.historial_entradas:
-            modelo_info = info.get(e["modelo"], {})
-            entradas_export.append(
-                {
+        info_prev = self.prevision.info_modelos
+        cache_talla: Dict[str, tuple] = {}
+        cache_fecha: Dict[object, Tuple[int, str]] = {}
+
+        def _talla(t):
+            try:
+                return cache_talla[t]
+            except KeyError:
+                k = cache_talla[t] = talla_sort_key(t)
+                return k
+            except TypeError:
+                return talla_sort_key(t)
+
+        def _fecha(v):
+            try:
+                return cache_fecha[v]
+            except KeyError:
+                f = parse_fecha_excel(v)
+                k = cache_fecha[v] = (0, f) if f else (1, "")
+                return k
+            except TypeError:
+                f = parse_fecha_excel(v)
+                return (0, f) if f else (1, "")
+
+        # raw: registros de origen (no se copian); fila(i) enriquece raw[i]
+        # al vuelo y clave(x) ordena dentro de cada modelo sin construir filas
+        modelo_de = lambda x: x["modelo"]  # noqa: E731
+        clave = lambda x: _talla(x["talla"])  # noqa: E731
+        if nombre == "entradas":
+            raw = self.inventory.historial_entradas
+
+            def fila(i):
+                e = raw[i]
+                mi = info.get(e["modelo"], {})
+                return {
                     "FECHA": e["fecha"],
                     "MODELO": e["modelo"],
-                    "DESCRIPCION": modelo_info.get("descripcion", ""),
-                    "COLOR": modelo_info.get("color", ""),
+                    "DESCRIPCION": mi.get("descripcion", ""),
+                    "COLOR": mi.get("color", ""),
                     "TALLA": e["talla"],
                     "CANTIDAD": e["cantidad"],
                     "TALLER": e.get("taller", ""),
-                    "CLIENTE": e.get("cliente", modelo_info.get("cliente", "")),
+                    "CLIENTE": e.get("cliente", mi.get("cliente", "")),
                 }
-            )
-        # Añadir totales por modelo y total general
-        entradas_sorted = sorted(
-            entradas_export, key=lambda x: (x["MODELO"], talla_sort_key(x["TALLA"]))
-        )
-        entradas_con_totales = []
-        total_general_ent = 0
-        total_modelo = 0
-        current_model = None
-        for row in entradas_sorted:
-            modelo = row["MODELO"]
-            cantidad = row["CANTIDAD"]
-            total_general_ent += cantidad
-            if current_model is None:
-                current_model = modelo
-            if modelo != current_model:
-                entradas_con_totales.append(
-                    {
-                        "FECHA": "",
-                        "MODELO": current_model,
-                        "DESCRIPCION": "",
-                        "COLOR": "",
-                        "TALLA": "TOTAL MODELO",
-                        "CANTIDAD": total_modelo,
-                        "TALLER": "",
-                        "CLIENTE": "",
-                    }
-                )
-                total_modelo = 0
-                current_model = modelo
-            total_modelo += cantidad
-            entradas_con_totales.append(row)
-        if current_model is not None:
-            entradas_con_totales.append(
-                {
-                    "FECHA": "",
-                    "MODELO": current_model,
-                    "DESCRIPCION": "",
-                    "COLOR": "",
-                    "TALLA": "TOTAL MODELO",
-                    "CANTIDAD": total_modelo,
-                    "TALLER": "",
-                    "CLIENTE": "",
-                }
-            )
-        entradas_con_totales.append(
-            {
-                "FECHA": "",
-                "MODELO": "",
-                "DESCRIPCION": "",
-                "COLOR": "",
-                "TALLA": "TOTAL GENERAL",
-                "CANTIDAD": total_general_ent,
-                "TALLER": "",
-                "CLIENTE": "",
-            }
-        )
-        self._export_csv(
-            "01_entradas",
-            entradas_con_totales,
-            [
-                "FECHA",
-                "MODELO",
-                "DESCRIPCION",
-                "COLOR",
-                "TALLA",
-                "CANTIDAD",
-                "TALLER",
-                "CLIENTE",
-            ],
-        )
 
-        # También exportamos un resumen de la última fecha de entrada.
-        # Agrupamos las entradas por fecha y modelo y calculamos el total de la fecha más reciente.
-        if entradas_export:
-            # Identificar la última fecha registrada en las entradas (lexicográficamente más reciente).
-            fechas = [e["FECHA"] for e in entradas_export if e["FECHA"]]
-            try:
-                # Convertir a datetime para ordenar correctamente fechas con diferentes formatos
-                fechas_dt = [datetime.fromisoformat(f) for f in fechas if f]
-                last_date = max(fechas_dt).strftime("%Y-%m-%d")
-            except Exception:
-                # Si alguna fecha no es ISO, recurrimos a ordenar como cadena
-                last_date = max(fechas) if fechas else ""
-            entradas_last_summary = []
-            total_general_last = 0
-            # Agrupamos por modelo
-            entries_last = [e for e in entradas_export if e["FECHA"] == last_date]
-            modelo_totals: Dict[str, int] = {}
-            for e in entries_last:
-                modelo_totals[e["MODELO"]] = (
-                    modelo_totals.get(e["MODELO"], 0) + e["CANTIDAD"]
-                )
-                total_general_last += e["CANTIDAD"]
-            # Generar filas con total por modelo
-            for modelo, cant in sorted(modelo_totals.items()):
-                entradas_last_summary.append(
-                    {
-                        "FECHA": last_date,
-                        "MODELO": modelo,
-                        "DESCRIPCION": info.get(modelo, {}).get("descripcion", ""),
-                        "COLOR": info.get(modelo, {}).get("color", ""),
-                        "TALLA": "TOTAL FECHA",
-                        "CANTIDAD": cant,
-                        "TALLER": "",
-                        "CLIENTE": info.get(modelo, {}).get("cliente", ""),
-                    }
-                )
-            # Añadir fila total general
-            entradas_last_summary.append(
-                {
-                    "FECHA": last_date,
-                    "MODELO": "",
-                    "DESCRIPCION": "",
-                    "COLOR": "",
-                    "TALLA": "TOTAL FECHA",
-                    "CANTIDAD": total_general_last,
-                    "TALLER": "",
-                    "CLIENTE": "",
-                }
-            )
-            # Guardamos este resumen con un nombre específico
-            self._export_csv(
-                "07_entradas_ultima_fecha",
-                entradas_last_summary,
-                [
-                    "FECHA",
-                    "MODELO",
-                    "DESCRIPCION",
-                    "COLOR",
-                    "TALLA",
-                    "CANTIDAD",
-                    "TALLER",
-                    "CLIENTE",
-                ],
-            )
-        # Exportar salidas con totalizadores
-        salidas_export = []
-        for s in self.inventory.historial_salidas:
-            modelo_info = info.get(s["modelo"], {})
-            salidas_export.append(
-                {
+        elif nombre == "salidas":
+            raw = self.inventory.historial_salidas
+
+            def fila(i):
+                s = raw[i]
+                mi = info.get(s["modelo"], {})
+                return {
                     "FECHA": s["fecha"],
                     "MODELO": s["modelo"],
-                    "DESCRIPCION": modelo_info.get("descripcion", ""),
-                    "COLOR": modelo_info.get("color", ""),
+                    "DESCRIPCION": mi.get("descripcion", ""),
+                    "COLOR": mi.get("color", ""),
                     "TALLA": s["talla"],
                     "CANTIDAD": s["cantidad"],
                     "PEDIDO": s["pedido"],
                     "ALBARAN": s["albaran"],
-                    "CLIENTE": s.get("cliente") or modelo_info.get("cliente", ""),
-                }
-            )
-        salidas_sorted = sorted(
-            salidas_export, key=lambda x: (x["MODELO"], talla_sort_key(x["TALLA"]))
-        )
-        salidas_con_totales = []
-        total_general_sal = 0
-        total_modelo = 0
-        current_model = None
-        for row in salidas_sorted:
-            modelo = row["MODELO"]
-            cantidad = row["CANTIDAD"]
-            total_general_sal += cantidad
-            if current_model is None:
-                current_model = modelo
-            if modelo != current_model:
-                salidas_con_totales.append(
-                    {
-                        "FECHA": "",
-                        "MODELO": current_model,
-                        "DESCRIPCION": "",
-                        "COLOR": "",
-                        "TALLA": "TOTAL MODELO",
-                        "CANTIDAD": total_modelo,
-                        "PEDIDO": "",
-                        "ALBARAN": "",
-                        "CLIENTE": "",
-                    }
-                )
-                total_modelo = 0
-                current_model = modelo
-            total_modelo += cantidad
-            salidas_con_totales.append(row)
-        if current_model is not None:
-            salidas_con_totales.append(
-                {
-                    "FECHA": "",
-                    "MODELO": current_model,
-                    "DESCRIPCION": "",
-                    "COLOR": "",
-                    "TALLA": "TOTAL MODELO",
-                    "CANTIDAD": total_modelo,
-                    "PEDIDO": "",
-                    "ALBARAN": "",
-                    "CLIENTE": "",
+                    "CLIENTE": s.get("cliente") or mi.get("cliente", ""),
                 }
-            )
-        salidas_con_totales.append(
-            {
-                "FECHA": "",
-                "MODELO": "",
-                "DESCRIPCION": "",
-                "COLOR": "",
-                "TALLA": "TOTAL GENERAL",
-                "CANTIDAD": total_general_sal,
-                "PEDIDO": "",
-                "ALBARAN": "",
-                "CLIENTE": "",
-            }
-        )
-        self._export_csv(
-            "02_salidas",
-            salidas_con_totales,
-            [
-                "FECHA",
-                "MODELO",
-                "DESCRIPCION",
-                "COLOR",
-                "TALLA",
-                "CANTIDAD",
-                "PEDIDO",
-                "ALBARAN",
-                "CLIENTE",
-            ],
-        )
-        # Exportar stock actual
-        stock_list = []
-        total_general = 0
-        for modelo in sorted(self.inventory.almacen.keys()):
-            total_modelo = 0
-            for talla, cantidad in sorted(
-                self.inventory.almacen[modelo].items(),
-                key=lambda x: talla_sort_key(x[0]),
-            ):
-                stock_list.append(
-                    {
-                        "MODELO": modelo,
-                        "DESCRIPCION": info.get(modelo, {}).get("descripcion", ""),
-                        "COLOR": info.get(modelo, {}).get("color", ""),
-                        "CLIENTE": info.get(modelo, {}).get("cliente", ""),
-                        "TALLA": talla,
-                        "STOCK": cantidad,
-                    }
-                )
-                total_modelo += cantidad
-                total_general += cantidad
-            stock_list.append(
-                {
+
+        elif nombre == "stock":
+            # un grupo por modelo del almacén, aunque no tenga tallas (TOTAL MODELO 0)
+            raw = []
+            grupos = []
+            for modelo in sorted(self.inventory.almacen.keys()):
+                tallas = sorted(self.inventory.almacen[modelo].items(), key=lambda x: _talla(x[0]))
+                grupos.append((modelo, list(range(len(raw), len(raw) + len(tallas)))))
+                raw.extend((modelo, talla, cantidad) for talla, cantidad in tallas)
+
+            def fila(i):
+                modelo, talla, cantidad = raw[i]
+                mi = info.get(modelo, {})
+                return {
                     "MODELO": modelo,
-                    "DESCRIPCION": "",
-                    "COLOR": "",
-                    "CLIENTE": "",
-                    "TALLA": "TOTAL MODELO",
-                    "STOCK": total_modelo,
+                    "DESCRIPCION": mi.get("descripcion", ""),
+                    "COLOR": mi.get("color", ""),
+                    "CLIENTE": mi.get("cliente", ""),
+                    "TALLA": talla,
+                    "STOCK": cantidad,
                 }
-            )
-        stock_list.append(
-            {
-                "MODELO": "",
-                "DESCRIPCION": "",
-                "COLOR": "",
-                "CLIENTE": "",
-                "TALLA": "TOTAL GENERAL",
-                "STOCK": total_general,
-            }
-        )
-        self._export_csv(
-            "00_stock_actual",
-            stock_list,
-            ["MODELO", "DESCRIPCION", "COLOR", "CLIENTE", "TALLA", "STOCK"],
-        )
-        # Exportar órdenes de fabricación PENDIENTES (desde pedidos_fabricacion)
-        ordenes_export = []
-        for modelo, items in self.prevision.pedidos_fabricacion.items():
-            modelo_info = info.get(modelo, self.prevision.info_modelos.get(modelo, {}))
-            for it in items:
-                if int(it.get("cantidad", 0) or 0) <= 0:
-                    continue
-                ordenes_export.append(
-                    {
-                        "FECHA": it.get("fecha", ""),
-                        "MODELO": modelo,
-                        "DESCRIPCION": modelo_info.get("descripcion", ""),
-                        "COLOR": modelo_info.get("color", ""),
-                        "TALLA": norm_talla(it.get("talla", "")),
-                        "CANTIDAD": int(it.get("cantidad", 0) or 0),
-                    }
-                )
 
-        def _fecha_sort_key(val: object) -> Tuple[int, str]:
-            fecha_norm = parse_fecha_excel(val)
-            if fecha_norm:
-                return (0, fecha_norm)
-            return (1, "")
-
-        ordenes_sorted = sorted(
-            ordenes_export,
-            key=lambda x: (
-                x["MODELO"],
-                _fecha_sort_key(x.get("FECHA", "")),
-                talla_sort_key(x["TALLA"]),
-            ),
-        )
-        ordenes_con_totales = []
-        total_general_ord = 0
-        total_modelo = 0
-        current_model = None
-        for row in ordenes_sorted:
-            modelo = row["MODELO"]
-            cantidad = row["CANTIDAD"]
-            total_general_ord += cantidad
-            if current_model is None:
-                current_model = modelo
-            if modelo != current_model:
-                ordenes_con_totales.append(
-                    {
-                        "FECHA": "",
-                        "MODELO": current_model,
-                        "DESCRIPCION": "",
-                        "COLOR": "",
-                        "TALLA": "TOTAL MODELO",
-                        "CANTIDAD": total_modelo,
-                    }
-                )
-                total_modelo = 0
-                current_model = modelo
-            total_modelo += cantidad
-            ordenes_con_totales.append(row)
-        if current_model is not None:
-            ordenes_con_totales.append(
-                {
-                    "FECHA": "",
-                    "MODELO": current_model,
-                    "DESCRIPCION": "",
-                    "COLOR": "",
-                    "TALLA": "TOTAL MODELO",
-                    "CANTIDAD": total_modelo,
-                }
-            )
-        ordenes_con_totales.append(
-            {
-                "FECHA": "",
-                "MODELO": "",
-                "DESCRIPCION": "",
-                "COLOR": "",
-                "TALLA": "TOTAL GENERAL",
-                "CANTIDAD": total_general_ord,
-            }
-        )
-        self._export_csv(
-            "04_ordenes_fabricacion",
-            ordenes_con_totales,
-            ["FECHA", "MODELO", "DESCRIPCION", "COLOR", "TALLA", "CANTIDAD"],
-        )
+            return _FuenteInforme(len(raw), fila, grupos)
+        elif nombre == "ordenes":
+            # órdenes de fabricación PENDIENTES (cantidad > 0)
+            raw = [
+                (modelo, it)
+                for modelo, items in self.prevision.pedidos_fabricacion.items()
+                for it in items
+                if int(it.get("cantidad", 0) or 0) > 0
+            ]
 
-        # Además, generamos un CSV con totales por fecha y modelo para las órdenes de fabricación.
-        if ordenes_export:
-            # Agrupar por fecha y modelo
-            ordenes_by_date: Dict[Tuple[str, str], int] = {}
-            fechas_ord_set = set()
-            for o in ordenes_export:
-                fecha = o.get("FECHA", "")
-                modelo = o["MODELO"]
-                fechas_ord_set.add(fecha)
-                key = (fecha, modelo)
-                ordenes_by_date[key] = ordenes_by_date.get(key, 0) + o["CANTIDAD"]
-            # Construir resumen: para cada fecha, totales por modelo y total general
-            ordenes_summary: List[Dict[str, object]] = []
-            for fecha in sorted(fechas_ord_set):
-                total_general_fecha = 0
-                # Extraer modelos para esta fecha
-                modelos_fecha = {
-                    modelo for (f, modelo) in ordenes_by_date.keys() if f == fecha
+            def fila(i):
+                modelo, it = raw[i]
+                mi = info.get(modelo, info_prev.get(modelo, {}))
+                return {
+                    "FECHA": it.get("fecha", ""),
+                    "MODELO": modelo,
+                    "DESCRIPCION": mi.get("descripcion", ""),
+                    "COLOR": mi.get("color", ""),
+                    "TALLA": norm_talla(it.get("talla", "")),
+                    "CANTIDAD": int(it.get("cantidad", 0) or 0),
                 }
-                for modelo in sorted(modelos_fecha):
-                    cantidad = ordenes_by_date[(fecha, modelo)]
-                    total_general_fecha += cantidad
-                    ordenes_summary.append(
-                        {
-                            "FECHA": fecha,
-                            "MODELO": modelo,
-                            "DESCRIPCION": info.get(
-                                modelo, self.prevision.info_modelos.get(modelo, {})
-                            ).get("descripcion", ""),
-                            "COLOR": info.get(
-                                modelo, self.prevision.info_modelos.get(modelo, {})
-                            ).get("color", ""),
-                            "TALLA": "TOTAL FECHA",
-                            "CANTIDAD": cantidad,
-                        }
-                    )
-                # Añadir total general para la fecha
-                ordenes_summary.append(
-                    {
-                        "FECHA": fecha,
-                        "MODELO": "",
-                        "DESCRIPCION": "",
-                        "COLOR": "",
-                        "TALLA": "TOTAL FECHA",
-                        "CANTIDAD": total_general_fecha,
-                    }
-                )
-            self._export_csv(
-                "08_ordenes_por_fecha",
-                ordenes_summary,
-                ["FECHA", "MODELO", "DESCRIPCION", "COLOR", "TALLA", "CANTIDAD"],
-            )
-        # Exportar pedidos pendientes
-        pedidos_export = []
-        for p in self.prevision.pedidos:
-            modelo_info = info.get(
-                p["modelo"], self.prevision.info_modelos.get(p["modelo"], {})
+
+            modelo_de = lambda x: x[0]  # noqa: E731
+            clave = lambda x: (  # noqa: E731
+                _fecha(x[1].get("fecha", "")),
+                _talla(norm_talla(x[1].get("talla", ""))),
             )
-            pedidos_export.append(
-                {
+        elif nombre == "pedidos":
+            raw = self.prevision.pedidos
+
+            def fila(i):
+                p = raw[i]
+                mi = info.get(p["modelo"], info_prev.get(p["modelo"], {}))
+                return {
                     "FECHA": p["fecha"],
                     "PEDIDO": p["pedido"],
                     "NUMERO_PEDIDO": p.get("numero_pedido", ""),
                     "MODELO": p["modelo"],
-                    "DESCRIPCION": modelo_info.get("descripcion", ""),
-                    "COLOR": modelo_info.get("color", ""),
+                    "DESCRIPCION": mi.get("descripcion", ""),
+                    "COLOR": mi.get("color", ""),
                     "TALLA": p["talla"],
                     "CANTIDAD": p["cantidad"],
-                    "CLIENTE": p.get("cliente") or modelo_info.get("cliente", ""),
+                    "CLIENTE": p.get("cliente") or mi.get("cliente", ""),
                 }
-            )
-        # Añadir totales por modelo y total general a pedidos pendientes
-        # Agrupamos por modelo
-        pedidos_export_sorted = sorted(
-            pedidos_export,
-            key=lambda x: (
-                x["MODELO"],
-                _fecha_sort_key(x.get("FECHA", "")),
-                talla_sort_key(x["TALLA"]),
-            ),
-        )
-        pedidos_con_totales = []
-        total_general_pedidos = 0
-        total_modelo = 0
-        current_model = None
-        for row in pedidos_export_sorted:
-            modelo = row["MODELO"]
-            cantidad = row["CANTIDAD"]
-            total_general_pedidos += cantidad
-            if current_model is None:
-                current_model = modelo
-            if modelo != current_model:
-                # Añadir total del modelo anterior
-                pedidos_con_totales.append(
-                    {
-                        "FECHA": "",
-                        "PEDIDO": "",
-                        "NUMERO_PEDIDO": "",
-                        "MODELO": current_model,
-                        "DESCRIPCION": "",
-                        "COLOR": "",
-                        "TALLA": "TOTAL MODELO",
-                        "CANTIDAD": total_modelo,
-                        "CLIENTE": "",
-                    }
-                )
-                total_modelo = 0
-                current_model = modelo
-            total_modelo += cantidad
-            pedidos_con_totales.append(row)
-        # Añadir total del último modelo
-        if current_model is not None:
-            pedidos_con_totales.append(
-                {
-                    "FECHA": "",
-                    "PEDIDO": "",
-                    "NUMERO_PEDIDO": "",
-                    "MODELO": current_model,
-                    "DESCRIPCION": "",
-                    "COLOR": "",
-                    "TALLA": "TOTAL MODELO",
-                    "CANTIDAD": total_modelo,
-                    "CLIENTE": "",
+
+            clave = lambda x: (_fecha(x["fecha"]), _talla(x["talla"]))  # noqa: E731
+        elif nombre == "estimado":
+            raw = self.prevision.calc_estimated_stock(self.inventory)
+
+            def fila(i):
+                item = raw[i]
+                return {
+                    "MODELO": item["modelo"],
+                    "DESCRIPCION": item["descripcion"],
+                    "COLOR": item["color"],
+                    "TALLA": item["talla"],
+                    "STOCK_ESTIMADO": item["stock_estimado"],
                 }
-            )
-        # Añadir total general
-        pedidos_con_totales.append(
+
+        else:
+            raise ValueError(f"Fuente de informe desconocida: {nombre}")
+
+        # Índices por modelo (orden de origen) y ordenados en cada grupo:
+        # equivale al sorted((MODELO, clave)) estable de cada informe por
+        # separado, pero solo guarda enteros, no filas
+        por_modelo: Dict[str, List[int]] = {}
+        for i, x in enumerate(raw):
+            por_modelo.setdefault(modelo_de(x), []).append(i)
+        grupos = [
+            (m, sorted(por_modelo[m], key=lambda i: clave(raw[i]))) for m in sorted(por_modelo)
+        ]
+        return _FuenteInforme(len(raw), fila, grupos)
+
+    def _resumen_ultima_fecha(self, fuente: _FuenteInforme) -> List[Dict]:
+        """07: total por modelo de las entradas de la fecha más reciente (dos pasadas)."""
+        info = self.inventory.info_modelos
+        fechas = {e["FECHA"] for e in fuente.filas if e["FECHA"]}
+        try:
+            # fechas ISO con formatos distintos -> comparar como datetime
+            last_date = max(datetime.fromisoformat(f) for f in fechas).strftime("%Y-%m-%d")
+        except Exception:
+            # alguna fecha no ISO: ordenar como cadena
+            last_date = max(fechas) if fechas else ""
+        modelo_totals: Dict[str, int] = {}
+        total_general = 0
+        for e in fuente.filas:
+            if e["FECHA"] == last_date:
+                modelo_totals[e["MODELO"]] = modelo_totals.get(e["MODELO"], 0) + e["CANTIDAD"]
+                total_general += e["CANTIDAD"]
+        out = [
+            {
+                "FECHA": last_date,
+                "MODELO": modelo,
+                "DESCRIPCION": info.get(modelo, {}).get("descripcion", ""),
+                "COLOR": info.get(modelo, {}).get("color", ""),
+                "TALLA": "TOTAL FECHA",
+                "CANTIDAD": cant,
+                "TALLER": "",
+                "CLIENTE": info.get(modelo, {}).get("cliente", ""),
+            }
+            for modelo, cant in sorted(modelo_totals.items())
+        ]
+        out.append(
             {
-                "FECHA": "",
-                "PEDIDO": "",
-                "NUMERO_PEDIDO": "",
+                "FECHA": last_date,
                 "MODELO": "",
                 "DESCRIPCION": "",
                 "COLOR": "",
-                "TALLA": "TOTAL GENERAL",
-                "CANTIDAD": total_general_pedidos,
+                "TALLA": "TOTAL FECHA",
+                "CANTIDAD": total_general,
+                "TALLER": "",
                 "CLIENTE": "",
             }
         )
-        self._export_csv(
-            "03_pedidos_pendientes",
-            pedidos_con_totales,
-            [
-                "FECHA",
-                "PEDIDO",
-                "NUMERO_PEDIDO",
-                "MODELO",
-                "DESCRIPCION",
-                "COLOR",
-                "TALLA",
-                "CANTIDAD",
-                "CLIENTE",
-            ],
-        )
-        # Exportar stock estimado
-        estimado_export = []
-        for item in self.prevision.calc_estimated_stock(self.inventory):
-            estimado_export.append(
-                {
-                    "MODELO": item["modelo"],
-                    "DESCRIPCION": item["descripcion"],
-                    "COLOR": item["color"],
-                    "TALLA": item["talla"],
-                    "STOCK_ESTIMADO": item["stock_estimado"],
-                }
-            )
-        # Añadir totales por modelo y total general al stock estimado
-        estimado_sorted = sorted(
-            estimado_export, key=lambda x: (x["MODELO"], talla_sort_key(x["TALLA"]))
-        )
-        estimado_con_totales = []
-        total_general_est = 0
-        total_modelo = 0
-        current_model = None
-        for row in estimado_sorted:
-            modelo = row["MODELO"]
-            cantidad = row["STOCK_ESTIMADO"]
-            total_general_est += cantidad
-            if current_model is None:
-                current_model = modelo
-            if modelo != current_model:
-                # total del modelo anterior
-                estimado_con_totales.append(
+        return out
+
+    def _resumen_por_fecha(self, ordenes: Iterable[Dict]) -> List[Dict]:
+        """08: órdenes de fabricación con total por fecha y modelo."""
+        info = self.inventory.info_modelos
+        info_prev = self.prevision.info_modelos
+        por_fecha: Dict[str, Dict[str, int]] = {}
+        for o in ordenes:
+            modelos = por_fecha.setdefault(o.get("FECHA", ""), {})
+            modelos[o["MODELO"]] = modelos.get(o["MODELO"], 0) + o["CANTIDAD"]
+        out: List[Dict] = []
+        for fecha in sorted(por_fecha):
+            total_fecha = 0
+            for modelo, cantidad in sorted(por_fecha[fecha].items()):
+                total_fecha += cantidad
+                mi = info.get(modelo, info_prev.get(modelo, {}))
+                out.append(
                     {
-                        "MODELO": current_model,
-                        "DESCRIPCION": "",
-                        "COLOR": "",
-                        "TALLA": "TOTAL MODELO",
-                        "STOCK_ESTIMADO": total_modelo,
+                        "FECHA": fecha,
+                        "MODELO": modelo,
+                        "DESCRIPCION": mi.get("descripcion", ""),
+                        "COLOR": mi.get("color", ""),
+                        "TALLA": "TOTAL FECHA",
+                        "CANTIDAD": cantidad,
                     }
                 )
-                total_modelo = 0
-                current_model = modelo
-            total_modelo += cantidad
-            estimado_con_totales.append(row)
-        # total del último modelo
-        if current_model is not None:
-            estimado_con_totales.append(
+            out.append(
                 {
-                    "MODELO": current_model,
+                    "FECHA": fecha,
+                    "MODELO": "",
                     "DESCRIPCION": "",
                     "COLOR": "",
-                    "TALLA": "TOTAL MODELO",
-                    "STOCK_ESTIMADO": total_modelo,
+                    "TALLA": "TOTAL FECHA",
+                    "CANTIDAD": total_fecha,
                 }
             )
-        # total general
-        estimado_con_totales.append(
-            {
-                "MODELO": "",
-                "DESCRIPCION": "",
-                "COLOR": "",
-                "TALLA": "TOTAL GENERAL",
-                "STOCK_ESTIMADO": total_general_est,
-            }
-        )
-        self._export_csv(
-            "05_stock_estimado",
-            estimado_con_totales,
-            ["MODELO", "DESCRIPCION", "COLOR", "TALLA", "STOCK_ESTIMADO"],
-        )
-        # Exportar informe de stock bajo
-        low_stock_export = [
-            item for item in estimado_export if item["STOCK_ESTIMADO"] < 0
-        ]
-        self._export_csv(
-            "06_orden_corte_sugerida",
-            low_stock_export,
-            ["MODELO", "DESCRIPCION", "COLOR", "TALLA", "STOCK_ESTIMADO"],
-        )
+        return out
 
     # # ------------------------------------------------------------------
     # # Importar albaranes desde Excel (con control de duplicados)
@@ -2764,7 +3266,7 @@ class GestorStock:
         ruta = ruta or self.ALBARANES_EXCEL
 
         try:
-            df = pd.read_excel(ruta, skiprows=25)
+            df = leer_excel_erp(ruta, COLUMNAS_ALBARANES)
         except Exception as e:
             print(f"❌ Error leyendo el Excel: {e}")
             return
@@ -2870,6 +3372,7 @@ class GestorStock:
                 return
 
         # 4) Procesar con el modo elegido
+        clientes = MapaClientes(self.prevision)
         nuevas_salidas = 0
         import_rows = []  # Log general de albaranes importados
         pedidos_servicios = []  # Log de pendientes servidos
@@ -2896,7 +3399,7 @@ class GestorStock:
             else:
                 qty = qty_excel
 
-            # Resolver cliente (igual que antes): por pendiente coincidente o info_modelos
+            # Resolver cliente: por pendiente vivo coincidente o info_modelos
             cliente_pend = ""
             for p in self.prevision.pedidos:
                 if (
@@ -2907,10 +3410,7 @@ class GestorStock:
                     cliente_pend = p.get("cliente", "") or ""
                     if cliente_pend:
                         break
-            cliente_info = self.prevision.info_modelos.get(modelo, {}).get(
-                "cliente", ""
-            )
-            cliente_resuelto = cliente_pend or cliente_info or ""
+            cliente_resuelto = cliente_pend or clientes.por_modelo.get(modelo, "")
 
             # Guardar copia de pedidos antes para calcular servido/restante
             pedidos_antes = list(self.prevision.pedidos)
@@ -3021,7 +3521,7 @@ class GestorStock:
         )
         ruta = ruta or self.PEDIDOS_EXCEL
         try:
-            df = pd.read_excel(ruta, skiprows=26)
+            df = leer_excel_erp(ruta, COLUMNAS_PEDIDOS, opcionales=("Cliente",))
         except Exception as e:
             print(f"❌ Error leyendo el Excel: {e}")
             return
@@ -3047,6 +3547,10 @@ class GestorStock:
         nuevos = 0
         duplicados = 0
         import_rows = []  # filas importadas para log
+        bloque = []
+        # Cliente: por columna 'Cliente' (si existe) o por info_modelos
+        tiene_cliente = "Cliente" in df.columns
+        por_modelo = MapaClientes(self.prevision).por_modelo
         for _, fila in df.iterrows():
             modelo = str(fila["CodigoArticulo"]).strip().upper()
             talla = norm_talla(fila["DesTalla"])
@@ -3064,26 +3568,22 @@ class GestorStock:
             if clave in ya_existentes:
                 duplicados += 1
                 continue
-            # Resolver cliente: por columna 'Cliente' (si existe) o por info_modelos
-            tiene_cliente = "Cliente" in df.columns
             cliente_excel = ""
             if tiene_cliente and not pd.isna(fila["Cliente"]):
                 cliente_excel = str(fila["Cliente"]).strip()
+            cliente_resuelto = cliente_excel or por_modelo.get(modelo, "")
 
-            cliente_info = self.prevision.info_modelos.get(modelo, {}).get(
-                "cliente", ""
-            )
-            cliente_resuelto = cliente_excel or cliente_info or ""
-
-            # Registrar pendiente con cliente resuelto
-            self.prevision.register_pending(
-                modelo,
-                talla,
-                cantidad,
-                pedido,
-                cliente=cliente_resuelto,
-                fecha=fecha,
-                numero_pedido=numero_pedido,
+            # Registrar pendiente con cliente resuelto (se guarda en bloque al final)
+            bloque.append(
+                {
+                    "modelo": modelo,
+                    "talla": talla,
+                    "cantidad": cantidad,
+                    "pedido": pedido,
+                    "cliente": cliente_resuelto,
+                    "fecha": fecha,
+                    "numero_pedido": numero_pedido,
+                }
             )
             ya_existentes.add(clave)
             nuevos += 1
@@ -3101,6 +3601,7 @@ class GestorStock:
                 }
             )
 
+        self.prevision.register_pendings_bulk(bloque)
         print(f"✅ Se han importado {nuevos} nuevos pedidos desde el Excel.")
         if duplicados:
             print(f"ℹ️ Se han ignorado {duplicados} registros duplicados.")
@@ -0,0 +1,14 @@
+# app/(app)/tools/almacen/globalia-stock/bench/__init__.py
+"""
+Benchmarks del gestor de stock a escala realista.
+
+- bench.generate: dataset sintético determinista (JSON + Excel de albaranes/pedidos)
+- bench.run:      cronometra cada op de cli.OPS sobre ese dataset y emite JSON/CSV
+- bench.imports:  import_albaranes/import_pedidos a 1k/10k/100k filas x historial,
+                  filas/s, pico de RSS, escrituras por store y --check contra línea base
+
+Uso (desde globalia-stock/):
+    python -m bench.generate --out /tmp/globalia-bench --modelos 2000
+    python -m bench.run --data /tmp/globalia-bench --report /tmp/bench_HEAD.json
+    python -m bench.imports --check
+"""
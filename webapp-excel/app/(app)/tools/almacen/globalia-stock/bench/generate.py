@@ -0,0 +1,280 @@
+# app/(app)/tools/almacen/globalia-stock/bench/generate.py
+"""
+Generador determinista de datasets sintéticos para globalia-stock.
+
+Produce en --out:
+- datos_almacen.json, prevision.json, talleres.json, clientes.json
+- albaranes.xlsx (cabecera en fila 26 -> skiprows=25, como el ERP)
+- pedidos.xlsx   (cabecera en fila 27 -> skiprows=26)
+- dataset.json   (parámetros + claves de ejemplo para bench.run)
+
+Misma semilla + mismos parámetros => mismos ficheros (byte a byte los JSON).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from openpyxl import Workbook
+
+FAMILIAS = {
+    "CAM": ("Camisa", ["XS", "S", "M", "L", "XL", "XXL"]),
+    "POL": ("Polo", ["XS", "S", "M", "L", "XL", "XXL"]),
+    "BLZ": ("Blazer", ["34", "36", "38", "40", "42", "44", "46", "48"]),
+    "PAN": ("Pantalon", ["34", "36", "38", "40", "42", "44", "46", "48"]),
+    "ACC": ("Accesorio", ["TALLA UNICA"]),
+}
+COLORES = ["Azul marino", "Negro", "Gris titanio", "Blanco", "Burdeos", "Verde oliva"]
+ALBARANES_SKIP = 25
+PEDIDOS_SKIP = 26
+
+
+@dataclass
+class Escala:
+    seed: int = 42
+    modelos: int = 200
+    tallas_por_modelo: int = 5
+    entradas: int = 5000
+    salidas: int = 5000
+    pendientes: int = 2000
+    fabricacion: int = 500
+    albaran_rows: int = 1000
+    pedido_rows: int = 1000
+    clientes: int = 12
+    talleres: int = 8
+    base_date: str = "2026-01-01"
+
+
+def _fecha(base: date, rng: random.Random, desde: int, hasta: int) -> str:
+    return (base + timedelta(days=rng.randint(desde, hasta))).isoformat()
+
+
+def generar(out_dir: Path, esc: Escala) -> Dict:
+    rng = random.Random(esc.seed)
+    base = date.fromisoformat(esc.base_date)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    clientes = [f"Cliente Bench {i:03d}" for i in range(1, esc.clientes + 1)]
+    talleres = [f"Taller Bench {i:02d}" for i in range(1, esc.talleres + 1)]
+
+    # --- catálogo ---
+    info_modelos: Dict[str, Dict[str, str]] = {}
+    tallas_modelo: Dict[str, List[str]] = {}
+    familias = list(FAMILIAS)
+    for i in range(1, esc.modelos + 1):
+        fam = familias[i % len(familias)]
+        nombre, tallas = FAMILIAS[fam]
+        m = f"BEN-{fam}-{i:05d}"
+        n = min(esc.tallas_por_modelo, len(tallas))
+        ini = rng.randint(0, len(tallas) - n)
+        tallas_modelo[m] = tallas[ini : ini + n]
+        info_modelos[m] = {
+            "descripcion": f"{nombre} bench {i}",
+            "color": rng.choice(COLORES),
+            "cliente": rng.choice(clientes),
+        }
+    modelos = list(info_modelos)
+
+    def _mt():
+        m = rng.choice(modelos)
+        return m, rng.choice(tallas_modelo[m])
+
+    # --- movimientos (último año) ---
+    entradas = []
+    for _ in range(esc.entradas):
+        m, t = _mt()
+        entradas.append(
+            {
+                "modelo": m,
+                "talla": t,
+                "cantidad": rng.randint(5, 120),
+                "taller": rng.choice(talleres),
+                "fecha": _fecha(base, rng, -365, -1),
+            }
+        )
+    salidas = []
+    for i in range(esc.salidas):
+        m, t = _mt()
+        salidas.append(
+            {
+                "modelo": m,
+                "talla": t,
+                "cantidad": rng.randint(1, 60),
+                "fecha": _fecha(base, rng, -365, -1),
+                "pedido": str(4500000000 + rng.randint(1, esc.salidas * 2)),
+                "albaran": str(800000 + i),
+                "cliente": info_modelos[m]["cliente"],
+            }
+        )
+    entradas.sort(key=lambda e: e["fecha"])
+    salidas.sort(key=lambda s: s["fecha"])
+
+    almacen: Dict[str, Dict[str, int]] = {m: {} for m in modelos}
+    for e in entradas:
+        almacen[e["modelo"]][e["talla"]] = almacen[e["modelo"]].get(e["talla"], 0) + e["cantidad"]
+    for s in salidas:
+        almacen[s["modelo"]][s["talla"]] = almacen[s["modelo"]].get(s["talla"], 0) - s["cantidad"]
+    # ~2% de celdas descuadradas para que la auditoría tenga trabajo
+    for m in modelos:
+        for t in list(almacen[m]):
+            if rng.random() < 0.02:
+                almacen[m][t] += rng.randint(-10, 10)
+
+    # --- previsión ---
+    pedidos = []
+    for i in range(esc.pendientes):
+        m, t = _mt()
+        pedidos.append(
+            {
+                "modelo": m,
+                "talla": t,
+                "cantidad": rng.randint(1, 80),
+                "pedido": str(4600000000 + i // 3),
+                "numero_pedido": str(910000 + i // 3),
+                "cliente": info_modelos[m]["cliente"],
+                "fecha": _fecha(base, rng, -90, 180),
+            }
+        )
+    fabricacion: Dict[str, List[Dict]] = {}
+    for _ in range(esc.fabricacion):
+        m, t = _mt()
+        fabricacion.setdefault(m, []).append(
+            {"talla": t, "cantidad": rng.randint(20, 300), "fecha": _fecha(base, rng, 0, 120)}
+        )
+
+    inventario = {
+        "almacen": almacen,
+        "historial_entradas": entradas,
+        "historial_salidas": salidas,
+        "info_modelos": info_modelos,
+    }
+    prevision = {
+        "stock": {},
+        "__migracion_ordenes_fusionada__": True,
+        "ordenes": [],
+        "pedidos": pedidos,
+        "info_modelos": info_modelos,
+        "pedidos_fabricacion": fabricacion,
+    }
+    _dump(out_dir / "datos_almacen.json", inventario)
+    _dump(out_dir / "prevision.json", prevision)
+    _dump(out_dir / "talleres.json", {n: {"contacto": ""} for n in talleres})
+    _dump(out_dir / "clientes.json", {n: {"contacto": ""} for n in clientes})
+
+    _excel_albaranes(out_dir / "albaranes.xlsx", rng, esc, pedidos, salidas, modelos, tallas_modelo, base)
+    _excel_pedidos(out_dir / "pedidos.xlsx", rng, esc, pedidos, modelos, tallas_modelo, base)
+
+    manifest = {
+        "escala": asdict(esc),
+        "sample": {
+            "modelo": modelos[0],
+            "talla": tallas_modelo[modelos[0]][0],
+            "pedido": pedidos[0]["pedido"] if pedidos else "",
+        },
+        "files": {
+            "inv": "datos_almacen.json",
+            "prev": "prevision.json",
+            "talleres": "talleres.json",
+            "clientes": "clientes.json",
+            "albaranes": "albaranes.xlsx",
+            "pedidos": "pedidos.xlsx",
+        },
+    }
+    _dump(out_dir / "dataset.json", manifest)
+    return manifest
+
+
+def _dump(path: Path, data) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+def _preambulo(ws, n: int, titulo: str) -> None:
+    # Cabecera del informe del ERP (filas que el import salta con skiprows)
+    for i in range(n):
+        ws.append([titulo if i == 0 else f"-- línea de cabecera {i} --"])
+
+
+def _excel_albaranes(path, rng, esc, pedidos, salidas, modelos, tallas_modelo, base):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Albaranes")
+    _preambulo(ws, ALBARANES_SKIP, "LISTADO DE ALBARANES (bench)")
+    ws.append(
+        ["NumeroAlbaran", "FechaAlbaran", "CodigoArticulo", "DesArticulo",
+         "DesTalla", "Total", "SuPedido", "Precio"]
+    )
+    for i in range(esc.albaran_rows):
+        r = rng.random()
+        if r < 0.70 and pedidos:
+            # sirve un pendiente (a veces parcial, a veces de más)
+            p = rng.choice(pedidos)
+            m, t, ped = p["modelo"], p["talla"], p["pedido"]
+            qty = max(1, int(p["cantidad"] * rng.choice([0.5, 1, 1, 1.2])))
+            alb = 900000 + i
+        elif r < 0.85 and salidas:
+            # re-declara una salida ya registrada (duplicado para el ledger)
+            s = rng.choice(salidas)
+            m, t, ped, alb = s["modelo"], s["talla"], s["pedido"], s["albaran"]
+            qty = s["cantidad"] + rng.choice([0, 0, 2])
+        else:
+            m = rng.choice(modelos)
+            t = rng.choice(tallas_modelo[m])
+            ped, qty, alb = str(4700000000 + i), rng.randint(1, 40), 900000 + i
+        fecha = datetime.combine(base + timedelta(days=rng.randint(0, 30)), datetime.min.time())
+        ws.append(
+            [int(alb), fecha, m, "bench", int(t) if t.isdigit() else t, qty,
+             int(ped) if str(ped).isdigit() else ped, round(rng.uniform(5, 90), 2)]
+        )
+    wb.save(path)
+
+
+def _excel_pedidos(path, rng, esc, pedidos, modelos, tallas_modelo, base):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Pedidos")
+    _preambulo(ws, PEDIDOS_SKIP, "CARTERA DE PEDIDOS (bench)")
+    ws.append(
+        ["NumeroPedido", "FechaEntrega", "CodigoArticulo", "DesArticulo",
+         "DesTalla", "UnidadesPendientes", "SuPedido", "Cliente"]
+    )
+    for i in range(esc.pedido_rows):
+        if pedidos and rng.random() < 0.2:
+            # ya existe en previsión -> duplicado
+            p = rng.choice(pedidos)
+            m, t, ped, num = p["modelo"], p["talla"], p["pedido"], p["numero_pedido"]
+        else:
+            m = rng.choice(modelos)
+            t = rng.choice(tallas_modelo[m])
+            ped, num = str(4800000000 + i), str(950000 + i)
+        fecha = datetime.combine(base + timedelta(days=rng.randint(0, 180)), datetime.min.time())
+        ws.append(
+            [int(num), fecha, m, "bench", int(t) if t.isdigit() else t,
+             rng.randint(1, 80), int(ped), ""]
+        )
+    wb.save(path)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Dataset sintético para globalia-stock")
+    p.add_argument("--out", required=True)
+    for k, v in asdict(Escala()).items():
+        p.add_argument(f"--{k.replace('_', '-')}", dest=k, type=type(v), default=v)
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    esc = Escala(**{k: getattr(args, k) for k in asdict(Escala())})
+    manifest = generar(Path(args.out), esc)
+    print(json.dumps({"ok": True, "out": str(Path(args.out).resolve()), **manifest}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,283 @@
+# app/(app)/tools/almacen/globalia-stock/bench/imports.py
+"""
+Benchmark de importaciones (albaranes y pedidos) a escala de exportación ERP.
+
+Matriz filas x historial: para cada nº de filas del Excel (--rows) y cada
+tamaño de historial de los stores (--history: entradas/salidas, la mitad en
+pendientes) genera (o reutiliza en --data) un dataset y mide import_albaranes
+e import_pedidos, reales y simulados, un proceso por llamada como en Next:
+
+    python -m bench.imports --rows 1000,10000,100000 --history 5000,50000
+    python -m bench.imports --save-baseline          # guarda bench/baselines/imports.json
+    python -m bench.imports --check --threshold 0.3  # falla si filas/s cae >30%
+    python -m bench.imports --paridad                # import_dir simulado == real
+
+Por caso: tiempo de pared, filas/s, pico de RSS, fases de _metrics y
+escrituras por store (save:*.json). Con --check, un caso regresa si sus
+filas/s bajan más de --threshold respecto a la línea base o si escribe más
+veces algún store. Con --paridad se añade por dataset un caso
+import_dir:paridad que falla si la simulación del lote no cuadra con la
+importación real (recuentos, servidos y diff frente a los stores escritos).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+from bench.generate import Escala, generar  # noqa: E402
+from bench.run import _call, _git_label  # noqa: E402
+
+BASELINE = HERE / "baselines" / "imports.json"
+
+CASES = [
+    ("import_albaranes", "albaranes", ["--modo", "d"]),
+    ("import_albaranes:simular", "albaranes", ["--simular", "1"]),
+    ("import_pedidos", "pedidos", []),
+    ("import_pedidos:simular", "pedidos", ["--simular", "1"]),
+]
+
+
+def _lista(valor: str) -> List[int]:
+    return [int(v) for v in str(valor).split(",") if v.strip()]
+
+
+def _dataset(base: Path, filas: int, historial: int, seed: int) -> Path:
+    """Dataset r<filas>_h<historial> (se genera solo si no existe)."""
+    data = base / f"r{filas}_h{historial}"
+    if not (data / "dataset.json").exists():
+        generar(
+            data,
+            Escala(
+                seed=seed,
+                entradas=historial,
+                salidas=historial,
+                pendientes=historial // 2,
+                albaran_rows=filas,
+                pedido_rows=filas,
+            ),
+        )
+    return data
+
+
+def _escrituras(metrics: Dict[str, Any]) -> Dict[str, int]:
+    calls = metrics.get("calls") or {}
+    return {k.split(":", 1)[1]: v for k, v in sorted(calls.items()) if k.startswith("save:")}
+
+
+def run_dataset(data: Path, filas: int, historial: int, repeat: int = 3) -> List[Dict[str, Any]]:
+    manifest = json.loads((data / "dataset.json").read_text(encoding="utf-8"))
+    root = Path(tempfile.mkdtemp(prefix="globalia-imports-"))
+    try:
+        tpl = root / "template"
+        tpl.mkdir()
+        for key in ("inv", "prev", "talleres", "clientes"):
+            shutil.copy2(data / manifest["files"][key], tpl / manifest["files"][key])
+
+        summary: List[Dict[str, Any]] = []
+        for name, fichero, extra in CASES:
+            op = name.split(":")[0]
+            excel = str((data / manifest["files"][fichero]).resolve())
+            walls, metas, oks = [], [], []
+            for i in range(repeat):
+                work = root / f"run_{i}"
+                shutil.copytree(tpl, work)
+                wall_ms, res, _proc = _call(work, op, ["--excel-path", excel, *extra])
+                walls.append(wall_ms)
+                metas.append((res or {}).get("_metrics") or {})
+                oks.append(bool(res and res.get("ok")))
+                shutil.rmtree(work, ignore_errors=True)
+            wall = statistics.median(walls)
+            last = metas[-1]
+            rss = [m["peak_rss_mb"] for m in metas if m.get("peak_rss_mb") is not None]
+            summary.append(
+                {
+                    "case": f"{name}@{filas}/h{historial}",
+                    "ok": all(oks),
+                    "rows": filas,
+                    "history": historial,
+                    "wall_ms_median": round(wall, 3),
+                    "rows_per_s": round(filas / (wall / 1000.0), 1) if wall else None,
+                    "peak_rss_mb": max(rss) if rss else None,
+                    "store_writes": _escrituras(last),
+                    "phases_ms": last.get("phases_ms"),
+                }
+            )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return summary
+
+
+def _stores(work: Path) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+    inv = json.loads((work / "datos_almacen.json").read_text(encoding="utf-8"))
+    prev = json.loads((work / "prevision.json").read_text(encoding="utf-8"))
+    return inv.get("almacen") or {}, prev.get("pedidos") or []
+
+
+def _recuentos(res: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{k: v for k, v in f.items() if k != "ESTADO"} for f in res.get("ficheros") or []]
+
+
+def _servidos(res: Dict[str, Any]) -> List[str]:
+    return sorted(json.dumps(s, sort_keys=True) for s in res.get("servidos") or [])
+
+
+def paridad(data: Path, filas: int, historial: int) -> Dict[str, Any]:
+    """
+    import_dir simulado y real sobre el mismo lote (pedidos + albaranes del
+    dataset): mismos recuentos por fichero y en total, mismos servidos, y el
+    diff de la simulación igual a lo que la real escribe en los stores.
+    """
+    manifest = json.loads((data / "dataset.json").read_text(encoding="utf-8"))
+    root = Path(tempfile.mkdtemp(prefix="globalia-paridad-"))
+    try:
+        for key in ("inv", "prev", "talleres", "clientes"):
+            for work in (root / "simular", root / "real"):
+                work.mkdir(exist_ok=True)
+                shutil.copy2(data / manifest["files"][key], work / manifest["files"][key])
+        lote = ["--excel-dir", str(data.resolve()), "--workers", "1"]
+        _, sim, _ = _call(root / "simular", "import_dir", [*lote, "--simular", "1"])
+        _, real, _ = _call(root / "real", "import_dir", lote)
+        sim, real = sim or {}, real or {}
+
+        diferencias: List[str] = []
+        if sim.get("totales") != real.get("totales"):
+            diferencias.append(f"totales: {sim.get('totales')} vs {real.get('totales')}")
+        if _recuentos(sim) != _recuentos(real):
+            diferencias.append("ficheros: recuentos distintos")
+        if _servidos(sim) != _servidos(real):
+            diferencias.append("servidos distintos")
+
+        # el diff simulado frente al cambio real de los stores
+        diff = sim.get("diff") or {}
+        antes, pend_antes = _stores(root / "simular")  # la simulación no escribe
+        despues, pend_despues = _stores(root / "real")
+        cambios = {
+            (m, t): v - antes.get(m, {}).get(t, 0)
+            for m, tallas in despues.items()
+            for t, v in tallas.items()
+            if v != antes.get(m, {}).get(t)
+        }
+        deltas = {(r["MODELO"], r["TALLA"]): r["DELTA"] for r in diff.get("stock") or []}
+        if deltas != cambios:
+            diferencias.append(f"stock: {len(deltas)} celdas en el diff vs {len(cambios)} cambiadas")
+        completos = len(pend_antes) + (real.get("totales") or {}).get("nuevos", 0) - len(pend_despues)
+        if (diff.get("totales") or {}).get("pendientes_completos") != completos:
+            diferencias.append(
+                f"pendientes completos: {(diff.get('totales') or {}).get('pendientes_completos')} vs {completos}"
+            )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        "case": f"import_dir:paridad@{filas}/h{historial}",
+        "ok": bool(sim.get("ok") and real.get("ok")) and not diferencias,
+        "rows": filas,
+        "history": historial,
+        "diferencias": diferencias,
+    }
+
+
+def run(
+    base: Path,
+    filas: List[int],
+    historiales: List[int],
+    repeat: int = 3,
+    seed: int = 42,
+    con_paridad: bool = False,
+) -> Dict[str, Any]:
+    summary: List[Dict[str, Any]] = []
+    for h in historiales:
+        for n in filas:
+            data = _dataset(base, n, h, seed)
+            summary += run_dataset(data, n, h, repeat=repeat)
+            if con_paridad:
+                summary.append(paridad(data, n, h))
+    return {
+        "meta": {"label": _git_label(), "repeat": repeat, "rows": filas, "history": historiales, "seed": seed},
+        "summary": summary,
+    }
+
+
+def check(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Casos que regresan frente a la línea base (filas/s o nº de escrituras)."""
+    prev = {s["case"]: s for s in baseline.get("summary", [])}
+    regresiones = []
+    for s in report["summary"]:
+        b = prev.get(s["case"])
+        if not b:
+            continue
+        motivo: List[str] = []
+        if b.get("rows_per_s") and s.get("rows_per_s") is not None:
+            minimo = b["rows_per_s"] * (1.0 - threshold)
+            s["baseline_rows_per_s"] = b["rows_per_s"]
+            s["delta_pct"] = round((s["rows_per_s"] - b["rows_per_s"]) / b["rows_per_s"] * 100.0, 1)
+            if s["rows_per_s"] < minimo:
+                motivo.append(f"rows_per_s {s['rows_per_s']} < {round(minimo, 1)}")
+        for store, n in (s.get("store_writes") or {}).items():
+            if n > (b.get("store_writes") or {}).get(store, 0):
+                motivo.append(f"{store}: {n} escrituras (base {(b.get('store_writes') or {}).get(store, 0)})")
+        if motivo:
+            regresiones.append({"case": s["case"], "motivo": motivo})
+    return regresiones
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark de import_albaranes / import_pedidos")
+    p.add_argument("--data", default="", help="carpeta de datasets r<filas>_h<historial> (se reutilizan)")
+    p.add_argument("--rows", default="1000,10000,100000", help="filas del Excel, separadas por comas")
+    p.add_argument("--history", default="5000,50000", help="entradas/salidas en los stores, por comas")
+    p.add_argument("--seed", type=int, default=Escala.seed)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--report", default="", help="ruta del informe JSON (opcional)")
+    p.add_argument("--baseline", default=str(BASELINE), help="línea base para --check / --save-baseline")
+    p.add_argument("--save-baseline", dest="save_baseline", action="store_true")
+    p.add_argument("--check", action="store_true", help="falla si hay regresión frente a --baseline")
+    p.add_argument("--threshold", type=float, default=0.3, help="caída de filas/s tolerada (0.3 = 30%%)")
+    p.add_argument("--paridad", action="store_true", help="compara import_dir simulado y real por dataset")
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    base = Path(args.data) if args.data else Path(tempfile.gettempdir()) / "globalia-imports-data"
+    report = run(
+        base, _lista(args.rows), _lista(args.history),
+        repeat=max(1, args.repeat), seed=args.seed, con_paridad=args.paridad,
+    )
+
+    ok = all(s["ok"] for s in report["summary"])
+    if args.check:
+        ruta = Path(args.baseline)
+        if not ruta.exists():
+            print(json.dumps({"ok": False, "error": "MISSING_BASELINE", "detail": str(ruta)}))
+            return 1
+        baseline = json.loads(ruta.read_text(encoding="utf-8"))
+        report["meta"]["baseline"] = (baseline.get("meta") or {}).get("label")
+        report["meta"]["threshold"] = args.threshold
+        report["regressions"] = check(report, baseline, args.threshold)
+        ok = ok and not report["regressions"]
+    if args.save_baseline:
+        ruta = Path(args.baseline)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        resumen = [{k: v for k, v in s.items() if k != "phases_ms"} for s in report["summary"]]
+        ruta.write_text(
+            json.dumps({"meta": report["meta"], "summary": resumen}, indent=2, ensure_ascii=False) + "\n",
+            encoding="utf-8",
+        )
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps({"ok": ok, **report}, ensure_ascii=False))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,330 @@
+# app/(app)/tools/almacen/globalia-stock/bench/run.py
+"""
+Runner de benchmarks: ejecuta cada op de cli.OPS (como lo hace Next: un proceso
+por llamada) sobre una copia limpia del dataset y recoge tiempos + _metrics.
+
+    python -m bench.run --data /tmp/globalia-bench --report /tmp/bench.json
+    python -m bench.run --data /tmp/globalia-bench --report /tmp/new.json --baseline /tmp/bench.json
+
+Escribe <report>.json (detalle + resumen) y <report>.csv (resumen por caso).
+Con --baseline añade la variación de la mediana frente a otro informe.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+HERE = Path(__file__).resolve().parent
+STOCK_DIR = HERE.parent
+CLI = STOCK_DIR / "cli.py"
+sys.path.insert(0, str(STOCK_DIR))
+
+from bench.generate import Escala, generar  # noqa: E402
+
+SUMMARY_COLS = [
+    "case",
+    "n",
+    "ok",
+    "wall_ms_median",
+    "wall_ms_min",
+    "total_ms_median",
+    "compute_ms_median",
+    "peak_rss_mb_max",
+    "baseline_wall_ms_median",
+    "delta_pct",
+]
+
+
+# ops que el dataset sintético no puede alimentar (import_ediwin necesita un PDF EDI real)
+SIN_CASO = {"import_ediwin"}
+
+
+def _cases(ctx: Dict[str, Any]) -> List[Tuple[str, List[str]]]:
+    """(nombre_caso, args extra). nombre = op[:variante]."""
+    m, t = ctx["sample"]["modelo"], ctx["sample"]["talla"]
+    ped = ctx["sample"]["pedido"] or "BENCH-P0"
+    cambios = json.dumps({"cambios": ctx["audit_cambios"]}, ensure_ascii=False)
+    out_zip = lambda n: ["--out", str(Path("{work}") / f"{n}.zip")]  # noqa: E731
+    return [
+        # listados
+        ("status", []),
+        ("preview_stock", []),
+        ("list_pendings", []),
+        ("list_fabrication", []),
+        ("calc_estimated", []),
+        ("list_modelos", []),
+        ("list_tallas", ["--modelo", m]),
+        ("list_catalog", []),
+        # movimientos / CRUD
+        ("register_entry", ["--modelo", m, "--talla", t, "--cantidad", "5"]),
+        ("register_exit", ["--modelo", m, "--talla", t, "--cantidad", "1",
+                           "--pedido", ped, "--albaran", "BENCH-ALB-1"]),
+        ("add_pending", ["--modelo", m, "--talla", t, "--cantidad", "3",
+                         "--pedido", "BENCH-P1", "--cliente", "Cliente Bench 001"]),
+        ("edit_pending", ["--idx", "1", "--cantidad", "4"]),
+        ("delete_pending", ["--idx", "1"]),
+        ("add_fabrication", ["--modelo", m, "--talla", t, "--cantidad", "50"]),
+        ("edit_fabrication_qty", ["--idx", "1", "--cantidad", "60"]),
+        # auditoría y saneos
+        ("audit_preview", []),
+        ("audit_apply", ["--payload-json", cambios]),
+        ("audit_regularize", ["--payload-json", cambios]),
+        ("fix_negatives_to_zero", []),
+        ("fix_bad_stock_values", []),
+        ("purge_bad_talla_keys", []),
+        # maestros
+        ("update_model_info", ["--modelo", m, "--descripcion", "bench"]),
+        ("add_taller", ["--nombre", "Taller Bench Nuevo"]),
+        ("add_cliente", ["--nombre", "Cliente Bench Nuevo"]),
+        # importaciones
+        ("import_albaranes", ["--excel-path", ctx["albaranes"], "--modo", "d"]),
+        ("import_albaranes:simular", ["--excel-path", ctx["albaranes"], "--simular", "1"]),
+        ("import_pedidos", ["--excel-path", ctx["pedidos"]]),
+        ("import_pedidos:simular", ["--excel-path", ctx["pedidos"], "--simular", "1"]),
+        ("import_dir", ["--excel-dir", ctx["data_dir"]]),
+        ("import_dir:simular", ["--excel-dir", ctx["data_dir"], "--simular", "1"]),
+        # backups
+        ("backup_create", []),
+        ("backup_list", []),
+        ("backup_restore", ["--name", "datos_almacen_bench.json"]),
+        # exports
+        ("export_csv_pack", out_zip("csv_pack")),
+        ("export_stock_negativo", out_zip("stock_negativo")),
+        ("export_excel_pack", out_zip("excel_pack")),
+        # utilidades
+        ("metrics_report", ["--metrics-log", ctx["metrics_log"]]),
+        ("profile_report", ["--profile-path", ctx["pstats"]]),
+    ]
+
+
+def _common_args(work: Path) -> List[str]:
+    return [
+        "--inv", str(work / "datos_almacen.json"),
+        "--prev", str(work / "prevision.json"),
+        "--talleres", str(work / "talleres.json"),
+        "--clientes", str(work / "clientes.json"),
+        "--export-dir", str(work / "EXPORT"),
+        "--backup-dir", str(work / "backups"),
+    ]
+
+
+def _last_json(stdout: str) -> Optional[Dict[str, Any]]:
+    for line in reversed((stdout or "").strip().splitlines()):
+        line = line.strip()
+        if line.startswith("{"):
+            try:
+                return json.loads(line)
+            except Exception:
+                return None
+    return None
+
+
+def _call(work: Path, op: str, extra: List[str], metrics_log: Optional[str] = None):
+    cmd = [sys.executable, str(CLI), "--op", op, *_common_args(work), "--metrics", "1"]
+    cmd += [a.replace("{work}", str(work)) for a in extra]
+    if metrics_log:
+        cmd += ["--metrics-log", metrics_log]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+    wall_ms = (time.perf_counter() - t0) * 1000.0
+    return wall_ms, _last_json(proc.stdout), proc
+
+
+def _prepare_template(data: Path, root: Path) -> Tuple[Path, Dict[str, Any]]:
+    manifest = json.loads((data / "dataset.json").read_text(encoding="utf-8"))
+    tpl = root / "template"
+    tpl.mkdir(parents=True)
+    for key in ("inv", "prev", "talleres", "clientes"):
+        shutil.copy2(data / manifest["files"][key], tpl / manifest["files"][key])
+    (tpl / "backups").mkdir()
+    shutil.copy2(tpl / "datos_almacen.json", tpl / "backups" / "datos_almacen_bench.json")
+
+    ctx: Dict[str, Any] = {
+        "sample": manifest["sample"],
+        "albaranes": str((data / manifest["files"]["albaranes"]).resolve()),
+        "pedidos": str((data / manifest["files"]["pedidos"]).resolve()),
+        "data_dir": str(Path(data).resolve()),
+        "metrics_log": str(root / "setup_metrics.ndjson"),
+    }
+
+    # cambios de auditoría reales para audit_apply / audit_regularize
+    scratch = root / "scratch"
+    shutil.copytree(tpl, scratch)
+    _, res, _ = _call(scratch, "audit_preview", [], ctx["metrics_log"])
+    ctx["audit_cambios"] = ((res or {}).get("rows") or [])[:200]
+    # un .pstats para profile_report
+    _, res, _ = _call(scratch, "status", ["--profile", "cprofile"], ctx["metrics_log"])
+    pstats_path = ((res or {}).get("_profile") or {}).get("path", "")
+    ctx["pstats"] = ""
+    if pstats_path and Path(pstats_path).exists():
+        ctx["pstats"] = str(shutil.copy2(pstats_path, root / "setup_status.pstats"))
+    shutil.rmtree(scratch, ignore_errors=True)
+    return tpl, {**ctx, "manifest": manifest}
+
+
+def _git_label() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=str(STOCK_DIR), capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+
+def _median(vals: List[float]) -> Optional[float]:
+    return round(statistics.median(vals), 3) if vals else None
+
+
+def run(data: Path, repeat: int = 3, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    from cli import OPS  # noqa: E402  (mismo árbol que se está midiendo)
+
+    root = Path(tempfile.mkdtemp(prefix="globalia-bench-"))
+    try:
+        tpl, ctx = _prepare_template(Path(data), root)
+        cases = _cases(ctx)
+        cubiertos = {name.split(":")[0] for name, _ in cases} | SIN_CASO
+        # cualquier op nueva sin caso se mide igualmente con args por defecto
+        cases += [(op, []) for op in OPS if op not in cubiertos]
+        if only:
+            cases = [c for c in cases if c[0].split(":")[0] in only or c[0] in only]
+
+        results = []
+        for name, extra in cases:
+            op = name.split(":")[0]
+            for i in range(repeat):
+                work = root / f"run_{op}_{i}"
+                shutil.copytree(tpl, work)
+                wall_ms, res, proc = _call(work, op, extra)
+                met = (res or {}).get("_metrics") or {}
+                results.append(
+                    {
+                        "case": name,
+                        "repeat": i,
+                        "ok": bool(res and res.get("ok")),
+                        "error": None if res and res.get("ok") else (
+                            (res or {}).get("error") or proc.stderr.strip()[-300:]
+                        ),
+                        "wall_ms": round(wall_ms, 3),
+                        "total_ms": met.get("total_ms"),
+                        "compute_ms": (met.get("phases_ms") or {}).get("compute"),
+                        "phases_ms": met.get("phases_ms"),
+                        "counts": met.get("counts"),
+                        "peak_rss_mb": met.get("peak_rss_mb"),
+                    }
+                )
+                shutil.rmtree(work, ignore_errors=True)
+        manifest = ctx["manifest"]
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        "meta": {
+            "label": _git_label(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "escala": manifest.get("escala"),
+        },
+        "results": results,
+        "summary": _summary(results),
+    }
+
+
+def _summary(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    by_case: Dict[str, List[Dict[str, Any]]] = {}
+    for r in results:
+        by_case.setdefault(r["case"], []).append(r)
+    out = []
+    for case, rs in by_case.items():
+        rss = [r["peak_rss_mb"] for r in rs if r["peak_rss_mb"] is not None]
+        out.append(
+            {
+                "case": case,
+                "n": len(rs),
+                "ok": all(r["ok"] for r in rs),
+                "wall_ms_median": _median([r["wall_ms"] for r in rs]),
+                "wall_ms_min": round(min(r["wall_ms"] for r in rs), 3),
+                "total_ms_median": _median([r["total_ms"] for r in rs if r["total_ms"] is not None]),
+                "compute_ms_median": _median([r["compute_ms"] for r in rs if r["compute_ms"] is not None]),
+                "peak_rss_mb_max": max(rss) if rss else None,
+            }
+        )
+    return out
+
+
+def _apply_baseline(report: Dict[str, Any], baseline_path: Path) -> None:
+    base = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    prev = {s["case"]: s for s in base.get("summary", [])}
+    report["meta"]["baseline"] = (base.get("meta") or {}).get("label")
+    for s in report["summary"]:
+        b = prev.get(s["case"])
+        bm = b.get("wall_ms_median") if b else None
+        s["baseline_wall_ms_median"] = bm
+        s["delta_pct"] = (
+            round((s["wall_ms_median"] - bm) / bm * 100.0, 1) if bm and s["wall_ms_median"] else None
+        )
+
+
+def write_report(report: Dict[str, Any], path: Path) -> Tuple[Path, Path]:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    json_path = path.with_suffix(".json")
+    csv_path = path.with_suffix(".csv")
+    json_path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=SUMMARY_COLS, delimiter=";", extrasaction="ignore")
+        w.writeheader()
+        w.writerows(report["summary"])
+    return json_path, csv_path
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmarks de cli.OPS")
+    p.add_argument("--data", default="", help="dataset de bench.generate (si falta, se genera)")
+    p.add_argument("--report", required=True, help="ruta base del informe (.json/.csv)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--ops", default="", help="lista separada por comas (por defecto todas)")
+    p.add_argument("--baseline", default="", help="informe JSON anterior para comparar")
+    p.add_argument("--modelos", type=int, default=Escala.modelos)
+    p.add_argument("--seed", type=int, default=Escala.seed)
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    data = Path(args.data) if args.data else Path(tempfile.mkdtemp(prefix="globalia-data-"))
+    if not (data / "dataset.json").exists():
+        generar(data, Escala(seed=args.seed, modelos=args.modelos))
+
+    only = [o.strip() for o in args.ops.split(",") if o.strip()] or None
+    report = run(data, repeat=max(1, args.repeat), only=only)
+    if args.baseline:
+        _apply_baseline(report, Path(args.baseline))
+    json_path, csv_path = write_report(report, Path(args.report))
+    fallidos = [s["case"] for s in report["summary"] if not s["ok"]]
+    print(
+        json.dumps(
+            {"ok": not fallidos, "report": str(json_path), "csv": str(csv_path), "failed": fallidos},
+            ensure_ascii=False,
+        )
+    )
+    return 0 if not fallidos else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -18,52 +18,175 @@ Convención:
 from __future__ import annotations
 
 import sys
+import time
 from pathlib import Path
 
+_T_START = time.perf_counter()  # fase "import" de --metrics
+
 # Asegurar imports locales (backend y carpeta actual) aunque el cwd cambie
 HERE = Path(__file__).resolve().parent
 BACKEND_DIR = HERE / "backend"
+sys.path.insert(0, str(HERE.parent))  # _pylib (compartido entre tools de almacén)
 sys.path.insert(0, str(BACKEND_DIR))
 sys.path.insert(0, str(HERE))
 
 import argparse
+import base64
+import bisect
+import importlib.util
+import hashlib
 import io
 import json
+import math
 import os
+import re
 import shutil
 import sys
-import zipfile
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import contextlib
 
 
+import numpy as np
 import pandas as pd
 
 # Importar el core (misma carpeta)
-from gestor_oop import GestorStock, norm_codigo, norm_talla, parse_fecha_excel
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from gestor_oop import (
+    COLUMNAS_ALBARANES,
+    COLUMNAS_PEDIDOS,
+    EXTENSIONES_CSV,
+    FILAS_POR_TROZO,
+    INFORMES_CSV,
+    METRICS,
+    GestorStock,
+    ImportRegistry,
+    MapaClientes,
+    PlanSalidas,
+    leer_excel_erp,
+    leer_listado_erp,
+    norm_codigo,
+    norm_talla,
+    parse_fecha_excel,
+    talla_sort_key,
+)
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
 from openpyxl.utils import get_column_letter
+from _pylib.profiling import (
+    PROFILE_DIRNAME,
+    PROFILE_MODES,
+    profile_path,
+    profiled,
+    summarize_pstats,
+)
+from _pylib.zipstream import NIVEL_DEFECTO, ZipStream
+
+_T_IMPORTED = time.perf_counter()
 
 
 # -----------------------
 # JSON helpers (stdout)
 # -----------------------
 def _ok(**payload):
-    print(json.dumps({"ok": True, **payload}, ensure_ascii=False))
-    return 0
+    return _emit({"ok": True, **payload})
 
 
 def _fail(code: str, detail: str = ""):
-    print(
-        json.dumps({"ok": False, "error": code, "detail": detail}, ensure_ascii=False)
-    )
+    _emit({"ok": False, "error": code, "detail": detail})
     return 1
 
 
+def _emit(payload: Dict[str, Any]) -> int:
+    if _RUN["extra"]:
+        payload = {**payload, **_RUN["extra"]}
+    if METRICS.enabled:
+        if isinstance(payload.get("rows"), list):
+            METRICS.count("rows_out", len(payload["rows"]))
+        if _RUN["inline"]:
+            payload = {**payload, "_metrics": _metrics_snapshot()}
+    t0 = time.perf_counter()
+    s = json.dumps(payload, ensure_ascii=False)
+    if METRICS.enabled:
+        METRICS.add("serialize", (time.perf_counter() - t0) * 1000.0)
+        _RUN["last"] = _metrics_snapshot()
+    print(s)
+    return 0
+
+
+# -----------------------
+# Métricas (--metrics / --metrics-log)
+# -----------------------
+# Fases en ms: import, load:<json>, read:<fuente>, save:<json>, serialize y
+# compute (= tiempo del op menos load/read/save/serialize). Las fases internas
+# de un op (dedup_ledger, apply...) se anidan: "apply" incluye sus save:*.
+# El _metrics de la respuesta se toma antes de serializarla (no puede medirse
+# a sí mismo); el registro de --metrics-log sí incluye ese último serialize.
+_RUN: Dict[str, Any] = {
+    "op": "",
+    "t_op": None,
+    "inline": False,
+    "last": None,
+    "extra": {},  # claves añadidas a toda respuesta (p.ej. _profile)
+}
+_IO_PHASES = ("load:", "read:", "save:", "serialize")
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux: KiB, macOS: bytes
+        return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil  # Windows (opcional)
+
+        mi = psutil.Process().memory_info()
+        return round(getattr(mi, "peak_wset", mi.rss) / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+def _metrics_snapshot() -> Dict[str, Any]:
+    now = time.perf_counter()
+    phases = {"import": (_T_IMPORTED - _T_START) * 1000.0, **METRICS.phases}
+    op_ms = (now - _RUN["t_op"]) * 1000.0 if _RUN["t_op"] else 0.0
+    io_ms = sum(METRICS.total(p) for p in _IO_PHASES)
+    phases["compute"] = max(op_ms - io_ms, 0.0)
+    return {
+        "op": _RUN["op"],
+        "total_ms": round((now - _T_START) * 1000.0, 3),
+        "phases_ms": {k: round(v, 3) for k, v in phases.items()},
+        "calls": dict(METRICS.calls),
+        "counts": dict(METRICS.counts),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _append_metrics_log(path: str, rc: int) -> None:
+    snap = _RUN["last"] or _metrics_snapshot()
+    rec = {"ts": datetime.now().isoformat(timespec="seconds"), "rc": rc, **snap}
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    except Exception:
+        pass  # el log de métricas nunca debe tumbar el op
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    # nearest-rank
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q / 100.0 * len(sorted_vals)) - 1))
+    return round(sorted_vals[k], 3)
+
+
 def _read_env_path(key: str, fallback: str = "") -> str:
     v = os.environ.get(key, "") or ""
     return v.strip() or fallback
@@ -151,425 +274,627 @@ def _parse_date_flexible(val):
     return None
 
 
-def _auto_qty_col(df, candidates=None):
-    if candidates is None:
-        candidates = [
-            "STOCK",
-            "stock",
-            "STOCK_ESTIMADO",
-            "stock_estimado",
-            "ESTIMADO",
-            "estimado",
-            "QTY",
-            "qty",
-            "CANTIDAD",
-            "cantidad",
-            "TOTAL",
-            "total",
-        ]
-    for c in candidates:
-        if c in df.columns:
-            return c
-    blacklist = {
-        "MODELO",
-        "modelo",
-        "TALLA",
-        "talla",
-        "PEDIDO",
-        "pedido",
-        "CLIENTE",
-        "cliente",
-        "COLOR",
-        "color",
-        "DESCRIPCION",
-        "descripcion",
-    }
-    for col in df.columns:
-        if col in blacklist:
-            continue
-        try:
-            pd.to_numeric(df[col])
-            return col
-        except Exception:
-            continue
-    return None
+# -----------------------
+# Excel pack (IMPRIMIR_*.xlsx): escritura directa, sin pasar por CSV
+# -----------------------
+# Las filas salen de mgr.generar_informes() (en lista solo si el informe
+# lleva hoja) y se escriben con un workbook write-only. Los colores que dependen del valor (rangos de stock,
+# meses de FECHA, filas TOTAL) van como formato condicional sobre el rango de
+# datos: Excel evalúa las reglas y escribirlas cuesta O(reglas). Lo fijo
+# (título, cabecera, rejilla, paleta por valor, contornos de bloque) son
+# estilos con nombre compartidos por celdas prototipo reutilizadas.
+_EXCEL_TOTALES = ("TOTAL MODELO", "TOTAL GENERAL")
+_EXCEL_PALETA = [
+    "F8BBD0",
+    "E1BEE7",
+    "C5CAE9",
+    "BBDEFB",
+    "B2EBF2",
+    "B2DFDB",
+    "C8E6C9",
+    "DCEDC8",
+    "FFF9C4",
+    "FFE0B2",
+]
+# Estilos con nombre del pack (aparecen en la galería de estilos de Excel)
+EXCEL_ESTILO_TITULO = "IMPRIMIR título"
+EXCEL_ESTILO_CABECERA = "IMPRIMIR cabecera"
+EXCEL_ESTILO_CELDA = "IMPRIMIR celda"
+EXCEL_ESTILO_PALETA = "IMPRIMIR paleta {}"  # 1..len(_EXCEL_PALETA)
+
+
+@dataclass(frozen=True)
+class _HojaExcel:
+    informe: str  # ReportSpec.nombre de origen
+    titulo: str
+    rangos: str = ""  # columna de cantidad para rojo/naranja/amarillo por rangos
+    por_mes: bool = False  # color por mes de FECHA (pedidos pendientes)
+    paleta: str = ""  # columna coloreada por valor con _EXCEL_PALETA
+    bloques: str = ""  # "fecha" (modelo+fecha) | "modelo": contorno grueso
+    totales: bool = True  # resaltar TOTAL MODELO/GENERAL
+    derecha: Tuple[str, ...] = ()
+
+
+_EXCEL_PACK = {
+    "00": _HojaExcel("00_stock_actual", "01 - STOCK ACTUAL", rangos="STOCK", derecha=("TALLA", "STOCK")),
+    "03": _HojaExcel(
+        "03_pedidos_pendientes", "02 - PEDIDOS PENDIENTES", por_mes=True, bloques="fecha", derecha=("TALLA", "CANTIDAD")
+    ),
+    "04": _HojaExcel(
+        "04_ordenes_fabricacion", "03 - ORDENES FABRICACION", paleta="FECHA", bloques="fecha", derecha=("TALLA", "CANTIDAD")
+    ),
+    "05": _HojaExcel(
+        "05_stock_estimado", "04 - STOCK ESTIMADO", rangos="STOCK_ESTIMADO", derecha=("TALLA", "STOCK_ESTIMADO")
+    ),
+    "06": _HojaExcel(
+        "06_orden_corte_sugerida", "05 - ORDEN CORTE SUGERIDA", paleta="MODELO", bloques="modelo", totales=False
+    ),
+}
 
 
-def _excel_yellow_header_and_total(
-    ws, header_row: int = 1, highlight_last: bool = True
-):
-    bright_fill = PatternFill(fill_type="solid", fgColor=BRIGHT_YELLOW)
-    bold_font = Font(bold=True)
-    for cell in ws[header_row]:
-        cell.fill = bright_fill
-        cell.font = bold_font
-    if highlight_last and ws.max_row >= 2:
-        last_row = ws.max_row
-        for cell in ws[last_row]:
-            cell.fill = bright_fill
-            cell.font = bold_font
+@dataclass(frozen=True)
+class _EstiloFila:
+    paleta: int = 0  # 1..len(_EXCEL_PALETA); 0 = sin relleno
+    arriba: bool = False  # borde grueso superior (primera fila de bloque)
+    abajo: bool = False  # borde grueso inferior (última fila de bloque)
+    lados: bool = False  # borde grueso izquierda/derecha (fila dentro de bloque)
 
 
-def _excel_add_borders(ws, min_row: int = 1, min_col: int = 1):
-    thin = Side(border_style="thin", color="000000")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-    for row in ws.iter_rows(
-        min_row=min_row, max_row=ws.max_row, min_col=min_col, max_col=ws.max_column
-    ):
-        for cell in row:
-            cell.border = border
-
-
-def _excel_highlight_totals_by_talla(
-    ws, df: pd.DataFrame, talla_col: str = "TALLA", data_start_row: int = 2
-):
-    if talla_col not in df.columns:
-        return
-    try:
-        talla_idx = list(df.columns).index(talla_col) + 1
-    except ValueError:
-        return
+def _excel_valor(v) -> Optional[str]:
+    # Mismo texto que en el CSV (el pack siempre ha sido texto)
+    if v is None or v == "":
+        return None
+    return str(v)
 
-    bright_fill = PatternFill(fill_type="solid", fgColor=BRIGHT_YELLOW)
-    bold_font = Font(bold=True)
 
-    for row in range(data_start_row, ws.max_row + 1):
-        val = ws.cell(row=row, column=talla_idx).value
-        if not val:
-            continue
-        txt = str(val).strip().upper()
-        if txt in ("TOTAL MODELO", "TOTAL GENERAL"):
-            for c in range(1, ws.max_column + 1):
-                cell = ws.cell(row=row, column=c)
-                cell.fill = bright_fill
-                cell.font = bold_font
-
-
-def _excel_color_stock_ranges(
-    ws, df: pd.DataFrame, qty_col_candidates=None, data_start_row: int = 2
-):
-    qty_col = _auto_qty_col(df, candidates=qty_col_candidates)
-    if not qty_col:
-        return
-    try:
-        col_idx = list(df.columns).index(qty_col) + 1
-    except ValueError:
-        return
+def _excel_solido(color: str) -> PatternFill:
+    # En formatos diferenciales Excel pinta con bgColor: se fijan los dos
+    return PatternFill(fill_type="solid", start_color=color, end_color=color)
 
-    red_fill = PatternFill(fill_type="solid", fgColor="FFCDD2")
-    orange_fill = PatternFill(fill_type="solid", fgColor="FFE0B2")
-    yellow_fill = PatternFill(fill_type="solid", fgColor=PASTEL_YELLOW)
 
-    for row in range(data_start_row, ws.max_row + 1):
-        cell = ws.cell(row=row, column=col_idx)
-        val = cell.value
-        try:
-            q = float(str(val).replace(",", "."))
-        except Exception:
-            continue
+def _excel_estilos_nombrados(wb) -> None:
+    thin = Side(border_style="thin", color="000000")
+    rejilla = Border(left=thin, right=thin, top=thin, bottom=thin)
+    wb.add_named_style(
+        NamedStyle(
+            name=EXCEL_ESTILO_TITULO,
+            font=Font(size=20, bold=True),
+            alignment=Alignment(horizontal="center", vertical="center"),
+        )
+    )
+    wb.add_named_style(
+        NamedStyle(
+            name=EXCEL_ESTILO_CABECERA,
+            font=Font(bold=True),
+            fill=PatternFill(fill_type="solid", fgColor=BRIGHT_YELLOW),
+            border=rejilla,
+        )
+    )
+    wb.add_named_style(NamedStyle(name=EXCEL_ESTILO_CELDA, border=rejilla))
+    for i, color in enumerate(_EXCEL_PALETA, start=1):
+        wb.add_named_style(
+            NamedStyle(
+                name=EXCEL_ESTILO_PALETA.format(i),
+                fill=PatternFill(fill_type="solid", fgColor=color),
+                border=rejilla,
+            )
+        )
+
 
-        fill = None
-        if q <= 0:
-            fill = red_fill
-        elif 0 < q <= 10:
-            fill = orange_fill
-        elif 10 < q <= 25:
-            fill = yellow_fill
+def _excel_fecha_formula(ref: str) -> str:
+    # FECHA es texto: ISO (AAAA-MM-DD...) o DD/MM/AAAA / DD-MM-AAAA
+    return (
+        f'IF(MID({ref},5,1)="-",DATE(LEFT({ref},4),MID({ref},6,2),MID({ref},9,2)),'
+        f"DATE(MID({ref},7,4),MID({ref},4,2),LEFT({ref},2)))"
+    )
 
-        if fill:
-            for c in range(1, ws.max_column + 1):
-                ws.cell(row=row, column=c).fill = fill
 
+def _excel_reglas(ws, hoja: _HojaExcel, columnas: List[str], primera: int, ultima: int, hoy: date) -> None:
+    """Formato condicional del rango de datos (filas primera..ultima).
 
-def _excel_color_pend_by_month(
-    ws, df: pd.DataFrame, date_col: str = "FECHA", data_start_row: int = 2
-):
-    if date_col not in df.columns:
+    El orden es la prioridad: TOTAL gana a rangos y meses, igual que cuando
+    se pintaba celda a celda.
+    """
+    if ultima < primera:
         return
-    today = date.today()
-    date_col_idx = list(df.columns).index(date_col) + 1
+    idx = {c: get_column_letter(i + 1) for i, c in enumerate(columnas)}
+    rango = f"A{primera}:{get_column_letter(len(columnas))}{ultima}"
+
+    def regla(formula: str, color: str, fuente: Optional[Font] = None) -> None:
+        ws.conditional_formatting.add(
+            rango,
+            FormulaRule(formula=[f"IFERROR({formula},FALSE)"], fill=_excel_solido(color), font=fuente),
+        )
+
+    if hoja.totales and "TALLA" in idx:
+        talla = f"UPPER(TRIM(${idx['TALLA']}{primera}))"
+        regla(
+            "OR(" + ",".join(f'{talla}="{t}"' for t in _EXCEL_TOTALES) + ")",
+            BRIGHT_YELLOW,
+            Font(bold=True),
+        )
+    if hoja.rangos in idx:
+        q = f"VALUE(${idx[hoja.rangos]}{primera})"
+        regla(f"{q}<=0", "FFCDD2")
+        regla(f"AND({q}>0,{q}<=10)", "FFE0B2")
+        regla(f"AND({q}>10,{q}<=25)", PASTEL_YELLOW)
+    if hoja.por_mes and "FECHA" in idx:
+        # meses desde/hasta la fecha de exportación (la del título):
+        # mismo mes = 1, luego +1 por mes hasta 6; texto blanco desde 5
+        d = _excel_fecha_formula(f"${idx['FECHA']}{primera}")
+        hoy_xl = f"DATE({hoy.year},{hoy.month},{hoy.day})"
+        meses = f"((YEAR({d})-{hoy.year})*12+MONTH({d})-{hoy.month})"
+        for signo, palette in (("<", _PAST_GREENS), (">", _FUTURE_REDS)):
+            paso = -1 if signo == "<" else 1
+            for k in range(1, 7):
+                if k == 6:
+                    cond = f"{meses}{'<=' if paso < 0 else '>='}{paso * 5}"
+                else:
+                    cond = f"{meses}={paso * (k - 1)}"
+                color = palette[min(k - 1, len(palette) - 1)].replace("#", "")
+                regla(
+                    f"AND({d}{signo}{hoy_xl},{cond})",
+                    color,
+                    Font(color="FFFFFF") if k >= 5 else None,
+                )
 
-    for row in range(data_start_row, ws.max_row):
-        cell = ws.cell(row=row, column=date_col_idx)
-        d = _parse_date_flexible(cell.value)
-        if not d:
+
+def _excel_bloques(valores, col_modelo: int, col_fecha: Optional[int], col_talla: Optional[int]):
+    """(inicio, fin) de cada tramo de filas con el mismo modelo (y fecha).
+
+    Las filas TOTAL MODELO cierran el tramo y llevan su propio contorno.
+    """
+    bloques: List[Tuple[int, int]] = []
+    actual = None
+    inicio: Optional[int] = None
+    for i, fila in enumerate(valores):
+        talla = (fila[col_talla] or "").strip().upper() if col_talla is not None else ""
+        if talla in _EXCEL_TOTALES:
+            if inicio is not None:
+                bloques.append((inicio, i - 1))
+            actual = inicio = None
+            if talla == "TOTAL MODELO":
+                bloques.append((i, i))
             continue
-        delta_days = (d - today).days
-        if delta_days == 0:
+        modelo = fila[col_modelo]
+        fecha = fila[col_fecha] if col_fecha is not None else "-"
+        if not modelo or not fecha:
+            if inicio is not None:
+                bloques.append((inicio, i - 1))
+            actual = inicio = None
             continue
+        clave = (modelo.strip(), fecha.strip())
+        if clave != actual:
+            if inicio is not None:
+                bloques.append((inicio, i - 1))
+            actual, inicio = clave, i
+    if inicio is not None:
+        bloques.append((inicio, len(valores) - 1))
+    return bloques
+
+
+def _excel_estilos(hoja: _HojaExcel, columnas: List[str], valores) -> List[_EstiloFila]:
+    """Parte fija del estilo de cada fila: color de paleta y contornos de bloque."""
+    n = len(valores)
+    paleta = [0] * n
+    idx = {c: i for i, c in enumerate(columnas)}
+
+    if hoja.paleta in idx:
+        j = idx[hoja.paleta]
+        colores: Dict[str, int] = {}
+        for i, fila in enumerate(valores):
+            # las celdas vacías cuentan como un valor más (NaN en el df de antes)
+            clave = "nan" if fila[j] is None else fila[j].strip()
+            if not clave:
+                continue
+            if clave not in colores:
+                colores[clave] = len(colores) % len(_EXCEL_PALETA) + 1
+            paleta[i] = colores[clave]
+
+    arriba = [False] * n
+    abajo = [False] * n
+    lados = [False] * n
+    if hoja.bloques and "MODELO" in idx:
+        por_fecha = hoja.bloques == "fecha"
+        if not por_fecha or "FECHA" in idx:
+            for ini, fin in _excel_bloques(
+                valores,
+                idx["MODELO"],
+                idx["FECHA"] if por_fecha else None,
+                idx.get("TALLA") if por_fecha else None,
+            ):
+                arriba[ini] = abajo[fin] = True
+                for i in range(ini, fin + 1):
+                    lados[i] = True
+
+    return [_EstiloFila(paleta[i], arriba[i], abajo[i], lados[i]) for i in range(n)]
+
+
+def _excel_celda(ws, estilo: _EstiloFila, col: int, ncols: int, derecha: bool):
+    """Celda prototipo (write-only): estilo con nombre + contorno/alineación propios."""
+    c = WriteOnlyCell(ws)
+    c.style = EXCEL_ESTILO_PALETA.format(estilo.paleta) if estilo.paleta else EXCEL_ESTILO_CELDA
+    izquierda = estilo.lados and col == 0
+    dcha = estilo.lados and col == ncols - 1
+    if izquierda or dcha or estilo.arriba or estilo.abajo:
+        thin = Side(border_style="thin", color="000000")
+        thick = Side(border_style="thick", color="000000")
+        c.border = Border(
+            left=thick if izquierda else thin,
+            right=thick if dcha else thin,
+            top=thick if estilo.arriba else thin,
+            bottom=thick if estilo.abajo else thin,
+        )
+    if derecha:
+        c.alignment = Alignment(horizontal="right")
+    return c
+
+
+def _excel_escribir_hoja(
+    path: Path, hoja: _HojaExcel, columnas: List[str], valores: List[Sequence], titulo: str, hoy: date
+) -> None:
+    """IMPRIMIR_*.xlsx: título, cabecera y filas en una pasada, colores por reglas."""
+    estilos = _excel_estilos(hoja, columnas, valores)
+    ncols = len(columnas)
+    header_row = 3  # título + fila separadora
+
+    wb = Workbook(write_only=True)
+    _excel_estilos_nombrados(wb)
+    ws = wb.create_sheet("Hoja1")
+
+    # Lo que va antes de <sheetData> (anchos, paneles, alturas) se fija primero
+    for j, nombre in enumerate(columnas):
+        max_len = max([len(nombre)] + [len(f[j]) for f in valores if f[j] is not None])
+        ws.column_dimensions[get_column_letter(j + 1)].width = min(max(max_len + 2, 8), 40)
+    ws.freeze_panes = f"A{header_row + 1}"
+    ws.row_dimensions[1].height = 28
+    ws.row_dimensions[2].height = 6
+    ws.merged_cells.add(f"A1:{get_column_letter(ncols)}1")
+    _excel_reglas(ws, hoja, columnas, header_row + 1, header_row + len(valores), hoy)
+
+    c = WriteOnlyCell(ws, value=titulo)
+    c.style = EXCEL_ESTILO_TITULO
+    ws.append([c])
+    ws.append([])
+
+    cabecera = []
+    for nombre in columnas:
+        c = WriteOnlyCell(ws, value=nombre)
+        c.style = EXCEL_ESTILO_CABECERA
+        cabecera.append(c)
+    ws.append(cabecera)
+
+    # Una fila de celdas prototipo por estilo; write-only serializa cada fila
+    # en el append, así que se pueden reutilizar cambiando solo el valor
+    derecha = {columnas.index(c) for c in hoja.derecha if c in columnas}
+    protos: Dict[_EstiloFila, List[Any]] = {}
+    for fila, estilo in zip(valores, estilos):
+        celdas = protos.get(estilo)
+        if celdas is None:
+            celdas = protos[estilo] = [
+                _excel_celda(ws, estilo, j, ncols, j in derecha) for j in range(ncols)
+            ]
+        for c, v in zip(celdas, fila):
+            c.value = v
+        ws.append(celdas)
+    wb.save(path)
+
+
+def _excel_columnas(columnas: List[str], filas: List[Dict]) -> List[List[Optional[str]]]:
+    """Filas del informe en columnas de texto ya formateado: lo que viaja al worker."""
+    return [[_excel_valor(r.get(c)) for r in filas] for c in columnas]
+
+
+def _excel_hoja_proceso(
+    path: str, prefijo: str, columnas: List[str], datos: List[List[Optional[str]]], titulo: str, hoy: date
+) -> float:
+    """Worker del pack: escribe una hoja desde sus columnas y devuelve los ms empleados."""
+    t0 = time.perf_counter()
+    _excel_escribir_hoja(Path(path), _EXCEL_PACK[prefijo], columnas, list(zip(*datos)), titulo, hoy)
+    return (time.perf_counter() - t0) * 1000.0
 
-        month_delta = _month_index(d) - _month_index(today)
-        if month_delta == 0:
-            months_away = 1
-        else:
-            months_away = min(abs(month_delta) + 1, 6)
 
-        if delta_days < 0:
-            palette = _PAST_GREENS
-        else:
-            palette = _FUTURE_REDS
+# -----------------------
+# Listados: filtros + orden + paginación (server-side)
+# -----------------------
+# --filter: JSON {"modelo": prefijo, "cliente", "talla", "fecha_desde", "fecha_hasta"}
+# --sort:   columnas separadas por coma; "-COL" o "COL:desc" = descendente
+#           (desde spawn usar "COL:desc": argparse toma "-COL" como flag)
+# --offset/--limit: ventana; --cursor: continúa tras la última fila servida.
+# El cursor guarda la clave de orden de la última fila (no una posición),
+# así que la página siguiente no se descoloca si entran/salen filas entre llamadas.
+# El desempate es la clave natural de la fila (MODELO+TALLA, PEDIDO+...+TALLA)
+# más su número de aparición; IDX no entra: se desplaza al insertar filas.
+_LISTING_FILTERS = ("modelo", "cliente", "talla", "fecha_desde", "fecha_hasta")
 
-        idx = min(months_away - 1, len(palette) - 1)
-        color = palette[idx]
-        fill = PatternFill(fill_type="solid", fgColor=color.replace("#", ""))
-        use_white_text = months_away >= 5
 
-        for c in range(1, ws.max_column + 1):
-            target = ws.cell(row=row, column=c)
-            target.fill = fill
-            if use_white_text:
-                target.font = target.font.copy(color="FFFFFF")
+@dataclass
+class _ListingQuery:
+    filters: Dict[str, str]
+    sort: List[Tuple[str, bool]]  # (COLUMNA, descendente)
+    offset: int = 0
+    limit: Optional[int] = None
+    cursor: Optional[Dict[str, Any]] = None
 
+    @property
+    def is_passthrough(self) -> bool:
+        return not (
+            self.filters or self.sort or self.offset or self.cursor
+        ) and self.limit is None
 
-def _excel_color_by_column_palette(
-    ws, df: pd.DataFrame, col: str, data_start_row: int = 2
-):
-    if col not in df.columns:
-        return
-    values = df[col].astype(str).str.strip().tolist()
-    uniques = []
-    for v in values:
-        if v and v not in uniques:
-            uniques.append(v)
-    if not uniques:
-        return
+    @property
+    def sort_spec(self) -> str:
+        return ",".join(("-" if d else "") + c for c, d in self.sort)
 
-    palette = [
-        "F8BBD0",
-        "E1BEE7",
-        "C5CAE9",
-        "BBDEFB",
-        "B2EBF2",
-        "B2DFDB",
-        "C8E6C9",
-        "DCEDC8",
-        "FFF9C4",
-        "FFE0B2",
-    ]
-    color_map = {u: palette[i % len(palette)] for i, u in enumerate(uniques)}
 
-    for row_idx, v in enumerate(values, start=data_start_row):
-        color = color_map.get(v)
-        if not color:
-            continue
-        fill = PatternFill(fill_type="solid", fgColor=color)
-        for c in range(1, ws.max_column + 1):
-            ws.cell(row=row_idx, column=c).fill = fill
-
-
-def _excel_insert_title_row(ws, title: str, blank_row: bool = True) -> int:
-    insert_rows = 2 if blank_row else 1
-    ws.insert_rows(1, amount=insert_rows)
-    last_col = ws.max_column
-    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=last_col)
-    cell = ws.cell(row=1, column=1)
-    cell.value = title
-    cell.font = Font(size=20, bold=True)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
-    ws.row_dimensions[1].height = 28
-    if blank_row:
-        ws.row_dimensions[2].height = 6
-    return 3 if blank_row else 2
-
-
-def _excel_set_freeze_panes(ws, header_row: int):
-    ws.freeze_panes = ws.cell(row=header_row + 1, column=1).coordinate
-
-
-def _excel_autofit_columns(
-    ws, header_row: int, min_width: int = 8, max_width: int = 40
-):
-    for col_idx in range(1, ws.max_column + 1):
-        max_len = 0
-        for row in ws.iter_rows(
-            min_row=header_row,
-            max_row=ws.max_row,
-            min_col=col_idx,
-            max_col=col_idx,
-        ):
-            cell = row[0]
-            if cell.value is None:
-                continue
-            val = str(cell.value)
-            if len(val) > max_len:
-                max_len = len(val)
-        width = min(max(max_len + 2, min_width), max_width)
-        ws.column_dimensions[get_column_letter(col_idx)].width = width
-
-
-def _excel_set_right_align_cols(ws, header_row: int, col_names: List[str]):
-    header_map = {}
-    for col_idx in range(1, ws.max_column + 1):
-        val = ws.cell(row=header_row, column=col_idx).value
-        if val is None:
-            continue
-        header_map[str(val).strip().upper()] = col_idx
+class _Desc:
+    """Invierte el orden de un valor dentro de una tupla-clave."""
 
-    for name in col_names:
-        col_idx = header_map.get(str(name).strip().upper())
-        if not col_idx:
-            continue
-        for row in range(header_row + 1, ws.max_row + 1):
-            cell = ws.cell(row=row, column=col_idx)
-            if cell.value is None:
-                continue
-            if cell.alignment:
-                cell.alignment = cell.alignment.copy(horizontal="right")
-            else:
-                cell.alignment = Alignment(horizontal="right")
-
-
-def _excel_set_cell_border(cell, left=None, right=None, top=None, bottom=None):
-    border = cell.border
-    cell.border = Border(
-        left=left or border.left,
-        right=right or border.right,
-        top=top or border.top,
-        bottom=bottom or border.bottom,
-        diagonal=border.diagonal,
-        diagonalUp=border.diagonalUp,
-        diagonalDown=border.diagonalDown,
-        outline=border.outline,
-        vertical=border.vertical,
-        horizontal=border.horizontal,
+    __slots__ = ("v",)
+
+    def __init__(self, v):
+        self.v = v
+
+    def __eq__(self, other):
+        return self.v == other.v
+
+    def __lt__(self, other):
+        return other.v < self.v
+
+
+def _sort_value(col: str, v):
+    # Tallas en orden natural (34 < 36 < XS < S ...), el resto por tipo y valor
+    if col == "TALLA":
+        return talla_sort_key("" if v is None else v)
+    if v is None or v == "":
+        return (0, 0.0, "")
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return (1, float(v), "")
+    return (2, 0.0, str(v))
+
+
+def _encode_cursor(query: _ListingQuery, values: List[Any], pos: Any) -> str:
+    raw = json.dumps(
+        {"s": query.sort_spec, "k": values, "p": pos}, ensure_ascii=False, default=str
     )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
 
 
-def _excel_apply_thick_outline(
-    ws, min_row: int, max_row: int, min_col: int, max_col: int
-):
-    thick = Side(border_style="thick", color="000000")
-    for row in range(min_row, max_row + 1):
-        for col in range(min_col, max_col + 1):
-            left = thick if col == min_col else None
-            right = thick if col == max_col else None
-            top = thick if row == min_row else None
-            bottom = thick if row == max_row else None
-            if not (left or right or top or bottom):
-                continue
-            _excel_set_cell_border(
-                ws.cell(row=row, column=col),
-                left=left,
-                right=right,
-                top=top,
-                bottom=bottom,
-            )
+def _decode_cursor(token: str) -> Dict[str, Any]:
+    try:
+        pad = "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(token + pad).decode("utf-8"))
+        if not isinstance(data, dict) or "p" not in data:
+            raise ValueError
+        return data
+    except Exception:
+        raise ValueError("cursor inválido")
 
 
-def _excel_outline_date_blocks(
-    ws,
-    header_row: int,
-    model_col: str = "MODELO",
-    date_col: str = "FECHA",
-    talla_col: str = "TALLA",
-):
-    header_map = {}
-    for col_idx in range(1, ws.max_column + 1):
-        val = ws.cell(row=header_row, column=col_idx).value
-        if val is None:
+def _listing_query(args) -> _ListingQuery:
+    filters: Dict[str, str] = {}
+    raw = (getattr(args, "filter", "") or "").strip()
+    if raw:
+        try:
+            data = json.loads(raw)
+        except Exception:
+            raise ValueError("--filter debe ser JSON")
+        if not isinstance(data, dict):
+            raise ValueError("--filter debe ser un objeto JSON")
+        for k, v in data.items():
+            key = str(k).strip().lower()
+            if key not in _LISTING_FILTERS:
+                raise ValueError(f"filtro no soportado: {k}")
+            val = "" if v is None else str(v).strip()
+            if val:
+                filters[key] = val
+
+    sort: List[Tuple[str, bool]] = []
+    for part in (getattr(args, "sort", "") or "").split(","):
+        part = part.strip()
+        if not part:
             continue
-        header_map[str(val).strip().upper()] = col_idx
-    model_idx = header_map.get(model_col.upper())
-    date_idx = header_map.get(date_col.upper())
-    talla_idx = header_map.get(talla_col.upper())
-    if not model_idx or not date_idx:
-        return
+        name, _, direction = part.partition(":")
+        desc = name.startswith("-") or direction.strip().lower() == "desc"
+        sort.append((name.lstrip("+-").strip().upper(), desc))
+
+    offset = int(getattr(args, "offset", None) or 0)
+    lim = getattr(args, "limit", None)
+    limit = int(lim) if lim not in (None, "") else None
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("offset/limit deben ser >= 0")
+
+    token = (getattr(args, "cursor", "") or "").strip()
+    return _ListingQuery(
+        filters=filters,
+        sort=sort,
+        offset=offset,
+        limit=limit,
+        cursor=_decode_cursor(token) if token else None,
+    )
 
-    data_start = header_row + 1
-    blocks: List[Tuple[int, int]] = []
-    cur_model = None
-    cur_date = None
-    block_start = None
-
-    for row in range(data_start, ws.max_row + 1):
-        model = ws.cell(row=row, column=model_idx).value
-        fecha = ws.cell(row=row, column=date_idx).value
-        talla_val = ws.cell(row=row, column=talla_idx).value if talla_idx else ""
-        talla_txt = str(talla_val).strip().upper() if talla_val else ""
-
-        if talla_txt in ("TOTAL MODELO", "TOTAL GENERAL"):
-            if block_start is not None:
-                blocks.append((block_start, row - 1))
-                block_start = None
-            cur_model = None
-            cur_date = None
-            if talla_txt == "TOTAL MODELO":
-                _excel_apply_thick_outline(ws, row, row, 1, ws.max_column)
-            continue
 
-        if not model or not fecha:
-            if block_start is not None:
-                blocks.append((block_start, row - 1))
-                block_start = None
-            cur_model = None
-            cur_date = None
-            continue
+def _apply_listing(
+    rows: List[Dict[str, Any]],
+    columns: List[str],
+    query: _ListingQuery,
+    key_cols: Sequence[str] = (),
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Filtra, ordena y pagina filas ya construidas.
+    Desempate: los valores de `key_cols` (clave natural) más el número de
+    aparición de esa clave (filas repetidas); sin clave, el índice en `rows`.
+    Devuelve (página, meta) con total, total_filtered, offset, limit y next_cursor.
+    """
+    colmap = {c.upper(): c for c in columns}
+    f = query.filters
+    ignored: List[str] = []
+
+    def _col(name: str, key: str) -> Optional[str]:
+        c = colmap.get(name)
+        if c is None:
+            ignored.append(key)
+        return c
+
+    # 1) filtros en una sola pasada (cada llamada es un proceso nuevo:
+    #    un barrido lineal es el índice más barato que podemos construir)
+    checks = []
+    if "modelo" in f and (c := _col("MODELO", "modelo")):
+        pref = f["modelo"].upper()
+        checks.append(lambda r, c=c: str(r.get(c) or "").strip().upper().startswith(pref))
+    if "cliente" in f and (c := _col("CLIENTE", "cliente")):
+        cli = f["cliente"].casefold()
+        checks.append(lambda r, c=c: str(r.get(c) or "").strip().casefold() == cli)
+    if "talla" in f and (c := _col("TALLA", "talla")):
+        tal = norm_talla(f["talla"])
+        checks.append(lambda r, c=c: norm_talla(r.get(c)) == tal)
+    if ("fecha_desde" in f or "fecha_hasta" in f) and (c := _col("FECHA", "fecha")):
+        d_from = _parse_date_flexible(f.get("fecha_desde"))
+        d_to = _parse_date_flexible(f.get("fecha_hasta"))
+
+        def _in_range(r, c=c):
+            d = _parse_date_flexible(r.get(c))
+            if d is None:
+                return False
+            return (d_from is None or d >= d_from) and (d_to is None or d <= d_to)
+
+        checks.append(_in_range)
+
+    kcols = [colmap[k.upper()] for k in key_cols if k.upper() in colmap]
+    if kcols:
+        vistas: Dict[tuple, int] = {}
+
+        def _pos(i, r):
+            k = tuple(str(r.get(c, "")) for c in kcols)
+            n = vistas[k] = vistas.get(k, -1) + 1
+            return (*k, n)
+    else:
+        _pos = lambda i, r: i  # noqa: E731
+    selected = [(_pos(i, r), r) for i, r in enumerate(rows) if all(chk(r) for chk in checks)]
+
+    # 2) orden estable: columnas pedidas + clave única como desempate
+    sort_cols = []
+    for name, desc in query.sort:
+        c = colmap.get(name)
+        if c is None:
+            raise ValueError(f"columna de orden desconocida: {name}")
+        sort_cols.append((name, c, desc))
+
+    def _key(values: List[Any], pos) -> tuple:
+        parts = []
+        for (name, _, desc), v in zip(sort_cols, values):
+            sv = _sort_value(name, v)
+            parts.append(_Desc(sv) if desc else sv)
+        return (*parts, pos)
+
+    keyed = [(_key([r.get(c) for _, c, _ in sort_cols], pos), pos, r) for pos, r in selected]
+    if sort_cols or kcols:
+        keyed.sort(key=lambda x: x[0])
+
+    # 3) ventana (cursor -> primera clave estrictamente mayor)
+    start = 0
+    if query.cursor is not None:
+        if query.cursor.get("s", "") != query.sort_spec:
+            raise ValueError("el cursor pertenece a otro orden")
+        p = query.cursor["p"]
+        ck = _key(list(query.cursor.get("k") or []), tuple(p) if isinstance(p, list) else p)
+        try:
+            start = bisect.bisect_right([k for k, _, _ in keyed], ck)
+        except TypeError:
+            raise ValueError("el cursor pertenece a otro listado")
+    start += query.offset
+    end = len(keyed) if query.limit is None else min(start + query.limit, len(keyed))
+    window = keyed[start:end]
+
+    next_cursor = None
+    if window and end < len(keyed):
+        _, last_pos, last = window[-1]
+        next_cursor = _encode_cursor(
+            query, [last.get(c) for _, c, _ in sort_cols], last_pos
+        )
 
-        model_txt = str(model).strip()
-        date_txt = str(fecha).strip()
-        if cur_model is None:
-            cur_model = model_txt
-            cur_date = date_txt
-            block_start = row
-        elif model_txt == cur_model and date_txt == cur_date:
-            continue
-        else:
-            if block_start is not None:
-                blocks.append((block_start, row - 1))
-            cur_model = model_txt
-            cur_date = date_txt
-            block_start = row
+    meta: Dict[str, Any] = {
+        "total": len(rows),
+        "total_filtered": len(keyed),
+        "offset": query.offset,
+        "limit": query.limit,
+        "next_cursor": next_cursor,
+    }
+    if ignored:
+        meta["filters_ignored"] = ignored
+    return [r for _, _, r in window], meta
 
-    if block_start is not None:
-        blocks.append((block_start, ws.max_row))
 
-    for start, end in blocks:
-        if start <= end:
-            _excel_apply_thick_outline(ws, start, end, 1, ws.max_column)
+# --format: rows (defecto, lista de dicts) | columnar | ndjson
+_LISTING_FORMATS = ("rows", "columnar", "ndjson")
 
 
-def _excel_outline_model_blocks(ws, header_row: int, model_col: str = "MODELO"):
-    header_map = {}
-    for col_idx in range(1, ws.max_column + 1):
-        val = ws.cell(row=header_row, column=col_idx).value
-        if val is None:
+def _columnar(columns: List[str], rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Formato columnar: data[i] = valores de columns[i] (column-major).
+    Las columnas de texto repetitivas van codificadas por diccionario:
+    data[i] son índices a dictionaries[col].
+    """
+    data = [[r.get(c) for r in rows] for c in columns]
+    dictionaries: Dict[str, List[str]] = {}
+    for i, col in enumerate(columns):
+        vals = data[i]
+        if not vals or not all(isinstance(v, str) for v in vals):
             continue
-        header_map[str(val).strip().upper()] = col_idx
-    model_idx = header_map.get(model_col.upper())
-    if not model_idx:
-        return
+        uniq: Dict[str, int] = {}
+        codes = [uniq.setdefault(v, len(uniq)) for v in vals]
+        if len(uniq) * 2 <= len(vals):
+            dictionaries[col] = list(uniq)
+            data[i] = codes
+    return {"columns": columns, "data": data, "dictionaries": dictionaries}
 
-    data_start = header_row + 1
-    blocks: List[Tuple[int, int]] = []
-    cur_model = None
-    block_start = None
-
-    for row in range(data_start, ws.max_row + 1):
-        model = ws.cell(row=row, column=model_idx).value
-        if not model:
-            if block_start is not None:
-                blocks.append((block_start, row - 1))
-                block_start = None
-            cur_model = None
-            continue
-        model_txt = str(model).strip()
-        if cur_model is None:
-            cur_model = model_txt
-            block_start = row
-        elif model_txt == cur_model:
-            continue
-        else:
-            if block_start is not None:
-                blocks.append((block_start, row - 1))
-            cur_model = model_txt
-            block_start = row
 
-    if block_start is not None:
-        blocks.append((block_start, ws.max_row))
+def _emit_ndjson(columns: List[str], rows, meta: Dict[str, Any]) -> int:
+    """
+    NDJSON: cabecera {ok, format, columns}, una línea-array por fila
+    (en el orden de columns) y una línea final {ok, end, count, ...meta}.
+    La línea final es la que parsea la route (última línea JSON).
+    """
+    out = sys.stdout
+    enc = json.JSONEncoder(ensure_ascii=False)
+    out.write(enc.encode({"ok": True, "format": "ndjson", "columns": columns}) + "\n")
+    count = 0
+    with METRICS.phase("serialize"):
+        for r in rows:
+            out.write(enc.encode([r.get(c) for c in columns]) + "\n")
+            count += 1
+    if not meta:
+        # streaming directo: sin filtros/orden/ventana, total == count
+        meta = {
+            "total": count,
+            "total_filtered": count,
+            "offset": 0,
+            "limit": None,
+            "next_cursor": None,
+        }
+    METRICS.count("rows_out", count)
+    _emit({"ok": True, "end": True, "count": count, **meta})
+    out.flush()
+    return 0
+
 
-    for start, end in blocks:
-        if start <= end:
-            _excel_apply_thick_outline(ws, start, end, 1, ws.max_column)
+def _ok_listing(args, columns: List[str], rows, key_cols: Sequence[str] = ()):
+    fmt = (getattr(args, "format", "") or "rows").strip().lower()
+    if fmt not in _LISTING_FORMATS:
+        return _fail("BAD_INPUT", f"formato no soportado: {fmt}")
+    try:
+        query = _listing_query(args)
+        if fmt == "ndjson" and query.is_passthrough:
+            # sin filtros/orden/ventana: las filas salen según se generan
+            return _emit_ndjson(columns, rows, {})
+        page, meta = _apply_listing(list(rows), columns, query, key_cols)
+    except ValueError as e:
+        return _fail("BAD_INPUT", str(e))
+    if fmt == "ndjson":
+        return _emit_ndjson(columns, page, meta)
+    if fmt == "columnar":
+        return _ok(format="columnar", **_columnar(columns, page), **meta)
+    return _ok(columns=columns, rows=page, **meta)
 
 
 # -----------------------
@@ -604,20 +929,20 @@ def op_preview_stock(args):
     modelo_sel = (args.modelo or "").strip().upper()
     talla_sel = norm_talla(args.talla or "")
 
-    rows = []
     almacen = getattr(mgr.inventory, "almacen", {}) or {}
     info_modelos = getattr(mgr.inventory, "info_modelos", {}) or {}
 
-    modelos = sorted(almacen.keys())
-    for m in modelos:
-        if modelo_sel and m != modelo_sel:
-            continue
-        for t, q in sorted((almacen.get(m, {}) or {}).items(), key=lambda x: str(x[0])):
-            if talla_sel and norm_talla(t) != talla_sel:
+    def _rows():
+        for m in sorted(almacen.keys()):
+            if modelo_sel and m != modelo_sel:
                 continue
             info = info_modelos.get(m, {}) or {}
-            rows.append(
-                {
+            for t, q in sorted(
+                (almacen.get(m, {}) or {}).items(), key=lambda x: str(x[0])
+            ):
+                if talla_sel and norm_talla(t) != talla_sel:
+                    continue
+                yield {
                     "MODELO": m,
                     "DESCRIPCION": info.get("descripcion", ""),
                     "COLOR": info.get("color", ""),
@@ -625,10 +950,9 @@ def op_preview_stock(args):
                     "TALLA": t,
                     "STOCK": q,
                 }
-            )
 
     cols = ["MODELO", "DESCRIPCION", "COLOR", "CLIENTE", "TALLA", "STOCK"]
-    return _ok(columns=cols, rows=rows)
+    return _ok_listing(args, cols, _rows(), key_cols=("MODELO", "TALLA"))
 
 
 def op_list_modelos(args):
@@ -705,13 +1029,13 @@ def op_list_tallas(args):
 def op_list_pendings(args):
     mgr = _make_mgr(args)
     pend = mgr.prevision.list_pendings()
-    rows = []
-    for idx, p in pend:
-        info = mgr.inventory.info_modelos.get(
-            p["modelo"], mgr.prevision.info_modelos.get(p["modelo"], {})
-        )
-        rows.append(
-            {
+
+    def _rows():
+        for idx, p in pend:
+            info = mgr.inventory.info_modelos.get(
+                p["modelo"], mgr.prevision.info_modelos.get(p["modelo"], {})
+            )
+            yield {
                 "IDX": idx,
                 "MODELO": p.get("modelo", ""),
                 "DESCRIPCION": (info or {}).get("descripcion", ""),
@@ -723,7 +1047,7 @@ def op_list_pendings(args):
                 "CLIENTE": p.get("cliente", ""),
                 "FECHA": p.get("fecha", ""),
             }
-        )
+
     cols = [
         "IDX",
         "MODELO",
@@ -736,19 +1060,21 @@ def op_list_pendings(args):
         "CLIENTE",
         "FECHA",
     ]
-    return _ok(columns=cols, rows=rows)
+    return _ok_listing(
+        args, cols, _rows(), key_cols=("PEDIDO", "NUMERO_PEDIDO", "MODELO", "TALLA", "FECHA")
+    )
 
 
 def op_list_fabrication(args):
     mgr = _make_mgr(args)
     items = mgr.prevision.list_fabrication()
-    rows = []
-    for idx, it in items:
-        info = mgr.inventory.info_modelos.get(
-            it["modelo"], mgr.prevision.info_modelos.get(it["modelo"], {})
-        )
-        rows.append(
-            {
+
+    def _rows():
+        for idx, it in items:
+            info = mgr.inventory.info_modelos.get(
+                it["modelo"], mgr.prevision.info_modelos.get(it["modelo"], {})
+            )
+            yield {
                 "IDX": idx,
                 "MODELO": it.get("modelo", ""),
                 "DESCRIPCION": (info or {}).get("descripcion", ""),
@@ -757,9 +1083,9 @@ def op_list_fabrication(args):
                 "CANTIDAD": it.get("cantidad", 0),
                 "FECHA": it.get("fecha", ""),
             }
-        )
+
     cols = ["IDX", "MODELO", "DESCRIPCION", "COLOR", "TALLA", "CANTIDAD", "FECHA"]
-    return _ok(columns=cols, rows=rows)
+    return _ok_listing(args, cols, _rows(), key_cols=("MODELO", "TALLA", "FECHA"))
 
 
 def op_calc_estimated(args):
@@ -772,7 +1098,7 @@ def op_calc_estimated(args):
         cols = list(df.columns)
     else:
         rows, cols = [], ["modelo", "talla", "stock_estimado"]
-    return _ok(columns=cols, rows=rows)
+    return _ok_listing(args, cols, rows, key_cols=("MODELO", "TALLA"))
 
 
 # -----------------------
@@ -1192,9 +1518,198 @@ def op_add_cliente(args):
 # - usamos ruta de archivo ya guardado por Next (args.excel_path)
 # - o ruta fija desde gestor (ALBARANES_EXCEL / PEDIDOS_EXCEL)
 # -----------------------
-def _procesar_albaranes_df(
-    mgr: GestorStock, df: pd.DataFrame, modo: str, simular: bool
+def _map_unique(serie: pd.Series, fn) -> np.ndarray:
+    """
+    Aplica fn una sola vez por valor distinto de la serie y expande el resultado.
+    En columnas object la caché va por (tipo, valor): 1, 1.0 y True son "iguales"
+    para pandas pero no para str(), y el resultado debe ser el de fn(valor).
+    """
+    if serie.dtype != object:
+        codes, uniques = pd.factorize(serie, use_na_sentinel=True)
+        vals = [fn(u) for u in uniques]
+        na = codes == -1
+        if na.any():
+            # codes == -1 indexa el último hueco: el resultado de fn(NA)
+            vals.append(fn(serie.iloc[int(np.argmax(na))]))
+        arr = np.empty(len(vals), dtype=object)
+        arr[:] = vals
+        return arr[codes]
+    cache: Dict[Tuple[type, Any], Any] = {}
+    res = []
+    for v in serie.tolist():
+        try:
+            k = (type(v), v)
+            r = cache[k]
+        except KeyError:
+            r = cache[k] = fn(v)
+        except TypeError:
+            r = fn(v)
+        res.append(r)
+    arr = np.empty(len(res), dtype=object)
+    arr[:] = res
+    return arr
+
+
+def _excel_int(v) -> int:
+    if isinstance(v, str):
+        # texto (CSV o celda de texto): "5", "5.0", "5,0", "1.234,0"
+        s = v.strip()
+        if not s:
+            return 0
+        if "," in s:
+            s = s.replace(".", "").replace(",", ".")
+        return int(float(s))
+    return int(v) if not pd.isna(v) else 0
+
+
+def _excel_codigo(v) -> str:
+    return norm_codigo("" if pd.isna(v) else v)
+
+
+def _excel_fecha(v) -> str:
+    return parse_fecha_excel(None if pd.isna(v) else v)
+
+
+def _excel_modelo(v) -> str:
+    return str(v).strip().upper()
+
+
+def _pendiente_int(v) -> int:
+    return _excel_int(v)
+
+
+@dataclass
+class _Simulacion:
+    """
+    Lo que aplicaría una importación simulada (un fichero o un lote), sin
+    tocar los stores. Cada fichero ve lo de los anteriores como en la real:
+    sus pendientes nuevos, sus salidas (ledger) y lo ya servido (plan).
+    """
+
+    plan: Optional[PlanSalidas] = None  # salidas acumuladas sin aplicar
+    pendientes: List[Dict[str, Any]] = field(default_factory=list)  # altas sin aplicar
+    duplicados: List[Dict[str, Any]] = field(default_factory=list)  # claves ya registradas
+
+
+@dataclass
+class _ImportCtx:
+    """
+    Estado de UN fichero que se aplica por trozos: instantánea de los stores
+    tomada antes del primer trozo, para que el resultado no dependa del
+    tamaño de trozo (mismo criterio que aplicarlo entero de una vez).
+    """
+
+    ledger: Optional[pd.DataFrame] = None  # albaranes: salidas ya registradas
+    ya: Optional[set] = None  # pedidos: (modelo, talla, pedido) ya pendientes
+    ocurrencias: Dict[tuple, int] = field(default_factory=dict)
+    clientes: Optional[MapaClientes] = None  # cliente por defecto por modelo (una vez por fichero)
+    sim: Optional[_Simulacion] = None  # simular: estado compartido por el lote
+
+
+def _mapa_clientes(mgr: GestorStock, ctx: _ImportCtx) -> MapaClientes:
+    if ctx.clientes is None:
+        with METRICS.phase("clientes"):
+            ctx.clientes = MapaClientes(mgr.prevision)
+    return ctx.clientes
+
+
+def _filtrar_vistas(
+    lineas: pd.DataFrame, cols: List[str], vistas: Optional[set], ctx: _ImportCtx
+) -> Tuple[pd.DataFrame, List[str], int]:
+    """
+    Hash por fila normalizada (+ nº de ocurrencia del mismo contenido en el
+    fichero) y descarte de las ya registradas en ImportRegistry.
+    Devuelve (líneas no vistas, hashes de TODAS las filas, nº descartadas).
+    """
+    with METRICS.phase("row_keys"):
+        if not len(lineas):
+            return lineas, [], 0
+        occ = ctx.ocurrencias
+        claves = []
+        for partes in zip(*(lineas[c].tolist() for c in cols)):
+            n = occ.get(partes, 0)
+            occ[partes] = n + 1
+            claves.append(ImportRegistry.hash_fila(partes + (n,)))
+        if not vistas:
+            return lineas, claves, 0
+        vista = np.fromiter((c in vistas for c in claves), dtype=bool, count=len(claves))
+        return lineas[~vista], claves, int(vista.sum())
+
+
+def _procesar_listado(
+    mgr: GestorStock,
+    trozos,
+    tipo: str,
+    modo: str = "d",
+    simular: bool = False,
+    vistas: Optional[set] = None,
 ) -> Dict[str, Any]:
+    """
+    Normaliza y aplica un listado del ERP trozo a trozo (memoria acotada por
+    el tamaño de trozo) y guarda los JSON una sola vez al final.
+    """
+    ctx = _ImportCtx(sim=_Simulacion() if simular else None)
+    total: Dict[str, Any] = {}
+    for df in trozos:
+        METRICS.count("rows_in", len(df))
+        if tipo == "albaranes":
+            out = _aplicar_albaranes(
+                mgr, _normalizar_albaranes(df), modo, vistas, guardar=False, ctx=ctx
+            )
+        else:
+            out = _aplicar_pedidos(
+                mgr, _normalizar_pedidos(df), vistas, guardar=False, ctx=ctx
+            )
+        _acumular(total, out)
+
+    if total.get("servidos"):
+        total["servidos"] = list({json.dumps(s, sort_keys=True): s for s in total["servidos"]}.values())
+    if simular:
+        total["diff"] = _diff_importacion(ctx.sim)
+    if not simular and total.get("import_rows"):
+        mgr.prevision.save()
+        if tipo == "albaranes":
+            mgr.inventory.save()
+    return total
+
+
+def _diff_importacion(sim: _Simulacion) -> Dict[str, Any]:
+    """Vista previa de una importación simulada (nada se ha escrito)."""
+    diff = sim.plan.resumen() if sim.plan else {"stock": [], "pendientes": [], "negativos_nuevos": []}
+    diff["duplicados"] = sim.duplicados
+    completos = sum(1 for p in diff["pendientes"] if p["ESTADO"] == "COMPLETO")
+    diff["totales"] = {
+        "celdas": len(diff["stock"]),
+        "pendientes_completos": completos,
+        "pendientes_parciales": len(diff["pendientes"]) - completos,
+        "negativos_nuevos": len(diff["negativos_nuevos"]),
+        "duplicados": len(sim.duplicados),
+    }
+    return diff
+
+
+def _acumular(total: Dict[str, Any], out: Dict[str, Any]) -> None:
+    for k, v in out.items():
+        if isinstance(v, list):
+            total.setdefault(k, []).extend(v)
+        else:
+            total[k] = total.get(k, 0) + v
+
+
+def _leer_medido(trozos, fase: str):
+    """Itera los trozos del lector contando su tiempo en la fase `fase`."""
+    it = iter(trozos)
+    while True:
+        with METRICS.phase(fase):
+            try:
+                df = next(it)
+            except StopIteration:
+                return
+        yield df
+
+
+def _normalizar_albaranes(df: pd.DataFrame) -> pd.DataFrame:
+    """Excel de albaranes -> líneas normalizadas (sin tocar los stores)."""
     columnas = [
         "CodigoArticulo",
         "DesTalla",
@@ -1206,123 +1721,131 @@ def _procesar_albaranes_df(
     if not all(col in df.columns for col in columnas):
         raise ValueError(f"Faltan columnas necesarias: {columnas}")
 
-    ya_registrado = defaultdict(int)
-    for s in mgr.inventory.historial_salidas:
-        try:
-            k = (
-                str(s.get("modelo", "")).strip().upper(),
-                norm_talla(s.get("talla", "")),
-                norm_codigo(s.get("pedido", "")),
-                norm_codigo(s.get("albaran", "")),
-            )
-            ya_registrado[k] += int(s.get("cantidad", 0) or 0)
-        except Exception:
-            continue
-
-    lineas = []
-    for _, fila in df.iterrows():
-        modelo = str(fila["CodigoArticulo"]).strip().upper()
-        talla = norm_talla(fila["DesTalla"])
-        val_total = fila["Total"]
-        cantidad_excel = (
-            int(val_total)
-            if not pd.isna(val_total) and str(val_total).strip() != ""
-            else 0
-        )
-        val_pedido = fila["SuPedido"]
-        pedido = norm_codigo("" if pd.isna(val_pedido) else val_pedido)
-        val_albar = fila["NumeroAlbaran"]
-        albaran = norm_codigo("" if pd.isna(val_albar) else val_albar)
-        val_fecha = fila["FechaAlbaran"]
-        fecha = parse_fecha_excel(None if pd.isna(val_fecha) else val_fecha)
-        k = (modelo, talla, pedido, albaran)
-        qty_prev = ya_registrado.get(k, 0)
-
-        lineas.append(
+    # Normalización por columnas (una llamada por valor distinto)
+    with METRICS.phase("normalize"):
+        return pd.DataFrame(
             {
-                "modelo": modelo,
-                "talla": talla,
-                "pedido": pedido,
-                "albaran": albaran,
-                "fecha": fecha,
-                "cantidad_excel": cantidad_excel,
-                "ya_prev": qty_prev,
+                "modelo": _map_unique(df["CodigoArticulo"], _excel_modelo),
+                "talla": _map_unique(df["DesTalla"], norm_talla),
+                "pedido": _map_unique(df["SuPedido"], _excel_codigo),
+                "albaran": _map_unique(df["NumeroAlbaran"], _excel_codigo),
+                "fecha": _map_unique(df["FechaAlbaran"], _excel_fecha),
+                "cantidad_excel": _map_unique(df["Total"], _excel_int),
             }
         )
 
-    nuevas_salidas = 0
-    import_rows = []
 
-    pedidos_antes = list(mgr.prevision.pedidos)
-
-    for L in lineas:
-        modelo = L["modelo"]
-        talla = L["talla"]
-        pedido = L["pedido"]
-        albaran = L["albaran"]
-        fecha = L["fecha"]
-        qty_excel = int(L["cantidad_excel"])
-        qty_prev = int(L["ya_prev"])
-
-        if modo == "d" and qty_prev > 0:
-            aplicar = max(qty_excel - qty_prev, 0)
-        elif modo == "i" and qty_prev > 0:
-            aplicar = 0
-        else:
-            aplicar = qty_excel
-
-        if aplicar <= 0:
-            continue
-
-        if not simular:
-            cliente = ""
-            for p in mgr.prevision.pedidos:
-                if (
-                    str(p.get("modelo", "")).strip().upper() == modelo
-                    and norm_talla(p.get("talla", "")) == talla
-                    and p.get("pedido", "") == pedido
-                ):
-                    cliente = p.get("cliente", "") or ""
-                    if cliente:
-                        break
-            if not cliente:
-                cliente = (
-                    mgr.prevision.info_modelos.get(modelo, {}).get("cliente", "") or ""
-                )
-            mgr.inventory.register_exit(
-                modelo=modelo,
-                talla=talla,
-                cantidad=aplicar,
-                cliente=cliente,
-                pedido=pedido,
-                albaran=albaran,
-                fecha=fecha,
-            )
+def _aplicar_albaranes(
+    mgr: GestorStock,
+    lineas: pd.DataFrame,
+    modo: str,
+    vistas: Optional[set] = None,
+    guardar: bool = True,
+    ctx: Optional[_ImportCtx] = None,
+) -> Dict[str, Any]:
+    """
+    Aplica líneas normalizadas de albaranes. Con guardar=False no escribe
+    los JSON (quien llama guarda una sola vez al final del fichero / lote);
+    con ctx.sim solo las planifica.
+    """
+    ctx = ctx or _ImportCtx()
+    sim = ctx.sim
+    claves = ["modelo", "talla", "pedido", "albaran"]
+
+    # 1) Filas ya aplicadas desde otro fichero (registro de importaciones)
+    lineas, todas_claves, ya_importadas = _filtrar_vistas(
+        lineas,
+        ["modelo", "talla", "pedido", "albaran", "fecha", "cantidad_excel"],
+        vistas,
+        ctx,
+    )
 
-        nuevas_salidas += aplicar
-        import_rows.append(
-            {
-                "FECHA": fecha,
-                "MODELO": modelo,
-                "TALLA": talla,
-                "CANTIDAD": aplicar,
-                "PEDIDO": pedido,
-                "ALBARAN": albaran,
-                "CLIENTE": "",
-            }
+    # 2) Ledger de salidas ya registradas (una vez por fichero) + merge
+    with METRICS.phase("dedup_ledger"):
+        if ctx.ledger is None:
+            # simulado: también las salidas que ya planificaron ficheros anteriores
+            previas = sim.plan.salidas if sim and sim.plan else ()
+            ctx.ledger = _ledger_salidas(mgr, claves, previas)
+        ledger = ctx.ledger
+        lineas = lineas.merge(ledger, how="left", on=claves, sort=False)
+        lineas["ya_prev"] = lineas["ya_prev"].fillna(0).astype("int64")
+
+    qty_excel = lineas["cantidad_excel"].astype("int64").to_numpy()
+    qty_prev = lineas["ya_prev"].to_numpy()
+    hay_prev = qty_prev > 0
+    if modo == "d":
+        aplicar = np.where(hay_prev, np.maximum(qty_excel - qty_prev, 0), qty_excel)
+    elif modo == "i":
+        aplicar = np.where(hay_prev, 0, qty_excel)
+    else:
+        aplicar = qty_excel
+    lineas["aplicar"] = aplicar
+    if sim and hay_prev.any():
+        dup = lineas[hay_prev]
+        sim.duplicados.extend(
+            pd.DataFrame(
+                {
+                    "MODELO": dup["modelo"],
+                    "TALLA": dup["talla"],
+                    "PEDIDO": dup["pedido"],
+                    "ALBARAN": dup["albaran"],
+                    "CANTIDAD": dup["cantidad_excel"],
+                    "YA_REGISTRADA": dup["ya_prev"],
+                    "APLICAR": dup["aplicar"],
+                }
+            ).to_dict(orient="records")
         )
-
-    pedidos_despues = list(mgr.prevision.pedidos)
-    set_antes = {
-        (p["modelo"], norm_talla(p["talla"]), p["pedido"]) for p in pedidos_antes
-    }
-    set_despues = {
-        (p["modelo"], norm_talla(p["talla"]), p["pedido"]) for p in pedidos_despues
-    }
-    servidos = set_antes - set_despues
+    lineas = lineas[lineas["aplicar"] > 0]
+
+    nuevas_salidas = int(lineas["aplicar"].sum())
+    import_rows = pd.DataFrame(
+        {
+            "FECHA": lineas["fecha"],
+            "MODELO": lineas["modelo"],
+            "TALLA": lineas["talla"],
+            "CANTIDAD": lineas["aplicar"],
+            "PEDIDO": lineas["pedido"],
+            "ALBARAN": lineas["albaran"],
+            "CLIENTE": "",
+        }
+    ).to_dict(orient="records")
+
+    # 3) Plan en bloque sobre pendientes indexados (no toca los stores).
+    #    Simulado: el plan se acumula entre trozos y ficheros y queda como vista previa.
+    #    Real: se aplica ya (ambos JSON se guardan una vez al final).
+    bloque = [
+        {
+            "modelo": r["MODELO"],
+            "talla": r["TALLA"],
+            "cantidad": r["CANTIDAD"],
+            "pedido": r["PEDIDO"],
+            "albaran": r["ALBARAN"],
+            "fecha": r["FECHA"],
+            "cliente": None,  # lo resuelve el plan: pendiente vivo o MapaClientes
+        }
+        for r in import_rows
+    ]
+    servidos: List[Tuple[str, str, str]] = []
+    if bloque:
+        with METRICS.phase("plan"):
+            clientes = _mapa_clientes(mgr, ctx)
+            if sim:
+                if sim.plan is None:
+                    pendientes = mgr.prevision.pedidos + sim.pendientes
+                    sim.plan = PlanSalidas(mgr.inventory, clientes, pendientes)
+                plan = sim.plan
+            else:
+                plan = PlanSalidas(mgr.inventory, clientes)
+            plan.agregar(bloque)
+            servidos = plan.claves_servidas()
+        if not sim:
+            with METRICS.phase("apply"):
+                _capture_io(lambda: mgr.inventory.apply_exits_plan(plan, guardar=guardar))
 
     return {
         "nuevas_salidas": nuevas_salidas,
+        "filas_ya_importadas": ya_importadas,
+        "_claves": todas_claves,
         "import_rows": import_rows,
         "servidos": [
             {"MODELO": m, "TALLA": t, "PEDIDO": ped} for (m, t, ped) in servidos
@@ -1330,9 +1853,53 @@ def _procesar_albaranes_df(
     }
 
 
-def _procesar_pedidos_df(
-    mgr: GestorStock, df: pd.DataFrame, simular: bool
-) -> Dict[str, Any]:
+def _ledger_salidas(mgr: GestorStock, claves: List[str], previas=()) -> pd.DataFrame:
+    """(modelo, talla, pedido, albaran) -> cantidad ya registrada en historial_salidas (+ previas)."""
+    hist = mgr.inventory.historial_salidas
+    if previas:
+        hist = hist + list(previas)
+    ledger = pd.DataFrame(
+        {
+            "modelo": _map_unique(
+                pd.Series([s.get("modelo", "") for s in hist], dtype=object),
+                _excel_modelo,
+            ),
+            "talla": _map_unique(
+                pd.Series([s.get("talla", "") for s in hist], dtype=object),
+                norm_talla,
+            ),
+            "pedido": _map_unique(
+                pd.Series([s.get("pedido", "") for s in hist], dtype=object),
+                norm_codigo,
+            ),
+            "albaran": _map_unique(
+                pd.Series([s.get("albaran", "") for s in hist], dtype=object),
+                norm_codigo,
+            ),
+            "ya_prev": _map_unique(
+                pd.Series([s.get("cantidad", 0) for s in hist], dtype=object),
+                _ledger_int,
+            ),
+        }
+    )
+    # filas con cantidad ilegible se ignoran (como el bucle original)
+    ledger = ledger[ledger["ya_prev"].notna()]
+    return (
+        ledger.astype({"ya_prev": "int64"})
+        .groupby(claves, sort=False, as_index=False)["ya_prev"]
+        .sum()
+    )
+
+
+def _ledger_int(v) -> Optional[int]:
+    try:
+        return int(v or 0)
+    except Exception:
+        return None
+
+
+def _normalizar_pedidos(df: pd.DataFrame) -> pd.DataFrame:
+    """Excel de pedidos pendientes -> líneas normalizadas (sin tocar los stores)."""
     columnas = [
         "CodigoArticulo",
         "DesTalla",
@@ -1344,90 +1911,504 @@ def _procesar_pedidos_df(
     if not all(col in df.columns for col in columnas):
         raise ValueError(f"Faltan columnas necesarias: {columnas}")
 
-    ya = {
-        (
-            str(p.get("modelo", "")).strip().upper(),
-            norm_talla(p.get("talla", "")),
-            p.get("pedido", ""),
+    # Normalización por columnas
+    with METRICS.phase("normalize"):
+        return pd.DataFrame(
+            {
+                "modelo": _map_unique(df["CodigoArticulo"], _excel_modelo),
+                "talla": _map_unique(df["DesTalla"], norm_talla),
+                "cantidad": _map_unique(df["UnidadesPendientes"], _pendiente_int),
+                "pedido": _map_unique(df["SuPedido"], norm_codigo),
+                "numero_pedido": _map_unique(df["NumeroPedido"], norm_codigo),
+                "fecha": _map_unique(df["FechaEntrega"], parse_fecha_excel),
+            }
         )
-        for p in mgr.prevision.pedidos
-    }
 
-    nuevos, duplicados = 0, 0
-    import_rows = []
-
-    for _, fila in df.iterrows():
-        modelo = str(fila["CodigoArticulo"]).strip().upper()
-        talla = norm_talla(fila["DesTalla"])
-        val = fila["UnidadesPendientes"]
-        cantidad = int(val) if not pd.isna(val) else 0
-        pedido = norm_codigo(fila["SuPedido"])
-        numero_pedido = norm_codigo(fila["NumeroPedido"])
-        fecha = parse_fecha_excel(fila["FechaEntrega"])
-        cliente_resuelto = (
-            mgr.inventory.info_modelos.get(modelo, {}).get("cliente", "") or ""
+
+def _aplicar_pedidos(
+    mgr: GestorStock,
+    lineas: pd.DataFrame,
+    vistas: Optional[set] = None,
+    guardar: bool = True,
+    ctx: Optional[_ImportCtx] = None,
+) -> Dict[str, Any]:
+    """Aplica líneas normalizadas de pedidos (guardar=False: sin escribir JSON; ctx.sim: sin aplicar)."""
+    ctx = ctx or _ImportCtx()
+    sim = ctx.sim
+    # cliente por defecto del inventario (no de la previsión), como el alta original
+    info = mgr.inventory.info_modelos
+    lineas = lineas.assign(
+        cliente=_map_unique(
+            lineas["modelo"], lambda m: info.get(m, {}).get("cliente", "") or ""
         )
+    )
 
-        k = (modelo, talla, pedido)
-        if k in ya:
-            duplicados += 1
-            continue
+    # 1) Filas ya aplicadas desde otro fichero (registro de importaciones)
+    lineas, todas_claves, ya_importadas = _filtrar_vistas(
+        lineas,
+        ["modelo", "talla", "pedido", "numero_pedido", "fecha", "cantidad"],
+        vistas,
+        ctx,
+    )
 
-        if not simular:
-            mgr.prevision.register_pending(
-                modelo=modelo,
-                talla=talla,
-                cantidad=int(cantidad),
-                pedido=pedido,
-                cliente=cliente_resuelto,
-                fecha=fecha or None,
-                numero_pedido=numero_pedido or None,
+    # 2) Anti-join contra los pendientes existentes (una operación de conjunto).
+    #    Solo contra los que ya había: repetidos dentro del Excel se importan.
+    with METRICS.phase("dedup_ledger"):
+        if ctx.ya is None:
+            # simulado: también los pendientes que darían de alta ficheros anteriores
+            pendientes = mgr.prevision.pedidos + (sim.pendientes if sim else [])
+            ctx.ya = {
+                (
+                    str(p.get("modelo", "")).strip().upper(),
+                    norm_talla(p.get("talla", "")),
+                    p.get("pedido", ""),
+                )
+                for p in pendientes
+            }
+        ya = ctx.ya
+        claves = pd.MultiIndex.from_arrays(
+            [lineas["modelo"], lineas["talla"], lineas["pedido"]]
+        )
+        es_dup = claves.isin(ya) if len(lineas) else np.zeros(0, dtype=bool)
+        duplicados = int(es_dup.sum())
+        if sim and duplicados:
+            dup = lineas[es_dup]
+            sim.duplicados.extend(
+                pd.DataFrame(
+                    {
+                        "MODELO": dup["modelo"],
+                        "TALLA": dup["talla"],
+                        "PEDIDO": dup["pedido"],
+                        "NUMERO_PEDIDO": dup["numero_pedido"],
+                        "CANTIDAD": dup["cantidad"],
+                    }
+                ).to_dict(orient="records")
             )
-
-        nuevos += 1
-        import_rows.append(
+        lineas = lineas[~es_dup]
+
+    nuevos = len(lineas)
+    import_rows = pd.DataFrame(
+        {
+            "FECHA": lineas["fecha"],
+            "PEDIDO": lineas["pedido"],
+            "NUMERO_PEDIDO": lineas["numero_pedido"],
+            "MODELO": lineas["modelo"],
+            "TALLA": lineas["talla"],
+            "CANTIDAD": lineas["cantidad"],
+            "CLIENTE": lineas["cliente"],
+        }
+    ).to_dict(orient="records")
+
+    # 3) Alta en bloque: un único guardado de prevision.json.
+    #    Simulado: se guardan aparte para los ficheros siguientes del lote.
+    if nuevos:
+        bloque = [
             {
-                "FECHA": fecha,
-                "PEDIDO": pedido,
-                "NUMERO_PEDIDO": numero_pedido,
-                "MODELO": modelo,
-                "TALLA": talla,
-                "CANTIDAD": int(cantidad),
-                "CLIENTE": cliente_resuelto,
+                "modelo": r["MODELO"],
+                "talla": r["TALLA"],
+                "cantidad": r["CANTIDAD"],
+                "pedido": r["PEDIDO"],
+                "cliente": r["CLIENTE"],
+                "fecha": r["FECHA"] or None,
+                "numero_pedido": r["NUMERO_PEDIDO"] or None,
             }
-        )
+            for r in import_rows
+        ]
+        if sim:
+            sim.pendientes.extend(mgr.prevision.build_pendings(bloque))
+        else:
+            with METRICS.phase("apply"):
+                _capture_io(
+                    lambda: mgr.prevision.register_pendings_bulk(bloque, guardar=guardar)
+                )
 
-    return {"nuevos": nuevos, "duplicados": duplicados, "import_rows": import_rows}
+    return {
+        "nuevos": nuevos,
+        "duplicados": duplicados,
+        "filas_ya_importadas": ya_importadas,
+        "_claves": todas_claves,
+        "import_rows": import_rows,
+    }
+
+
+def _skip_arg(args) -> Optional[int]:
+    # --skip fuerza la fila de cabecera (como skiprows); sin él se autodetecta
+    return int(args.skip) if args.skip not in (None, "") else None
+
+
+def _leer_trozos(args, ruta: str, columnas: List[str], skip: Optional[int]):
+    # Excel o CSV/TSV en trozos de --chunk-rows filas (memoria acotada)
+    fase = "read:csv" if ruta.lower().endswith(EXTENSIONES_CSV) else "read:excel"
+    filas = int(args.chunk_rows) if args.chunk_rows else FILAS_POR_TROZO
+    return _leer_medido(
+        leer_listado_erp(ruta, columnas, skip=skip, filas_por_trozo=max(1, filas)), fase
+    )
+
+
+def _import_registry_path(args) -> str:
+    return args.import_registry or os.path.join(
+        os.path.dirname(os.path.abspath(args.inv)), ImportRegistry.NOMBRE
+    )
+
+
+def _import_registry(args) -> ImportRegistry:
+    return ImportRegistry(_import_registry_path(args))
+
+
+def _ya_importado(entrada: Dict[str, Any], **vacio) -> int:
+    registro = {
+        k: entrada.get(k) for k in ("nombre", "sha256", "filas", "nuevas", "importado")
+    }
+    return _ok(message="YA_IMPORTADO", ya_importado=True, registro=registro, **vacio)
 
 
 def op_import_albaranes(args):
-    mgr = _make_mgr(args)
     modo = (args.modo or "d").strip().lower()
     simular = bool(int(args.simular or 0))
-    skip = int(args.skip or 25)
+    skip = _skip_arg(args)
+    # modo t (todo) y --force-import 1 ignoran el registro (pero se registra igual)
+    respetar = modo != "t" and not bool(int(args.force_import or 0))
 
     # excel_path tiene prioridad
-    ruta = args.excel_path or getattr(mgr, "ALBARANES_EXCEL", None)
+    mgr = None
+    ruta = args.excel_path
+    if not ruta:
+        mgr = _make_mgr(args)
+        ruta = getattr(mgr, "ALBARANES_EXCEL", None)
     if not ruta:
         return _fail("MISSING_PATH", "excel_path o ALBARANES_EXCEL requerido")
-    df = pd.read_excel(ruta, skiprows=skip)
-    out = _procesar_albaranes_df(mgr, df, modo=modo, simular=simular)
+
+    with METRICS.phase("registry"):
+        registro = _import_registry(args)
+        sha = ImportRegistry.sha256_fichero(ruta)
+        previo = registro.buscar(sha, "albaranes")
+    if previo and respetar:
+        return _ya_importado(
+            previo, nuevas_salidas=0, filas_ya_importadas=previo.get("filas", 0),
+            import_rows=[], servidos=[],
+        )
+
+    mgr = mgr or _make_mgr(args)
+    vistas = registro.claves_vistas("albaranes") if respetar else None
+    out = _procesar_listado(
+        mgr, _leer_trozos(args, ruta, COLUMNAS_ALBARANES, skip), "albaranes",
+        modo=modo, simular=simular, vistas=vistas,
+    )
+    claves = out.pop("_claves")
+    if not simular:
+        registro.registrar(
+            sha, "albaranes", os.path.basename(ruta), len(claves), len(out["import_rows"]), claves
+        )
     return _ok(message="IMPORT_ALBARANES_OK", **out)
 
 
 def op_import_pedidos(args):
-    mgr = _make_mgr(args)
     simular = bool(int(args.simular or 0))
-    skip = int(args.skip or 26)
+    skip = _skip_arg(args)
+    respetar = not bool(int(args.force_import or 0))
 
-    ruta = args.excel_path or getattr(mgr, "PEDIDOS_EXCEL", None)
+    mgr = None
+    ruta = args.excel_path
+    if not ruta:
+        mgr = _make_mgr(args)
+        ruta = getattr(mgr, "PEDIDOS_EXCEL", None)
     if not ruta:
         return _fail("MISSING_PATH", "excel_path o PEDIDOS_EXCEL requerido")
-    df = pd.read_excel(ruta, skiprows=skip)
-    out = _procesar_pedidos_df(mgr, df, simular=simular)
+
+    with METRICS.phase("registry"):
+        registro = _import_registry(args)
+        sha = ImportRegistry.sha256_fichero(ruta)
+        previo = registro.buscar(sha, "pedidos")
+    if previo and respetar:
+        return _ya_importado(
+            previo, nuevos=0, duplicados=0, filas_ya_importadas=previo.get("filas", 0),
+            import_rows=[],
+        )
+
+    mgr = mgr or _make_mgr(args)
+    vistas = registro.claves_vistas("pedidos") if respetar else None
+    out = _procesar_listado(
+        mgr, _leer_trozos(args, ruta, COLUMNAS_PEDIDOS, skip), "pedidos",
+        simular=simular, vistas=vistas,
+    )
+    claves = out.pop("_claves")
+    if not simular:
+        registro.registrar(
+            sha, "pedidos", os.path.basename(ruta), len(claves), out["nuevos"], claves
+        )
     return _ok(message="IMPORT_PEDIDOS_OK", **out)
 
 
+# Extensiones que recoge import_dir (los "~$..." son bloqueos de Excel abierto)
+_IMPORT_DIR_EXTS = (".xlsx", ".xlsm", ".xls") + EXTENSIONES_CSV
+# Orden de aplicación: primero pendientes, luego albaranes que los sirven
+_IMPORT_DIR_ORDEN = {"pedidos": 0, "albaranes": 1}
+
+
+def _parse_import_file(ruta: str, skip: Optional[int]) -> Dict[str, Any]:
+    """
+    Worker de import_dir (se ejecuta en otro proceso): hash, lectura,
+    detección del tipo de listado y normalización. No toca los stores.
+    """
+    res: Dict[str, Any] = {"ruta": ruta, "nombre": os.path.basename(ruta), "tipo": None}
+    try:
+        res["sha256"] = ImportRegistry.sha256_fichero(ruta)
+        cols = COLUMNAS_ALBARANES + [c for c in COLUMNAS_PEDIDOS if c not in COLUMNAS_ALBARANES]
+        df = leer_excel_erp(ruta, cols, skip=skip)
+        res["filas"] = len(df)
+        if all(c in df.columns for c in COLUMNAS_ALBARANES):
+            res["tipo"], lineas = "albaranes", _normalizar_albaranes(df)
+        elif all(c in df.columns for c in COLUMNAS_PEDIDOS):
+            res["tipo"], lineas = "pedidos", _normalizar_pedidos(df)
+        else:
+            return res
+        fechas = [f for f in lineas["fecha"].tolist() if f]
+        res["fecha_min"] = min(fechas) if fechas else ""
+        res["lineas"] = lineas
+    except Exception as e:
+        res["error"] = f"{type(e).__name__}: {e}"
+    return res
+
+
+def _parse_en_paralelo(rutas: List[str], skip: Optional[int], workers: int) -> List[Dict]:
+    if workers <= 1 or len(rutas) <= 1:
+        return [_parse_import_file(r, skip) for r in rutas]
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(_parse_import_file, rutas, [skip] * len(rutas)))
+
+
+def op_import_dir(args):
+    carpeta = args.excel_dir
+    if not carpeta or not os.path.isdir(carpeta):
+        return _fail("MISSING_PATH", "excel_dir requerido (carpeta con los Excel del ERP)")
+    modo = (args.modo or "d").strip().lower()
+    simular = bool(int(args.simular or 0))
+    forzar = bool(int(args.force_import or 0))
+    respetar = {"pedidos": not forzar, "albaranes": not forzar and modo != "t"}
+
+    rutas = sorted(
+        str(p)
+        for p in Path(carpeta).iterdir()
+        if p.is_file() and p.suffix.lower() in _IMPORT_DIR_EXTS and not p.name.startswith("~$")
+    )
+    workers = int(args.workers) if args.workers else min(len(rutas), os.cpu_count() or 1)
+
+    # 1) Lectura + normalización en paralelo (un proceso por fichero)
+    with METRICS.phase("parse"):
+        parsed = _parse_en_paralelo(rutas, _skip_arg(args), max(1, workers))
+    errores = [f"{p['nombre']}: {p['error']}" for p in parsed if p.get("error")]
+    if errores:
+        return _fail("PARSE_ERROR", "; ".join(errores))
+    METRICS.count("files_in", len(parsed))
+    METRICS.count("rows_in", sum(p.get("filas", 0) for p in parsed))
+
+    # 2) Aplicación en serie y en orden determinista, sin guardar hasta el final
+    parsed.sort(
+        key=lambda p: (
+            _IMPORT_DIR_ORDEN.get(p["tipo"], 2),
+            p.get("fecha_min") or "9999-99-99",
+            p["nombre"],
+        )
+    )
+    mgr = _make_mgr(args)
+    registro = _import_registry(args)
+    vistas = {
+        t: registro.claves_vistas(t) if respetar[t] else set() for t in _IMPORT_DIR_ORDEN
+    }
+    en_lote: set = set()
+    ficheros: List[Dict[str, Any]] = []
+    servidos: List[Dict[str, Any]] = []
+    totales = defaultdict(int)
+    aplicados = 0
+    # simulado: un solo estado para todo el lote (plan, altas y duplicados)
+    sim = _Simulacion() if simular else None
+
+    with METRICS.phase("apply:lote"):
+        for p in parsed:
+            tipo = p["tipo"]
+            fila = {
+                "FICHERO": p["nombre"],
+                "TIPO": tipo or "",
+                "FILAS": p.get("filas", 0),
+                "FECHA_MIN": p.get("fecha_min", ""),
+                "NUEVAS": 0,
+                "DUPLICADOS": 0,
+                "YA_IMPORTADAS": 0,
+                "ESTADO": "",
+            }
+            ficheros.append(fila)
+            if tipo is None:
+                fila["ESTADO"] = "IGNORADO"
+                totales["ignorados"] += 1
+                continue
+            clave_fichero = (p["sha256"], tipo)
+            if respetar[tipo] and (
+                clave_fichero in en_lote or registro.buscar(p["sha256"], tipo)
+            ):
+                fila["ESTADO"] = "YA_IMPORTADO"
+                fila["YA_IMPORTADAS"] = fila["FILAS"]
+                totales["ya_importados"] += 1
+                continue
+            en_lote.add(clave_fichero)
+
+            v = vistas[tipo] if respetar[tipo] else None
+            ctx = _ImportCtx(sim=sim)
+            if tipo == "pedidos":
+                out = _aplicar_pedidos(mgr, p["lineas"], vistas=v, guardar=False, ctx=ctx)
+                fila["NUEVAS"], fila["DUPLICADOS"] = out["nuevos"], out["duplicados"]
+                totales["nuevos"] += out["nuevos"]
+                totales["duplicados"] += out["duplicados"]
+            else:
+                out = _aplicar_albaranes(
+                    mgr, p["lineas"], modo, vistas=v, guardar=False, ctx=ctx
+                )
+                fila["NUEVAS"] = out["nuevas_salidas"]
+                totales["nuevas_salidas"] += out["nuevas_salidas"]
+                servidos.extend(out["servidos"])
+            claves = out.pop("_claves")
+            # filas repetidas entre ficheros del mismo lote también se saltan
+            vistas[tipo].update(claves)
+            fila["YA_IMPORTADAS"] = out["filas_ya_importadas"]
+            totales["filas_ya_importadas"] += out["filas_ya_importadas"]
+            fila["ESTADO"] = "SIMULADO" if simular else "IMPORTADO"
+            if not simular:
+                registro.registrar(
+                    p["sha256"], tipo, p["nombre"], p.get("filas", 0),
+                    len(out["import_rows"]), claves, guardar=False,
+                )
+                aplicados += 1
+
+    # 3) Commit: una escritura por store para todo el lote
+    if aplicados:
+        mgr.prevision.save()
+        mgr.inventory.save()
+        registro.store.save()
+
+    if simular:
+        servidos = list({json.dumps(s, sort_keys=True): s for s in servidos}.values())
+    return _ok(
+        message="IMPORT_DIR_OK",
+        simular=simular,
+        ficheros=ficheros,
+        totales={"ficheros": len(ficheros), **totales},
+        servidos=servidos,
+        **({"diff": _diff_importacion(sim)} if simular else {}),
+    )
+
+
+# -----------------------
+# Ops: puente ediwin-parse -> previsión
+# - PDF de pedidos EDI (ECI / Eurofiel) directo a pendientes, sin pasar por Excel
+# -----------------------
+_EDIWIN_CORE = HERE.parent / "ediwin-parse" / "core.py"
+_EDIWIN_TIPOS = ("ECI", "EUROFIEL")
+
+
+def _ediwin_core():
+    """Carga ediwin-parse/core.py bajo demanda (pdfplumber/pypdf solo hacen falta aquí)."""
+    mod = sys.modules.get("ediwin_core")
+    if mod is None:
+        spec = importlib.util.spec_from_file_location("ediwin_core", _EDIWIN_CORE)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        sys.modules["ediwin_core"] = mod
+    return mod
+
+
+def _ediwin_a_erp(df: pd.DataFrame, tallas: List[str]) -> Tuple[pd.DataFrame, int]:
+    """
+    DataFrame de ediwin-parse (una columna por talla) -> listado largo con las
+    columnas de COLUMNAS_PEDIDOS: una fila por (modelo, pedido, talla) con
+    unidades > 0. Las anulaciones no generan pendientes; se devuelven contadas.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_PEDIDOS), 0
+    pedido_col = "PEDIDO" if "PEDIDO" in df.columns else "N_PEDIDO"
+    anula = df["TIPO"].fillna("").astype(str).str.upper().str.contains("ANULACI")
+    df = df[~anula]
+
+    with METRICS.phase("melt"):
+        largo = df.melt(
+            id_vars=["MODELO", pedido_col, "FECHA_ENTREGA"],
+            value_vars=[t for t in tallas if t in df.columns],
+            var_name="DesTalla",
+            value_name="UnidadesPendientes",
+        )
+        largo["UnidadesPendientes"] = (
+            pd.to_numeric(largo["UnidadesPendientes"], errors="coerce").fillna(0).astype("int64")
+        )
+        largo = largo[largo["UnidadesPendientes"] > 0]
+        # un mismo pedido/modelo/talla en varias líneas del PDF (p.ej. ECI por
+        # sucursal de entrega) -> una sola línea con la suma
+        largo = largo.groupby(
+            ["MODELO", pedido_col, "DesTalla"], sort=False, as_index=False
+        ).agg(FechaEntrega=("FECHA_ENTREGA", "first"), UnidadesPendientes=("UnidadesPendientes", "sum"))
+
+    erp = pd.DataFrame(
+        {
+            "NumeroPedido": "",
+            "FechaEntrega": largo["FechaEntrega"],
+            "CodigoArticulo": largo["MODELO"],
+            "DesTalla": largo["DesTalla"],
+            "UnidadesPendientes": largo["UnidadesPendientes"],
+            "SuPedido": largo[pedido_col],
+        },
+        columns=COLUMNAS_PEDIDOS,
+    )
+    return erp, int(anula.sum())
+
+
+def op_import_ediwin(args):
+    ruta = args.pdf_path
+    tipo = (args.tipo or "").strip().upper()
+    if not ruta:
+        return _fail("MISSING_PATH", "pdf_path requerido (PDF de pedidos EDI)")
+    if tipo not in _EDIWIN_TIPOS:
+        return _fail("BAD_TIPO", "tipo debe ser ECI o EUROFIEL")
+    simular = bool(int(args.simular or 0))
+    respetar = not bool(int(args.force_import or 0))
+
+    with METRICS.phase("registry"):
+        registro = _import_registry(args)
+        sha = ImportRegistry.sha256_fichero(ruta)
+        previo = registro.buscar(sha, "ediwin")
+    if previo and respetar:
+        return _ya_importado(
+            previo, nuevos=0, duplicados=0, filas_ya_importadas=previo.get("filas", 0),
+            import_rows=[],
+        )
+
+    try:
+        core = _ediwin_core()
+    except ImportError as e:
+        return _fail("MISSING_DEPENDENCY", f"ediwin-parse no disponible: {e}")
+    with METRICS.phase("read:pdf"):
+        pdf = Path(ruta).read_bytes()
+        if tipo == "ECI":
+            df = core.parse_pdf_eci_bytes(pdf)
+        else:
+            df = core.parse_pdf_eurofiel_bytes(pdf)
+    erp, anulaciones = _ediwin_a_erp(df, core.TALLAS)
+
+    mgr = _make_mgr(args)
+    vistas = registro.claves_vistas("ediwin") if respetar else None
+    out = _procesar_listado(mgr, [erp], "pedidos", simular=simular, vistas=vistas)
+    claves = out.pop("_claves")
+    if not simular:
+        registro.registrar(
+            sha, "ediwin", os.path.basename(ruta), len(claves), out["nuevos"], claves
+        )
+    return _ok(
+        message="IMPORT_EDIWIN_OK",
+        tipo=tipo,
+        pedidos_pdf=len(df),
+        anulaciones=anulaciones,
+        **out,
+    )
+
+
 # -----------------------
 # Ops: backups
 # -----------------------
@@ -1448,8 +2429,17 @@ def op_backup_create(args):
 
     shutil.copyfile(mgr.ds_inventario.path, ruta_datos)
     shutil.copyfile(mgr.ds_prevision.path, ruta_prevision)
+    files = [str(ruta_datos), str(ruta_prevision)]
+
+    # el registro de importaciones va con los datos: restaurar sin él dejaría
+    # como YA_IMPORTADO ficheros cuyos movimientos ya no están
+    registro = Path(_import_registry_path(args))
+    if registro.exists():
+        ruta_registro = base_dir / f"importaciones_{fecha}.json"
+        shutil.copyfile(registro, ruta_registro)
+        files.append(str(ruta_registro))
 
-    return _ok(message="BACKUP_CREATED", files=[str(ruta_datos), str(ruta_prevision)])
+    return _ok(message="BACKUP_CREATED", files=files)
 
 
 def op_backup_list(args):
@@ -1484,29 +2474,292 @@ def op_backup_restore(args):
     if not origen.exists():
         return _fail("NOT_FOUND", f"no existe {origen}")
 
+    store = None
     if "datos_almacen" in name:
-        destino = Path(mgr.ds_inventario.path)
+        store, destino = "datos_almacen", Path(mgr.ds_inventario.path)
     elif "prevision" in name:
-        destino = Path(mgr.ds_prevision.path)
+        store, destino = "prevision", Path(mgr.ds_prevision.path)
+    elif "importaciones" in name:
+        destino = Path(_import_registry_path(args))
     else:
-        return _fail("BAD_INPUT", "backup debe incluir 'datos_almacen' o 'prevision'")
+        return _fail(
+            "BAD_INPUT", "backup debe incluir 'datos_almacen', 'prevision' o 'importaciones'"
+        )
 
     shutil.copyfile(origen, destino)
-    return _ok(message="BACKUP_RESTORED", restored=name, dest=str(destino))
+    extra: Dict[str, Any] = {}
+    if store:
+        extra["registry"] = _restaurar_registro(args, base_dir, name, store)
+    return _ok(message="BACKUP_RESTORED", restored=name, dest=str(destino), **extra)
+
+
+def _restaurar_registro(args, base_dir: Path, name: str, store: str) -> Dict[str, Any]:
+    """Devuelve al momento del backup las entradas del registro que afectan a `store`.
+
+    Solo los tipos de ImportRegistry.TIPOS_POR_STORE[store]: restaurar la
+    previsión no rebobina albaranes (sus salidas siguen en datos_almacen).
+    Con copia importaciones_<fecha>.json se toman de ella; en backups
+    anteriores (sin copia) se quitan las importadas después.
+    """
+    m = re.search(r"(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})", name)
+    if not m:
+        return {"action": "none"}
+    tipos = ImportRegistry.TIPOS_POR_STORE[store]
+    copia = base_dir / f"importaciones_{m.group(1)}.json"
+    destino = Path(_import_registry_path(args))
+    if copia.exists():
+        ImportRegistry(str(destino)).sustituir_tipos(ImportRegistry(str(copia)).ficheros, tipos)
+        return {"action": "restored", "file": copia.name, "tipos": list(tipos)}
+    if not destino.exists():
+        return {"action": "none"}
+    limite = datetime.strptime(m.group(1), "%Y-%m-%d_%H-%M-%S").isoformat(timespec="seconds")
+    removed = ImportRegistry(str(destino)).descartar_desde(limite, tipos)
+    return {"action": "pruned", "removed": removed, "tipos": list(tipos)}
 
 
 # -----------------------
 # Ops: exports (ZIP)
 # -----------------------
-def _zip_dir(source_dir: Path, out_zip: Path):
-    with zipfile.ZipFile(out_zip, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        for p in source_dir.rglob("*"):
-            if p.is_file():
-                z.write(p, arcname=p.relative_to(source_dir))
+# Cada export escribe en su propia carpeta EJECUCIONES/<fecha-hora>_<op>_<pid>
+# dentro de export_dir y el ZIP lleva solo esa carpeta (antes se comprimía
+# todo lo acumulado en EXPORT_DIR). Retención: --keep-days / --keep-mb.
+# _export_run (carpeta + poda) va después de validar los argumentos: una
+# llamada rechazada no deja carpeta vacía ni borra ejecuciones.
+# El ZIP se escribe con _pylib.zipstream: xlsx sin recomprimir, DEFLATE al
+# nivel de --zip-level y, con --out -, directo a stdout (la respuesta JSON
+# va entonces a stderr).
+EXPORT_RUNS_DIRNAME = "EJECUCIONES"
+# Una ejecución sin esta marca puede estar escribiéndose en otro proceso: la
+# poda solo la borra si lleva _GRACIA_EN_CURSO_S sin tocarse (export caído).
+_MARCA_COMPLETA = ".completa"
+_GRACIA_EN_CURSO_S = 3600
 
 
-def op_export_csv_pack(args):
-    mgr = _make_mgr(args)
+def _zip_abrir(args) -> ZipStream:
+    return ZipStream(args.out, nivel=int(args.zip_level or NIVEL_DEFECTO))
+
+
+# Export incremental (--incremental 1): export_dir/CACHE_INFORMES guarda el
+# último CSV/XLSX de cada informe con su huella (mgr.huellas_informes: datos
+# que lee + versión del código). Si la huella no ha cambiado, el artefacto se
+# enlaza en la ejecución nueva en vez de regenerarlo.
+INFORMES_CACHE_DIRNAME = "CACHE_INFORMES"
+
+
+def _enlazar(origen: Path, destino: Path) -> None:
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copyfile(origen, destino)
+
+
+class _CacheInformes:
+    """
+    Un fichero por informe: <clave>.<huella><ext>. La huella va en el nombre
+    (sin índice aparte), así dos export a la vez no pueden dejar una huella
+    apuntando al fichero de otra.
+    """
+
+    def __init__(self, carpeta: Optional[Path]):
+        self.carpeta = carpeta  # None = desactivada
+        if carpeta is not None:
+            carpeta.mkdir(parents=True, exist_ok=True)
+
+    def _ruta(self, clave: str, huella: str) -> Path:
+        p = Path(clave)
+        return self.carpeta / f"{p.stem}.{huella}{p.suffix}"
+
+    def reutilizar(self, clave: str, huella: Optional[str], destino: Path) -> bool:
+        if self.carpeta is None or not huella:
+            return False
+        try:
+            _enlazar(self._ruta(clave, huella), destino)
+        except FileNotFoundError:
+            # no está, o un guardar() concurrente acaba de podarla: se regenera
+            return False
+        return True
+
+    def guardar(self, clave: str, huella: Optional[str], ruta: Path) -> None:
+        if self.carpeta is None or not huella:
+            return
+        destino = self._ruta(clave, huella)
+        tmp = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+        _enlazar(ruta, tmp)
+        os.replace(tmp, destino)
+        p = Path(clave)
+        for viejo in self.carpeta.glob(f"{p.stem}.*{p.suffix}"):
+            if viejo != destino:
+                viejo.unlink(missing_ok=True)
+
+
+def _huella_excel(huella_csv: Optional[str], hoy: date) -> Optional[str]:
+    # la hoja depende además del código de cli.py y de la fecha (título, reglas por mes)
+    if not huella_csv:
+        return None
+    texto = "|".join((huella_csv, _version_cli(), hoy.isoformat()))
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+_VERSION_CLI: Dict[str, str] = {}
+
+
+def _version_cli() -> str:
+    if not _VERSION_CLI:
+        _VERSION_CLI["v"] = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=8).hexdigest()
+    return _VERSION_CLI["v"]
+
+
+def _exportar_pack(mgr, args, export_dir: Path, zs: ZipStream, hojas: Dict[str, Tuple[str, "_HojaExcel"]]):
+    """
+    CSV de INFORMES_CSV (+ hoja IMPRIMIR de los que están en `hojas`) en la
+    carpeta de la ejecución, cada fichero al ZIP en cuanto está escrito.
+    Devuelve (xlsx por prefijo, claves reutilizadas de la caché).
+    """
+    hoy = date.today()
+    hoy_str = hoy.strftime("%Y-%m-%d")
+    hoy_title = hoy.strftime("%d-%m-%Y")
+
+    incremental = bool(int(args.incremental or 0))
+    cache = _CacheInformes(export_dir.parent.parent / INFORMES_CACHE_DIRNAME if incremental else None)
+    huellas = mgr.huellas_informes() if incremental else {}
+
+    def _al_zip(ruta: Path) -> None:
+        with METRICS.phase("zip"):
+            zs.write_file(ruta.name, ruta)
+
+    # 1) Lo que no ha cambiado se enlaza desde la caché; el resto se genera
+    generados: Dict[str, str] = {}
+    reutilizados: List[str] = []
+    hecho: Dict[str, bool] = {}
+    for spec in INFORMES_CSV:
+        n = spec.nombre
+        piezas = [(f"{n}.csv", huellas.get(n), export_dir / f"{n}_{hoy_str}.csv")]
+        if n in hojas:
+            piezas.append(
+                (f"IMPRIMIR_{n}.xlsx", _huella_excel(huellas.get(n), hoy), export_dir / f"IMPRIMIR_{n}_{hoy_str}.xlsx")
+            )
+        for clave, huella, ruta in piezas:
+            hecho[clave] = cache.reutilizar(clave, huella, ruta)
+            if hecho[clave]:
+                reutilizados.append(clave)
+                _al_zip(ruta)
+                if clave.startswith("IMPRIMIR_"):
+                    generados[hojas[n][0]] = str(ruta)
+    a_generar = [
+        s.nombre
+        for s in INFORMES_CSV
+        if not hecho[f"{s.nombre}.csv"] or (s.nombre in hojas and not hecho[f"IMPRIMIR_{s.nombre}.xlsx"])
+    ]
+    METRICS.count("informes_reutilizados", len(reutilizados))
+    if not a_generar:
+        return generados, reutilizados
+
+    # Las hojas son independientes: con varios procesos cada una va a un worker
+    # en cuanto su informe está listo, y el padre sigue con los CSV del resto
+    workers = int(args.workers) if args.workers else min(len(hojas), os.cpu_count() or 1)
+    pool = None
+    if workers > 1 and hojas:
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(max_workers=workers)
+
+    # 2) Una pasada: cada informe se escribe a CSV (el pack los sigue llevando)
+    # y, si tiene hoja IMPRIMIR, a xlsx desde las mismas filas. Las filas son
+    # un generador: solo se materializan si el informe lleva hoja pendiente,
+    # el resto va fila a fila al CSV
+    pendientes: Dict[str, Any] = {}
+    try:
+        for spec, filas in mgr.generar_informes(a_generar):
+            n = spec.nombre
+            if n in hojas and not hecho[f"IMPRIMIR_{n}.xlsx"]:
+                filas = list(filas)
+            if not hecho[f"{n}.csv"]:
+                ruta_csv = mgr._export_csv(n, filas, list(spec.columnas))
+                if ruta_csv:
+                    _al_zip(Path(ruta_csv))
+                    cache.guardar(f"{n}.csv", huellas.get(n), Path(ruta_csv))
+            if n not in hojas or hecho[f"IMPRIMIR_{n}.xlsx"]:
+                continue
+            prefijo, hoja = hojas[n]
+            xlsx_path = export_dir / f"IMPRIMIR_{n}_{hoy_str}.xlsx"
+            with METRICS.phase("excel:serializar"):
+                datos = _excel_columnas(list(spec.columnas), filas)
+            tarea = (str(xlsx_path), prefijo, list(spec.columnas), datos, f"{hoja.titulo} - {hoy_title}", hoy)
+            if pool is None:
+                METRICS.add(f"excel:{n}", _excel_hoja_proceso(*tarea))
+                _al_zip(xlsx_path)
+                cache.guardar(f"IMPRIMIR_{n}.xlsx", _huella_excel(huellas.get(n), hoy), xlsx_path)
+            else:
+                pendientes[n] = pool.submit(_excel_hoja_proceso, *tarea)
+            METRICS.count("xlsx_rows", len(filas))
+            generados[prefijo] = str(xlsx_path)
+
+        # En el pool, excel:* es el tiempo de cada worker (se solapan entre sí)
+        for n, fut in pendientes.items():
+            with METRICS.phase("excel:espera"):
+                ms = fut.result()
+            METRICS.add(f"excel:{n}", ms)
+            xlsx_path = export_dir / f"IMPRIMIR_{n}_{hoy_str}.xlsx"
+            _al_zip(xlsx_path)
+            cache.guardar(f"IMPRIMIR_{n}.xlsx", _huella_excel(huellas.get(n), hoy), xlsx_path)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return generados, reutilizados
+
+
+def _marcar_completa(run_dir: Path) -> None:
+    """Marca la ejecución como terminada (tras cerrar el ZIP: no entra en él)."""
+    (run_dir / _MARCA_COMPLETA).touch()
+
+
+def _tam_dir(p: Path) -> int:
+    total = 0
+    for f in p.rglob("*"):
+        try:
+            total += f.stat().st_size if f.is_file() else 0
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def _podar_ejecuciones(base: Path, actual: Path, dias: float, max_mb: float) -> List[str]:
+    """
+    Borra ejecuciones de más de `dias` y, si las restantes siguen ocupando
+    más de `max_mb`, las más antiguas. 0 = sin límite.
+    No se tocan la ejecución actual ni las de otros procesos aún en curso
+    (sin marca de completa y modificadas hace menos de _GRACIA_EN_CURSO_S).
+    """
+    ahora = time.time()
+    runs: List[Tuple[float, Path]] = []
+    for p in base.iterdir():
+        if not p.is_dir() or p == actual:
+            continue
+        try:
+            mtime = p.stat().st_mtime
+        except FileNotFoundError:
+            continue  # la ha podado otra ejecución
+        if not (p / _MARCA_COMPLETA).exists() and ahora - mtime < _GRACIA_EN_CURSO_S:
+            continue
+        runs.append((mtime, p))
+    runs.sort()
+    tam = {p: _tam_dir(p) for _, p in runs}
+    total = sum(tam.values())
+    limite = ahora - dias * 86400
+    borradas: List[str] = []
+    for mtime, p in runs:  # de la más antigua a la más reciente
+        caducada = dias > 0 and mtime < limite
+        sobra = max_mb > 0 and total > max_mb * 1024 * 1024
+        if not (caducada or sobra):
+            break
+        shutil.rmtree(p, ignore_errors=True)
+        total -= tam[p]
+        borradas.append(p.name)
+    return borradas
+
+
+def _export_run(mgr, args, op: str) -> Tuple[Path, List[str]]:
+    """Carpeta de esta ejecución (el backend exporta ahí) + ejecuciones podadas."""
     export_dir = (
         Path(args.export_dir)
         if args.export_dir
@@ -1516,184 +2769,264 @@ def op_export_csv_pack(args):
             )
         )
     )
-    export_dir.mkdir(parents=True, exist_ok=True)
+    dias, max_mb = float(args.keep_days or 0), float(args.keep_mb or 0)
+    base = export_dir / EXPORT_RUNS_DIRNAME
+    run_dir = base / f"{_timestamp()}_{op}_{os.getpid()}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    mgr.EXPORT_DIR = str(run_dir)
+    with METRICS.phase("export:retencion"):
+        podadas = _podar_ejecuciones(base, run_dir, dias, max_mb)
+    return run_dir, podadas
 
-    if hasattr(mgr, "_exportar_todos_los_datos"):
-        mgr._exportar_todos_los_datos()
-    else:
-        return _fail("MISSING_BACKEND", "mgr._exportar_todos_los_datos no existe")
 
+def op_export_csv_pack(args):
+    mgr = _make_mgr(args)
+    if not hasattr(mgr, "generar_informes"):
+        return _fail("MISSING_BACKEND", "mgr.generar_informes no existe")
     if not args.out:
         return _fail("MISSING_OUT", "--out requerido")
-    out_zip = Path(args.out)
-    out_zip.parent.mkdir(parents=True, exist_ok=True)
-    _zip_dir(export_dir, out_zip)
+    export_dir, podadas = _export_run(mgr, args, "export_csv_pack")
+
+    with _zip_abrir(args) as zs:
+        _, reutilizados = _exportar_pack(mgr, args, export_dir, zs, {})
+    _marcar_completa(export_dir)
     return _ok(
-        message="EXPORT_CSV_PACK_OK", out=str(out_zip), export_dir=str(export_dir)
+        message="EXPORT_CSV_PACK_OK",
+        out=args.out,
+        export_dir=str(export_dir),
+        reused=reutilizados,
+        pruned=podadas,
     )
 
 
 def op_export_stock_negativo(args):
     mgr = _make_mgr(args)
-    export_dir = (
-        Path(args.export_dir)
-        if args.export_dir
-        else Path(
-            getattr(
-                mgr, "EXPORT_DIR", Path(mgr.ds_inventario.path).parent / "EXPORTAR_CSV"
-            )
-        )
-    )
-    export_dir.mkdir(parents=True, exist_ok=True)
-
-    if hasattr(mgr, "_exportar_stock_negativo"):
-        mgr._exportar_stock_negativo()
-    else:
+    if not hasattr(mgr, "_exportar_stock_negativo"):
         return _fail("MISSING_BACKEND", "mgr._exportar_stock_negativo no existe")
-
     if not args.out:
         return _fail("MISSING_OUT", "--out requerido")
-    out_zip = Path(args.out)
-    out_zip.parent.mkdir(parents=True, exist_ok=True)
-    _zip_dir(export_dir, out_zip)
+    export_dir, podadas = _export_run(mgr, args, "export_stock_negativo")
+
+    mgr._exportar_stock_negativo()
+    with METRICS.phase("zip"), _zip_abrir(args) as zs:
+        zs.write_dir(export_dir)
+    _marcar_completa(export_dir)
     return _ok(
-        message="EXPORT_STOCK_NEG_OK", out=str(out_zip), export_dir=str(export_dir)
+        message="EXPORT_STOCK_NEG_OK",
+        out=args.out,
+        export_dir=str(export_dir),
+        pruned=podadas,
     )
 
 
 def op_export_excel_pack(args):
     mgr = _make_mgr(args)
-    export_dir = (
-        Path(args.export_dir)
-        if args.export_dir
-        else Path(
-            getattr(
-                mgr, "EXPORT_DIR", Path(mgr.ds_inventario.path).parent / "EXPORTAR_CSV"
-            )
-        )
-    )
-    export_dir.mkdir(parents=True, exist_ok=True)
+    if not hasattr(mgr, "generar_informes"):
+        return _fail("MISSING_BACKEND", "mgr.generar_informes no existe")
+    if not args.out:
+        return _fail("MISSING_OUT", "--out requerido")
+    export_dir, podadas = _export_run(mgr, args, "export_excel_pack")
 
-    if hasattr(mgr, "_exportar_todos_los_datos"):
-        mgr._exportar_todos_los_datos()
-    else:
-        return _fail("MISSING_BACKEND", "mgr._exportar_todos_los_datos no existe")
+    hojas = {h.informe: (prefijo, h) for prefijo, h in _EXCEL_PACK.items()}
+    with _zip_abrir(args) as zs:
+        generados, reutilizados = _exportar_pack(mgr, args, export_dir, zs, hojas)
+    _marcar_completa(export_dir)
 
-    hoy_str = datetime.now().strftime("%Y-%m-%d")
-    hoy_title = datetime.now().strftime("%d-%m-%Y")
+    return _ok(
+        message="EXPORT_EXCEL_PACK_OK",
+        out=args.out,
+        generated=[generados[p] for p in sorted(generados)],
+        export_dir=str(export_dir),
+        reused=reutilizados,
+        pruned=podadas,
+    )
 
-    config = {
-        "00": ("stock_actual", ["STOCK", "stock"], "stock"),
-        "03": ("pedidos_pendientes", None, None),
-        "04": ("ordenes_fabricacion", None, None),
-        "05": ("stock_estimado", ["STOCK_ESTIMADO", "stock_estimado"], "estimado"),
-        "06": ("orden_corte_sugerida", None, None),
-    }
 
-    generados: List[str] = []
+# -----------------------
+# Ops: export columnar (Parquet / Arrow IPC para BI)
+# -----------------------
+# Mismas fuentes que el pack pero sin filas TOTAL y con tipos: FECHA date32,
+# cantidades int64 y el texto como diccionario. Los historiales van
+# particionados por mes (hive: entradas/MES=AAAA-MM/part-0.parquet).
+# --format parquet (defecto) | feather. pyarrow es opcional (requirements.txt).
+_COLUMNAR_TABLAS = (
+    ("stock", "stock", False),
+    ("entradas", "entradas", True),
+    ("salidas", "salidas", True),
+    ("pedidos_pendientes", "pedidos", False),
+    ("ordenes_fabricacion", "ordenes", False),
+    ("stock_estimado", "estimado", False),
+)
+_COLUMNAR_ENTEROS = ("CANTIDAD", "STOCK", "STOCK_ESTIMADO")
+
+
+def _columnar_entero(v) -> Optional[int]:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        try:
+            return int(float(v))
+        except (TypeError, ValueError):
+            return None
 
-    title_map = {
-        "00": "01 - STOCK ACTUAL",
-        "03": "02 - PEDIDOS PENDIENTES",
-        "04": "03 - ORDENES FABRICACION",
-        "05": "04 - STOCK ESTIMADO",
-        "06": "05 - ORDEN CORTE SUGERIDA",
-    }
 
-    for prefijo, (base_name, qty_candidates, _) in config.items():
-        patrones = [
-            f"{prefijo}_{base_name}_*.csv",
-            f"*{prefijo}*{base_name}*.csv",
-        ]
-        csv_path: Optional[Path] = None
-        for pat in patrones:
-            matches = sorted(export_dir.glob(pat))
-            if matches:
-                csv_path = matches[-1]
-                break
-
-        if not csv_path or not csv_path.exists():
-            continue
+def _columnar_tabla(pa, columnas: Tuple[str, ...], filas: List[Dict], fechas: Dict[Any, Optional[date]]):
+    arrays = []
+    for c in columnas:
+        vals = [r.get(c) for r in filas]
+        if c == "FECHA":
+            arrays.append(pa.array([fechas[v] for v in vals], pa.date32()))
+        elif c in _COLUMNAR_ENTEROS:
+            arrays.append(pa.array([_columnar_entero(v) for v in vals], pa.int64()))
+        else:
+            texto = pa.array([None if v is None else str(v) for v in vals], pa.string())
+            arrays.append(texto.dictionary_encode())
+    return pa.Table.from_arrays(arrays, names=list(columnas))
 
-        df = pd.read_csv(csv_path, sep=";", dtype=str)
-        xlsx_name = f"IMPRIMIR_{prefijo}_{base_name}_{hoy_str}.xlsx"
-        xlsx_path = export_dir / xlsx_name
 
-        with pd.ExcelWriter(xlsx_path, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Hoja1")
-            ws = writer.sheets["Hoja1"]
+def op_export_columnar(args):
+    # --format es compartido con los listados: su defecto "rows" equivale a parquet
+    fmt = (args.format or "").strip().lower()
+    fmt = "parquet" if fmt in ("", "rows") else fmt
+    if fmt not in ("parquet", "feather"):
+        return _fail("BAD_INPUT", f"formato no soportado: {fmt} (parquet | feather)")
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        return _fail("MISSING_DEPENDENCY", f"pyarrow no disponible: {e}")
 
-            title = f"{title_map.get(prefijo, base_name.upper())} - {hoy_title}"
-            header_row = _excel_insert_title_row(ws, title, blank_row=True)
-            data_start = header_row + 1
+    ext = ".parquet" if fmt == "parquet" else ".feather"
 
-            if prefijo in ("00", "05"):
-                _excel_color_stock_ranges(
-                    ws, df, qty_col_candidates=qty_candidates, data_start_row=data_start
-                )
-            elif prefijo == "03":
-                _excel_color_pend_by_month(
-                    ws, df, date_col="FECHA", data_start_row=data_start
-                )
-            elif prefijo == "04":
-                _excel_color_by_column_palette(
-                    ws, df, col="FECHA", data_start_row=data_start
-                )
-            elif prefijo == "06":
-                _excel_color_by_column_palette(
-                    ws, df, col="MODELO", data_start_row=data_start
-                )
+    mgr = _make_mgr(args)
+    export_dir, podadas = _export_run(mgr, args, "export_columnar")
+    columnas = {s.fuente: s.columnas for s in reversed(INFORMES_CSV)}
 
-            if prefijo in ("00", "03", "04", "05"):
-                _excel_highlight_totals_by_talla(
-                    ws, df, talla_col="TALLA", data_start_row=data_start
-                )
+    def _escribir(tabla, ruta: Path) -> None:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        if fmt == "parquet":
+            pq.write_table(tabla, ruta, compression="zstd")
+        else:
+            feather.write_feather(tabla, ruta, compression="zstd")
+
+    tablas: Dict[str, int] = {}
+    fechas: Dict[Any, Optional[date]] = {}
+    for nombre, fuente, por_mes in _COLUMNAR_TABLAS:
+        with METRICS.phase(f"fuente:{fuente}"):
+            filas = list(mgr._fuente_informe(fuente).filas)
+        with METRICS.phase(f"columnar:{nombre}"):
+            if "FECHA" in columnas[fuente]:
+                for v in {r.get("FECHA") for r in filas} - fechas.keys():
+                    iso = parse_fecha_excel(v)
+                    fechas[v] = date.fromisoformat(iso) if iso else None
+            if not por_mes:
+                _escribir(_columnar_tabla(pa, columnas[fuente], filas, fechas), export_dir / f"{nombre}{ext}")
+            else:
+                meses: Dict[str, List[Dict]] = defaultdict(list)
+                for r in filas:
+                    f = fechas[r.get("FECHA")]
+                    meses[f.strftime("%Y-%m") if f else "__HIVE_DEFAULT_PARTITION__"].append(r)
+                for mes in sorted(meses):
+                    tabla = _columnar_tabla(pa, columnas[fuente], meses[mes], fechas)
+                    _escribir(tabla, export_dir / nombre / f"MES={mes}" / f"part-0{ext}")
+        METRICS.count("columnar_rows", len(filas))
+        tablas[nombre] = len(filas)
+
+    if args.out:
+        with METRICS.phase("zip"), _zip_abrir(args) as zs:
+            zs.write_dir(export_dir)
+    _marcar_completa(export_dir)
+    return _ok(
+        message="EXPORT_COLUMNAR_OK",
+        format=fmt,
+        out=args.out or None,
+        export_dir=str(export_dir),
+        tables=tablas,
+        pruned=podadas,
+    )
 
-            highlight_last = prefijo in ("00", "03", "04", "05")
-            _excel_yellow_header_and_total(
-                ws, header_row=header_row, highlight_last=highlight_last
-            )
-            _excel_add_borders(ws, min_row=header_row, min_col=1)
-
-            if prefijo in ("03", "04"):
-                _excel_outline_date_blocks(
-                    ws,
-                    header_row=header_row,
-                    model_col="MODELO",
-                    date_col="FECHA",
-                    talla_col="TALLA",
-                )
-            if prefijo == "06":
-                _excel_outline_model_blocks(ws, header_row=header_row, model_col="MODELO")
-
-            if prefijo == "00":
-                _excel_set_right_align_cols(ws, header_row, ["TALLA", "STOCK"])
-            elif prefijo == "03":
-                _excel_set_right_align_cols(ws, header_row, ["TALLA", "CANTIDAD"])
-            elif prefijo == "04":
-                _excel_set_right_align_cols(ws, header_row, ["TALLA", "CANTIDAD"])
-            elif prefijo == "05":
-                _excel_set_right_align_cols(
-                    ws, header_row, ["TALLA", "STOCK_ESTIMADO"]
-                )
 
-            _excel_autofit_columns(ws, header_row)
-            _excel_set_freeze_panes(ws, header_row)
+# -----------------------
+# Ops: métricas (agregado del --metrics-log)
+# -----------------------
+def op_metrics_report(args):
+    """
+    Agrega el log NDJSON de --metrics-log en percentiles por op y fase.
+    """
+    path = (args.metrics_log or "").strip()
+    if not path:
+        return _fail("MISSING_PATH", "--metrics-log (o GLOBALIA_METRICS_LOG) requerido")
+    if not os.path.exists(path):
+        return _fail("NOT_FOUND", path)
+
+    series: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue
+            op = rec.get("op", "")
+            if args.op_filter and op != args.op_filter:
+                continue
+            series[(op, "total")].append(float(rec.get("total_ms") or 0))
+            for phase, ms in (rec.get("phases_ms") or {}).items():
+                series[(op, phase)].append(float(ms or 0))
+            if rec.get("peak_rss_mb") is not None:
+                series[(op, "peak_rss_mb")].append(float(rec["peak_rss_mb"]))
 
-        generados.append(str(xlsx_path))
+    rows = []
+    for (op, phase), vals in sorted(series.items()):
+        vals.sort()
+        rows.append(
+            {
+                "OP": op,
+                "FASE": phase,
+                "N": len(vals),
+                "P50": _percentile(vals, 50),
+                "P90": _percentile(vals, 90),
+                "P99": _percentile(vals, 99),
+                "MAX": round(vals[-1], 3),
+            }
+        )
+    cols = ["OP", "FASE", "N", "P50", "P90", "P99", "MAX"]
+    return _ok(columns=cols, rows=rows)
 
-    if not args.out:
-        return _fail("MISSING_OUT", "--out requerido")
-    out_zip = Path(args.out)
-    out_zip.parent.mkdir(parents=True, exist_ok=True)
 
-    _zip_dir(export_dir, out_zip)
-    return _ok(
-        message="EXPORT_EXCEL_PACK_OK",
-        out=str(out_zip),
-        generated=generados,
-        export_dir=str(export_dir),
+# -----------------------
+# Ops: perfilado (--profile)
+# -----------------------
+def _profile_dir(args) -> Path:
+    # Los informes van junto a la carpeta de exportación (hermana: PROFILES/)
+    export_dir = (
+        Path(args.export_dir)
+        if args.export_dir
+        else Path(args.inv).resolve().parent / "EXPORTAR_CSV"
     )
+    return export_dir.resolve().parent / PROFILE_DIRNAME
+
+
+def op_profile_report(args):
+    """
+    Top-N funciones de un .pstats (--profile-path; por defecto el más reciente).
+    --limit: nº de funciones (30). --sort: cumulative (defecto), tottime, ncalls.
+    """
+    path = (args.profile_path or "").strip()
+    if not path:
+        prof_dir = _profile_dir(args)
+        found = sorted(prof_dir.glob("*.pstats"), key=lambda p: p.stat().st_mtime)
+        if not found:
+            return _fail("NOT_FOUND", f"sin .pstats en {prof_dir}")
+        path = str(found[-1])
+    if not os.path.exists(path):
+        return _fail("NOT_FOUND", path)
+
+    top = int(args.limit or 30)
+    sort = (args.sort or "cumulative").strip().lower()
+    rows = summarize_pstats(Path(path), top=top, sort=sort)
+    cols = ["FUNCION", "NCALLS", "TOTTIME", "CUMTIME"]
+    return _ok(path=path, sort=sort, columns=cols, rows=rows)
 
 
 # -----------------------
@@ -1732,6 +3065,8 @@ OPS = {
     # importaciones
     "import_albaranes": op_import_albaranes,
     "import_pedidos": op_import_pedidos,
+    "import_dir": op_import_dir,
+    "import_ediwin": op_import_ediwin,
     # backups
     "backup_create": op_backup_create,
     "backup_list": op_backup_list,
@@ -1740,8 +3075,12 @@ OPS = {
     "export_csv_pack": op_export_csv_pack,
     "export_stock_negativo": op_export_stock_negativo,
     "export_excel_pack": op_export_excel_pack,
+    "export_columnar": op_export_columnar,
     "list_modelos": op_list_modelos,
     "list_tallas": op_list_tallas,
+    # métricas / perfilado
+    "metrics_report": op_metrics_report,
+    "profile_report": op_profile_report,
 }
 
 
@@ -1775,8 +3114,13 @@ def build_parser() -> argparse.ArgumentParser:
         default=_read_env_path("GLOBALIA_BACKUP_DIR", ""),
     )
 
-    # out zip
+    # out zip ("-" = stdout)
     p.add_argument("--out", default="")
+    p.add_argument("--incremental", default=_read_env_path("GLOBALIA_EXPORT_INCREMENTAL", "1"))  # 0/1
+    p.add_argument("--zip-level", dest="zip_level", default=_read_env_path("GLOBALIA_ZIP_LEVEL", ""))  # 0-9
+    # retención de EJECUCIONES/ (0 = sin límite)
+    p.add_argument("--keep-days", dest="keep_days", default=_read_env_path("GLOBALIA_EXPORT_KEEP_DAYS", "7"))
+    p.add_argument("--keep-mb", dest="keep_mb", default=_read_env_path("GLOBALIA_EXPORT_KEEP_MB", "500"))
 
     # gen params
     p.add_argument("--modelo", default="")
@@ -1795,6 +3139,14 @@ def build_parser() -> argparse.ArgumentParser:
     p.add_argument("--numero-pedido", dest="numero_pedido", default="")
     p.add_argument("--payload-json", dest="payload_json", default="")
 
+    # listados (filtros/orden/paginación)
+    p.add_argument("--filter", default="")  # JSON
+    p.add_argument("--sort", default="")
+    p.add_argument("--offset", default=None)
+    p.add_argument("--limit", default=None)
+    p.add_argument("--cursor", default="")
+    p.add_argument("--format", default="rows")  # rows/columnar/ndjson; export_columnar: parquet/feather
+
     # saneos
     p.add_argument("--only-zero", dest="only_zero", default="1")
 
@@ -1802,11 +3154,35 @@ def build_parser() -> argparse.ArgumentParser:
     p.add_argument("--excel-path", dest="excel_path", default="")
     p.add_argument("--modo", default="d")  # d/i/t
     p.add_argument("--simular", default="0")  # 0/1
-    p.add_argument("--skip", default=None)
+    p.add_argument("--skip", default=None)  # vacío = cabecera autodetectada
+    p.add_argument("--force-import", dest="force_import", default="0")  # 0/1
+    p.add_argument("--excel-dir", dest="excel_dir", default="")  # import_dir
+    p.add_argument("--workers", default="")  # import_dir / export_excel_pack: procesos
+    p.add_argument("--chunk-rows", dest="chunk_rows", default="")  # filas por trozo
+    p.add_argument("--pdf-path", dest="pdf_path", default="")  # import_ediwin
+    p.add_argument("--tipo", default="")  # import_ediwin: ECI/EUROFIEL
+    p.add_argument(
+        "--import-registry",
+        dest="import_registry",
+        default=_read_env_path("GLOBALIA_IMPORT_REGISTRY", ""),
+    )
 
     # backups
     p.add_argument("--name", default="")
 
+    # métricas
+    p.add_argument("--metrics", default="0")  # 0/1 -> _metrics en la respuesta
+    p.add_argument("--op-filter", dest="op_filter", default="")  # metrics_report: solo ese op
+    p.add_argument(
+        "--metrics-log",
+        dest="metrics_log",
+        default=_read_env_path("GLOBALIA_METRICS_LOG", ""),
+    )
+
+    # perfilado
+    p.add_argument("--profile", default="")  # cprofile/tracemalloc
+    p.add_argument("--profile-path", dest="profile_path", default="")
+
     # model info
     p.add_argument("--descripcion", default="")
     p.add_argument("--color", default="")
@@ -1822,10 +3198,42 @@ def main(argv=None) -> int:
     fn = OPS.get(op)
     if not fn:
         return _fail("UNKNOWN_OP", op)
+
+    metrics_log = (args.metrics_log or "").strip() if op != "metrics_report" else ""
+    try:
+        inline = bool(int(args.metrics or 0))
+    except ValueError:
+        return _fail("BAD_INPUT", "--metrics debe ser 0 o 1")
+    nivel_zip = str(args.zip_level or "").strip()
+    if nivel_zip and not (nivel_zip.isdigit() and int(nivel_zip) <= 9):
+        # antes de que ningún export cree su carpeta de ejecución
+        return _fail("BAD_INPUT", "--zip-level debe ir de 0 a 9")
+    METRICS.enabled = inline or bool(metrics_log)
+    _RUN.update(op=op, inline=inline, t_op=time.perf_counter())
+
+    mode = (args.profile or "").strip().lower()
+    if mode and mode not in PROFILE_MODES:
+        return _fail("BAD_INPUT", f"--profile debe ser uno de {PROFILE_MODES}")
+    prof_ctx = contextlib.nullcontext()
+    if mode:
+        out = profile_path(_profile_dir(args), op, mode)
+        _RUN["extra"]["_profile"] = {"mode": mode, "path": str(out)}
+        prof_ctx = profiled(mode, out)
+
+    # --out -: el ZIP ocupa stdout; logs del backend y respuesta JSON a stderr
+    out_ctx = contextlib.nullcontext()
+    if (args.out or "").strip() == "-":
+        out_ctx = contextlib.redirect_stdout(sys.stderr)
+
     try:
-        return int(fn(args) or 0)
+        with prof_ctx, out_ctx:
+            rc = int(fn(args) or 0)
     except Exception as e:
-        return _fail("EXCEPTION", str(e))
+        with out_ctx:
+            rc = _fail("EXCEPTION", str(e))
+    if metrics_log:
+        _append_metrics_log(metrics_log, rc)
+    return rc
 
 
 if __name__ == "__main__":
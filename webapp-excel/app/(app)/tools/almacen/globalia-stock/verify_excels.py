@@ -2,137 +2,313 @@
 from __future__ import annotations
 
 import argparse
+import os
+import posixpath
 import subprocess
 import sys
+import xml.etree.ElementTree as ET
+import zipfile
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 from openpyxl import load_workbook
+from openpyxl.cell.read_only import ReadOnlyCell
+from openpyxl.utils import range_boundaries
 
 
+# "reglas": formato condicional esperado (los colores ya no van celda a celda)
+# "paleta": celdas de datos con estilo con nombre "IMPRIMIR paleta N"
+# "thick": contornos gruesos por bloque; "negativos": solo STOCK_ESTIMADO < 0
 REPORTS = {
-    "00": {"name": "stock_actual", "align_right": ["TALLA", "STOCK"]},
-    "03": {"name": "pedidos_pendientes", "align_right": ["TALLA", "CANTIDAD"]},
-    "04": {"name": "ordenes_fabricacion", "align_right": ["TALLA", "CANTIDAD"]},
-    "05": {"name": "stock_estimado", "align_right": ["TALLA", "STOCK_ESTIMADO"]},
-    "06": {"name": "orden_corte_sugerida", "align_right": []},
+    "00": {"name": "stock_actual", "align_right": ["TALLA", "STOCK"], "reglas": ["totales", "rangos"]},
+    "03": {
+        "name": "pedidos_pendientes",
+        "align_right": ["TALLA", "CANTIDAD"],
+        "reglas": ["totales", "meses"],
+        "thick": True,
+    },
+    "04": {
+        "name": "ordenes_fabricacion",
+        "align_right": ["TALLA", "CANTIDAD"],
+        "reglas": ["totales"],
+        "paleta": True,
+        "thick": True,
+    },
+    "05": {"name": "stock_estimado", "align_right": ["TALLA", "STOCK_ESTIMADO"], "reglas": ["totales", "rangos"]},
+    "06": {
+        "name": "orden_corte_sugerida",
+        "align_right": [],
+        "reglas": [],
+        "paleta": True,
+        "thick": True,
+        "negativos": True,
+    },
+}
+
+# Cómo se reconoce cada tipo de regla por su fórmula y cuántas hacen falta
+_REGLAS = {
+    "totales": ("TOTAL MODELO", 1),
+    "rangos": ("VALUE(", 3),
+    "meses": ("DATE(", 12),
 }
 
 
 def _latest_file(folder: Path, prefix: str) -> Optional[Path]:
-    matches = sorted(folder.glob(f"IMPRIMIR_{prefix}_*.xlsx"))
+    # El CLI exporta en export_dir/EJECUCIONES/<fecha-hora>_<op>_<pid>/
+    # (cli.EXPORT_RUNS_DIRNAME); solo se mira ahí: CACHE_INFORMES guarda copias
+    # del export incremental. Manda la ejecución más reciente por nombre: un
+    # informe reutilizado es un enlace al de otra ejecución y conserva su mtime.
+    patron = f"IMPRIMIR_{prefix}_*.xlsx"
+    runs = folder / "EJECUCIONES"
+    matches = sorted(runs.glob(f"*/{patron}")) if runs.is_dir() else []
+    if matches:
+        return max(matches, key=lambda p: (p.parent.name[:19], p.stat().st_mtime))
+    # carpetas planas (referencias, exports antiguos)
+    matches = sorted(folder.glob(patron))
     if not matches:
         return None
     return max(matches, key=lambda p: p.stat().st_mtime)
 
 
-def _find_header_row(ws, header_name: str = "MODELO", max_scan: int = 5) -> Optional[int]:
-    header_name = header_name.strip().upper()
-    for row in range(1, max_scan + 1):
-        for col in range(1, ws.max_column + 1):
-            val = ws.cell(row=row, column=col).value
-            if val is None:
-                continue
-            if str(val).strip().upper() == header_name:
-                return row
-    return None
-
-
-def _header_map(ws, header_row: int) -> Dict[str, int]:
-    mapping = {}
-    for col in range(1, ws.max_column + 1):
-        val = ws.cell(row=header_row, column=col).value
-        if val is None:
-            continue
-        mapping[str(val).strip().upper()] = col
-    return mapping
-
-
-def _has_title_merge(ws) -> bool:
-    for rng in ws.merged_cells.ranges:
-        if rng.min_row == 1 and rng.max_row == 1 and rng.min_col == 1:
-            return True
-    return False
-
-
-def _right_aligned_ratio(ws, header_row: int, col_idx: int) -> Tuple[int, int]:
-    ok = 0
-    total = 0
-    for row in range(header_row + 1, ws.max_row + 1):
-        cell = ws.cell(row=row, column=col_idx)
-        if cell.value is None:
-            continue
-        total += 1
-        if cell.alignment and cell.alignment.horizontal == "right":
-            ok += 1
-    return ok, total
-
-
-def _all_negative(ws, header_row: int, col_idx: int) -> bool:
-    for row in range(header_row + 1, ws.max_row + 1):
-        cell = ws.cell(row=row, column=col_idx)
-        if cell.value is None:
-            continue
-        try:
-            val = float(str(cell.value).replace(",", "."))
-        except Exception:
+# Lectura: las celdas (valores, alineación, bordes, estilo con nombre) con
+# openpyxl read_only, fila a fila; cada fila alimenta a la vez todas las
+# comprobaciones y los estilos se resuelven una vez por estilo, no por celda.
+# read_only no expone mergeCells ni conditionalFormatting: van tras sheetData
+# en el XML de la hoja y se recogen aparte (_fusiones_y_reglas) parseando la
+# hoja sin el contenido de sheetData, que se salta sin parsear.
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_LADOS = ("left", "right", "top", "bottom")
+
+
+@dataclass
+class _Hoja:
+    max_row: int = 0
+    max_column: int = 0
+    header_row: Optional[int] = None
+    mapping: Dict[str, int] = field(default_factory=dict)
+    title_merge: bool = False
+    rules: List[Tuple[str, int, int]] = field(default_factory=list)  # (fórmula, fila ini, fila fin)
+    align: Dict[str, List[int]] = field(default_factory=dict)  # columna -> [ok, total]
+    no_negativo: bool = False
+    thick: bool = False
+    paleta: bool = False
+    filas_vistas: int = 0  # filas de datos inspeccionadas (todas salvo --sample)
+
+
+def _relaciones(z: zipfile.ZipFile, parte: str) -> Dict[str, str]:
+    """Id -> ruta en el zip de las relaciones de `parte` ("" = el paquete)."""
+    base, nombre = posixpath.split(parte)
+    rels = posixpath.join(base, "_rels", f"{nombre}.rels")
+    if rels not in z.namelist():
+        return {}
+    out = {}
+    for r in ET.fromstring(z.read(rels)).iter(f"{_PKG_REL}Relationship"):
+        target = r.get("Target", "")
+        ruta = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+        out[r.get("Id")] = ruta
+    return out
+
+
+def _sin_sheetdata(src, trozo: int = 1 << 20) -> bytes:
+    """El XML de la hoja con sheetData vacío: las filas se descomprimen pero no se parsean."""
+    abre, cierra = b"<sheetData", b"</sheetData>"
+    cabeza = b""
+    while abre not in cabeza:
+        leido = src.read(trozo)
+        if not leido:
+            return cabeza
+        cabeza += leido
+    i = cabeza.index(abre)
+    cabeza, resto = cabeza[:i], cabeza[i:]
+    if resto.startswith(b"<sheetData/>"):
+        return cabeza + resto + src.read()
+    while True:
+        j = resto.find(cierra)
+        if j >= 0:
+            return cabeza + b"<sheetData/>" + resto[j + len(cierra):] + src.read()
+        leido = src.read(trozo)
+        if not leido:
+            return cabeza + resto  # XML truncado: que falle el parser
+        resto = resto[-len(cierra):] + leido
+
+
+def _fusiones_y_reglas(path: Path, indice_hoja: int, h: _Hoja) -> None:
+    """Título mergeado y reglas de formato condicional de la hoja `indice_hoja`."""
+    with zipfile.ZipFile(path) as z:
+        libro = next(r for r in _relaciones(z, "").values() if r.endswith("workbook.xml"))
+        hojas = [e.get(f"{_REL_NS}id") for e in ET.fromstring(z.read(libro)).iter(f"{_NS}sheet")]
+        with z.open(_relaciones(z, libro)[hojas[indice_hoja]]) as src:
+            raiz = ET.fromstring(_sin_sheetdata(src))
+    for el in raiz.iter(f"{_NS}mergeCell"):
+        min_col, min_row, _, max_row = range_boundaries(el.get("ref"))
+        if min_row == 1 and max_row == 1 and min_col == 1:
+            h.title_merge = True
+    for el in raiz.iter(f"{_NS}conditionalFormatting"):
+        formulas = [
+            " ".join(f.text or "" for f in rule.iter(f"{_NS}formula"))
+            for rule in el.iter(f"{_NS}cfRule")
+        ]
+        for rango in (el.get("sqref") or "").split():
+            _, lo, _, hi = range_boundaries(rango)
+            h.rules.extend((f, lo, hi) for f in formulas)
+
+
+def _dimensiones(path: Path) -> Tuple[int, int]:
+    """(filas, columnas) de la hoja activa, sin mirar estilos."""
+    wb = load_workbook(path, read_only=True)
+    try:
+        ws = wb.active
+        ws.reset_dimensions()
+        filas = columnas = 0
+        # values_only: cada fila llega hasta su última celda escrita
+        for filas, valores in enumerate(ws.iter_rows(values_only=True), start=1):
+            columnas = max(columnas, len(valores))
+        return filas, columnas
+    finally:
+        wb.close()
+
+
+def _leer_hoja(path: Path, meta: Dict, muestra: Optional[int]) -> _Hoja:
+    """Una pasada por las celdas de la hoja activa; `muestra` limita las filas de datos inspeccionadas."""
+    h = _Hoja()
+    wb = load_workbook(path, read_only=True)
+    try:
+        ws = wb.active
+        ws.reset_dimensions()  # max_row / max_column: los de las filas que hay
+        nombres = wb.named_styles
+        estilos: Dict[int, Tuple[bool, bool, bool]] = {}
+
+        def _estilo(c) -> Tuple[bool, bool, bool]:
+            """(alineado a la derecha, algún borde thick, estilo 'IMPRIMIR paleta N')."""
+            sa = c.style_array
+            try:
+                return estilos[id(sa)]
+            except KeyError:
+                borde = c.border
+                xf = sa.xfId
+                e = estilos[id(sa)] = (
+                    c.alignment.horizontal == "right",
+                    any(getattr(getattr(borde, lado), "style", None) == "thick" for lado in _LADOS),
+                    xf < len(nombres) and nombres[xf].startswith("IMPRIMIR paleta"),
+                )
+                return e
+
+        align_cols = meta.get("align_right", ("TALLA", "STOCK", "CANTIDAD", "STOCK_ESTIMADO"))
+        quiere_neg = bool(meta.get("negativos"))
+        idx_align: Dict[int, List[int]] = {}
+        idx_neg = 0
+        for fila, celdas in enumerate(ws.iter_rows(), start=1):
+            h.max_row = fila
+            celdas = [c for c in celdas if isinstance(c, ReadOnlyCell)]  # sin el relleno de huecos
+            if celdas:
+                h.max_column = max(h.max_column, celdas[-1].column)
+            if h.header_row is None:
+                if fila <= 5:
+                    valores = {c.column: c.value for c in celdas if isinstance(c.value, str)}
+                    if any(v.strip().upper() == "MODELO" for v in valores.values()):
+                        h.header_row = fila
+                        h.mapping = {v.strip().upper(): ci for ci, v in valores.items()}
+                        for n in align_cols:
+                            if n in h.mapping:
+                                idx_align[h.mapping[n]] = h.align.setdefault(n, [0, 0])
+                        if quiere_neg:
+                            idx_neg = h.mapping.get("STOCK_ESTIMADO", 0)
+                for c in celdas:
+                    h.thick = h.thick or _estilo(c)[1]
+            elif muestra is None or h.filas_vistas < muestra:
+                h.filas_vistas += 1
+                for c in celdas:
+                    right, thick, paleta = _estilo(c)
+                    h.thick = h.thick or thick
+                    ci = c.column
+                    if ci == 1 and paleta:
+                        h.paleta = True
+                    if ci in idx_align or ci == idx_neg:
+                        v = c.value
+                        if v is None:
+                            continue
+                        if ci in idx_align:
+                            cuenta = idx_align[ci]
+                            cuenta[1] += 1
+                            cuenta[0] += right
+                        if ci == idx_neg:
+                            try:
+                                h.no_negativo = h.no_negativo or float(str(v).replace(",", ".")) >= 0
+                            except ValueError:
+                                pass
+        indice_hoja = wb.worksheets.index(ws)
+    finally:
+        wb.close()
+    _fusiones_y_reglas(path, indice_hoja, h)
+    return h
+
+
+def _check_rules(h: _Hoja, expected: List[str]) -> List[str]:
+    issues: List[str] = []
+    if h.max_row <= h.header_row:
+        return issues  # sin filas de datos no hay reglas que aplicar
+    for kind in expected:
+        marker, minimo = _REGLAS[kind]
+        found = [r for r in h.rules if marker in r[0]]
+        if len(found) < minimo:
+            issues.append(f"Formato condicional '{kind}': {len(found)} reglas (mínimo {minimo}).")
             continue
-        if val >= 0:
-            return False
-    return True
-
-
-def _has_thick_borders(ws) -> bool:
-    for row in range(1, ws.max_row + 1):
-        for col in range(1, ws.max_column + 1):
-            b = ws.cell(row=row, column=col).border
-            for side in (b.left, b.right, b.top, b.bottom):
-                if side and side.style == "thick":
-                    return True
-    return False
+        cubiertas = all(
+            lo <= h.header_row + 1 and hi >= h.max_row for _, lo, hi in found
+        )
+        if not cubiertas:
+            issues.append(f"Formato condicional '{kind}' no cubre todas las filas de datos.")
+    return issues
 
 
-def _validate_file(path: Path, ref_path: Optional[Path] = None) -> List[str]:
+def _validate_file(
+    path: Path,
+    ref_path: Optional[Path] = None,
+    meta: Optional[Dict] = None,
+    muestra: Optional[int] = None,
+) -> List[str]:
     issues: List[str] = []
-    wb = load_workbook(path)
-    ws = wb.active
+    meta = meta or {}
+    h = _leer_hoja(path, meta, muestra)
 
-    header_row = _find_header_row(ws)
-    if not header_row:
+    if not h.header_row:
         issues.append("No se encontró la fila de cabecera (MODELO).")
         return issues
 
-    if not _has_title_merge(ws):
+    if not h.title_merge:
         issues.append("No se detectó fila de título mergeada en la fila 1.")
 
     if ref_path and ref_path.exists():
-        ref_wb = load_workbook(ref_path)
-        ref_ws = ref_wb.active
-        if ws.max_row != ref_ws.max_row:
+        # de la referencia solo cuentan las dimensiones
+        ref_rows, ref_cols = _dimensiones(ref_path)
+        if h.max_row != ref_rows:
             issues.append(
-                f"Filas distintas vs referencia: {ws.max_row} vs {ref_ws.max_row}"
+                f"Filas distintas vs referencia: {h.max_row} vs {ref_rows}"
             )
-        if ws.max_column != ref_ws.max_column:
+        if h.max_column != ref_cols:
             issues.append(
-                f"Columnas distintas vs referencia: {ws.max_column} vs {ref_ws.max_column}"
+                f"Columnas distintas vs referencia: {h.max_column} vs {ref_cols}"
             )
 
-    mapping = _header_map(ws, header_row)
-    for name in ("TALLA", "STOCK", "CANTIDAD", "STOCK_ESTIMADO"):
-        if name in mapping:
-            ok, total = _right_aligned_ratio(ws, header_row, mapping[name])
-            if total and ok < total:
-                issues.append(
-                    f"Alineación derecha incompleta en {name}: {ok}/{total}."
-                )
+    for name, (ok, total) in h.align.items():
+        if total and ok < total:
+            issues.append(
+                f"Alineación derecha incompleta en {name}: {ok}/{total}."
+            )
 
-    if "STOCK_ESTIMADO" in mapping:
-        if not _all_negative(ws, header_row, mapping["STOCK_ESTIMADO"]):
-            issues.append("Hay valores no negativos en STOCK_ESTIMADO.")
+    if h.no_negativo:
+        issues.append("Hay valores no negativos en STOCK_ESTIMADO.")
 
-    if not _has_thick_borders(ws):
+    if meta.get("thick") and h.max_row > h.header_row and not h.thick:
         issues.append("No se detectaron bordes thick en la hoja.")
 
+    issues += _check_rules(h, meta.get("reglas", []))
+    if meta.get("paleta") and h.max_row > h.header_row and not h.paleta:
+        issues.append("No se detectaron estilos de paleta (IMPRIMIR paleta N).")
+
     return issues
 
 
@@ -147,6 +323,12 @@ def main() -> int:
     parser.add_argument("--talleres", default="")
     parser.add_argument("--clientes", default="")
     parser.add_argument("--backup-dir", default="")
+    # --sample N: solo las N primeras filas de datos de cada hoja para los
+    # checks por celda (alineación, negativos, thick, paleta); filas,
+    # columnas, título y formato condicional se comprueban siempre enteros
+    parser.add_argument("--sample", type=int, default=0, help="filas de datos por hoja (0 = todas)")
+    # Las hojas se validan en paralelo (procesos); por defecto una por CPU
+    parser.add_argument("--workers", type=int, default=0)
     args = parser.parse_args()
 
     export_dir = Path(args.export_dir)
@@ -178,7 +360,9 @@ def main() -> int:
         subprocess.run(cmd, check=True)
 
     ref_dir = Path(args.ref_dir) if args.ref_dir else None
+    muestra = args.sample if args.sample > 0 else None
     exit_code = 0
+    tareas: Dict[str, Tuple[Path, Optional[Path], Dict]] = {}
     for prefix, meta in REPORTS.items():
         out_file = _latest_file(export_dir, prefix)
         if not out_file:
@@ -186,7 +370,22 @@ def main() -> int:
             exit_code = 1
             continue
         ref_file = _latest_file(ref_dir, prefix) if ref_dir else None
-        issues = _validate_file(out_file, ref_file)
+        tareas[prefix] = (out_file, ref_file, meta)
+
+    workers = args.workers or min(len(tareas), os.cpu_count() or 1)
+    if workers > 1 and len(tareas) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = {p: pool.submit(_validate_file, *t, muestra) for p, t in tareas.items()}
+            resultados = {p: f.result() for p, f in futuros.items()}
+    else:
+        resultados = {p: _validate_file(*t, muestra) for p, t in tareas.items()}
+
+    if muestra:
+        print(f"[INFO] Modo muestra: {muestra} filas de datos por hoja en los checks por celda")
+    for prefix, (out_file, _, _) in tareas.items():
+        issues = resultados[prefix]
         if issues:
             exit_code = 1
             print(f"[FAIL] {out_file.name}")
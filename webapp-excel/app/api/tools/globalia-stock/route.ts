@@ -28,11 +28,16 @@ type CliResultErr = { ok: false; error: string; detail?: string };
 type CliResult = CliResultOk | CliResultErr;
 
 function isExportOp(op: string) {
-  return op === "export_csv_pack" || op === "export_excel_pack" || op === "export_stock_negativo";
+  return (
+    op === "export_csv_pack" ||
+    op === "export_excel_pack" ||
+    op === "export_stock_negativo" ||
+    op === "export_columnar"
+  );
 }
 
 function isImportOp(op: string) {
-  return op === "import_albaranes" || op === "import_pedidos";
+  return op === "import_albaranes" || op === "import_pedidos" || op === "import_ediwin";
 }
 
 function safeStr(v: unknown) {
@@ -339,6 +344,10 @@ async function runPythonCli(opts: {
     ["clientes", "--clientes"],
     ["exportDir", "--export-dir"],
     ["backupDir", "--backup-dir"],
+    ["keepDays", "--keep-days"],
+    ["keepMb", "--keep-mb"],
+    ["zipLevel", "--zip-level"],
+    ["incremental", "--incremental"],
 
     ["modelo", "--modelo"],
     ["talla", "--talla"],
@@ -355,14 +364,31 @@ async function runPythonCli(opts: {
     ["numeroPedido", "--numero-pedido"],
     ["payloadJson", "--payload-json"],
 
+    ["filterJson", "--filter"],
+    ["sort", "--sort"],
+    ["offset", "--offset"],
+    ["limit", "--limit"],
+    ["cursor", "--cursor"],
+    ["format", "--format"],
+
     ["onlyZero", "--only-zero"],
 
     ["excelPath", "--excel-path"],
     ["modo", "--modo"],
     ["simular", "--simular"],
     ["skip", "--skip"],
+    ["forceImport", "--force-import"],
+    ["excelDir", "--excel-dir"],
+    ["workers", "--workers"],
+    ["chunkRows", "--chunk-rows"],
+    ["pdfPath", "--pdf-path"],
+    ["tipo", "--tipo"],
 
     ["name", "--name"],
+    ["metrics", "--metrics"],
+    ["opFilter", "--op-filter"],
+    ["profile", "--profile"],
+    ["profilePath", "--profile-path"],
 
     ["descripcion", "--descripcion"],
     ["color", "--color"],
@@ -377,8 +403,9 @@ async function runPythonCli(opts: {
   }
 
   // Upload de Excel (multipart) tiene prioridad sobre excelPath si es import op
+  // (import_ediwin recibe el PDF de pedidos EDI)
   if (uploadExcelPath) {
-    cliArgs.push("--excel-path", uploadExcelPath);
+    cliArgs.push(op === "import_ediwin" ? "--pdf-path" : "--excel-path", uploadExcelPath);
   }
 
   // Exports -> out zip
@@ -465,7 +492,9 @@ export async function POST(req: NextRequest) {
       // Archivo excel
       const file = form.get("file");
       if (file && file instanceof File) {
-        const ext = (file.name || "").toLowerCase().endsWith(".xlsx") ? ".xlsx" : ".xlsx";
+        // La extensión decide el lector del CLI (Excel vs CSV/TSV)
+        const m = (file.name || "").toLowerCase().match(/\.(xlsx|xlsm|xls|csv|tsv|txt|pdf)$/);
+        const ext = m ? `.${m[1]}` : ".xlsx";
         uploadExcelPath = path.join(tempDir, `upload${ext}`);
         await saveUploadedFileToDisk(file, uploadExcelPath);
       }